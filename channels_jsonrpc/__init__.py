@@ -1,2 +1,3 @@
 from .jsonrpcconsumer import AsyncRpcHttpConsumer, JsonRpcWebsocketConsumer, AsyncJsonRpcWebsocketConsumer,\
-    JsonRpcException
+    AsyncRpcWorkerConsumer, JsonRpcException
+from .remote import RemoteCallError
@@ -0,0 +1,231 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from .streaming import is_stream
+
+# Returned by the backends on cache miss
+MISSING = object()
+
+
+class LRUCache(object):
+    """
+    In-process cache backend, bounded in size, with least recently used eviction and per-entry expiration
+    """
+
+    def __init__(self, max_size=1024):
+        """
+        :param int max_size: maximum number of entries
+        """
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, prefix=''):
+        """
+        Remove the entries whose key starts with prefix
+        :param str prefix:
+        :return:
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DjangoCache(object):
+    """
+    Cache backend based on the Django cache framework, shared between workers.
+    Invalidation by prefix relies on delete_pattern when the cache provides it (django-redis...). Otherwise a
+    generation number stored in the cache is bumped, invalidating all the entries of this backend.
+    """
+
+    def __init__(self, alias='default', key_prefix='jsonrpc'):
+        """
+        :param str alias: name of the cache in settings.CACHES
+        :param str key_prefix: prefix of the keys in the Django cache
+        """
+        self.alias = alias
+        self.key_prefix = key_prefix
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def _generation_key(self):
+        return '%s:generation' % self.key_prefix
+
+    def _key(self, key):
+        if hasattr(self.cache, 'delete_pattern'):
+            return '%s:%s' % (self.key_prefix, key)
+        return '%s:%s:%s' % (self.key_prefix, self.cache.get(self._generation_key(), 0), key)
+
+    def get(self, key):
+        return self.cache.get(self._key(key), MISSING)
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            self.cache.set(self._key(key), value)
+        else:
+            self.cache.set(self._key(key), value, ttl)
+
+    def invalidate(self, prefix=''):
+        if hasattr(self.cache, 'delete_pattern'):
+            self.cache.delete_pattern('%s:%s*' % (self.key_prefix, prefix))
+            return
+        try:
+            self.cache.incr(self._generation_key())
+        except ValueError:
+            self.cache.set(self._generation_key(), 1, None)
+
+
+class _Flight(object):
+    """
+    Call in progress, shared by the identical calls made meanwhile
+    """
+
+    __slots__ = ('event', 'value')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = MISSING
+
+
+class ResultCache(object):
+    """
+    Cache of the results of an RPC method.
+    Keys are the name of the method followed by the canonicalized params (or the result of key(params)), and
+    concurrent identical calls only run the method once.
+    """
+
+    def __init__(self, backend, name, ttl=None, key=None):
+        """
+        :param backend: LRUCache, DjangoCache or any object with the same get/set/invalidate methods
+        :param str name: RPC name of the method
+        :param ttl: (optional) lifetime of the results, in seconds
+        :param key: (optional) function returning the key of the params
+        """
+        self.backend = backend
+        self.name = name
+        self.ttl = ttl
+        self.key_func = key
+        self._lock = threading.Lock()
+        self._flights = dict()
+        self._futures = dict()
+
+    def key(self, params):
+        if self.key_func is not None:
+            return '%s:%s' % (self.name, self.key_func(params))
+        return '%s:%s' % (self.name, json.dumps(params, sort_keys=True, separators=(',', ':'), default=repr))
+
+    def call(self, key, func):
+        """
+        Returns the cached result, or calls func() to get it
+        :param str key:
+        :param func: function computing the result
+        :return: result
+        """
+        value = self.backend.get(key)
+        if value is not MISSING:
+            return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.event.wait()
+            if flight.value is not MISSING:
+                return flight.value
+            # the call failed, try again on our own
+            return func()
+
+        try:
+            value = func()
+            if is_stream(value):
+                # can only be read once: neither cached nor shared, the identical calls run func() themselves
+                return value
+            flight.value = value
+            self.backend.set(key, value, self.ttl)
+            return value
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.event.set()
+
+    async def acall(self, key, func):
+        """
+        Same as call, for coroutines
+        :param str key:
+        :param func: function returning an awaitable computing the result
+        :return: result
+        """
+        value = self.backend.get(key)
+        if value is not MISSING:
+            return value
+
+        future = self._futures.get(key)
+        if future is not None:
+            value = await asyncio.shield(future)
+            if value is not MISSING:
+                return value
+            # the call was cancelled, try again on our own
+            return await func()
+
+        future = self._futures[key] = asyncio.get_event_loop().create_future()
+        try:
+            value = await func()
+        except asyncio.CancelledError:
+            # not cancelled with it: the identical calls (of other connections, possibly) run it themselves
+            future.set_result(MISSING)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # only the identical calls waiting for it need to get it
+            future.exception()
+            raise
+        else:
+            if is_stream(value):
+                # see call
+                future.set_result(MISSING)
+                return value
+            future.set_result(value)
+            self.backend.set(key, value, self.ttl)
+            return value
+        finally:
+            del self._futures[key]
+
+    def invalidate(self, prefix=None):
+        """
+        Invalidate the results of the method
+        :param prefix: (optional) only invalidate the keys starting with this prefix (name of the method included)
+        :return:
+        """
+        self.backend.invalidate(prefix if prefix is not None else '%s:' % self.name)
@@ -0,0 +1,210 @@
+import json
+import logging
+
+# Get an instance of a logger
+logger = logging.getLogger(__name__)
+
+
+class JsonCodec(object):
+    """
+    JSON backend based on the standard library. It is the reference implementation of the codec interface:
+        - loads(data): decode a str or bytes, raises ValueError on invalid JSON
+        - dumps(obj): encode to str, raises one of `encode_errors` if the object can't be serialized
+        - dumpb(obj): same as dumps, but encode to UTF-8 bytes. Backends producing bytes natively skip the str.
+
+    Custom types are supported through `encoder`, a json.JSONEncoder subclass (DjangoJSONEncoder for instance).
+    The other backends call its `default` method for the types they don't know.
+    """
+
+    name = 'json'
+    binary = False
+    encode_errors = (TypeError, ValueError, OverflowError)
+
+    def __init__(self, encoder=None):
+        self.encoder = encoder
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def dumps(self, obj):
+        return json.dumps(obj, cls=self.encoder)
+
+    def dumpb(self, obj):
+        return self.dumps(obj).encode('utf-8')
+
+
+class OrjsonCodec(JsonCodec):
+    name = 'orjson'
+
+    # The subclasses of the JSON types are passed through to the encoder: they are encoded as their base type
+    # (IntEnum, OrderedDict, namedtuple... and SafeString for str) like the standard library does
+    json_types = (dict, int, float, list, tuple)
+
+    def __init__(self, encoder=None):
+        import orjson
+        super().__init__(encoder)
+        self._orjson = orjson
+        self._option = orjson.OPT_NON_STR_KEYS
+        self._default = None
+        if encoder is not None:
+            # let the encoder handle the types orjson would otherwise serialize on its own way
+            self._option |= orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | \
+                orjson.OPT_PASSTHROUGH_SUBCLASS
+            default = encoder().default
+            json_types = self.json_types
+
+            def _default(value):
+                if isinstance(value, str):
+                    # str() would return some subclasses as they are (SafeString)
+                    return str.__str__(value)
+                for base in json_types:
+                    if isinstance(value, base):
+                        return base(value)
+                return default(value)
+
+            self._default = _default
+
+    def loads(self, data):
+        return self._orjson.loads(data)
+
+    def dumps(self, obj):
+        return self.dumpb(obj).decode('utf-8')
+
+    def dumpb(self, obj):
+        return self._orjson.dumps(obj, default=self._default, option=self._option)
+
+
+class UjsonCodec(JsonCodec):
+    name = 'ujson'
+
+    def __init__(self, encoder=None):
+        import ujson
+        super().__init__(encoder)
+        self._ujson = ujson
+        self._default = encoder().default if encoder is not None else None
+
+    def loads(self, data):
+        return self._ujson.loads(data)
+
+    def dumps(self, obj):
+        if self._default is None:
+            return self._ujson.dumps(obj, escape_forward_slashes=False)
+        return self._ujson.dumps(obj, escape_forward_slashes=False, default=self._default)
+
+
+class RapidjsonCodec(JsonCodec):
+    name = 'rapidjson'
+
+    def __init__(self, encoder=None):
+        import rapidjson
+        super().__init__(encoder)
+        self._rapidjson = rapidjson
+        self._default = encoder().default if encoder is not None else None
+
+    def loads(self, data):
+        return self._rapidjson.loads(data)
+
+    def dumps(self, obj):
+        return self._rapidjson.dumps(obj, default=self._default)
+
+
+class MsgpackCodec(object):
+    """
+    MessagePack backend, for the binary subprotocols of the websocket consumers.
+    Only loads(data) and dumpb(obj) are available: frames are always bytes.
+    """
+
+    name = 'msgpack'
+    binary = True
+    encode_errors = (TypeError, ValueError, OverflowError)
+
+    def __init__(self, encoder=None):
+        import msgpack
+        self._msgpack = msgpack
+        self._default = encoder().default if encoder is not None else None
+
+    def loads(self, data):
+        try:
+            return self._msgpack.unpackb(data, raw=False)
+        except Exception as e:
+            raise ValueError(e)
+
+    def dumpb(self, obj):
+        return self._msgpack.packb(obj, use_bin_type=True, default=self._default)
+
+
+class CborCodec(MsgpackCodec):
+    """
+    CBOR backend, for the binary subprotocols of the websocket consumers.
+    """
+
+    name = 'cbor'
+
+    def __init__(self, encoder=None):
+        import cbor2
+        self._cbor2 = cbor2
+        self.encode_errors = MsgpackCodec.encode_errors + (cbor2.CBOREncodeError,)
+        self._default = None
+        if encoder is not None:
+            default = encoder().default
+            self._default = lambda cbor_encoder, value: cbor_encoder.encode(default(value))
+
+    def loads(self, data):
+        try:
+            return self._cbor2.loads(data)
+        except Exception as e:
+            raise ValueError(e)
+
+    def dumpb(self, obj):
+        return self._cbor2.dumps(obj, default=self._default)
+
+
+CODECS = {
+    JsonCodec.name: JsonCodec,
+    OrjsonCodec.name: OrjsonCodec,
+    UjsonCodec.name: UjsonCodec,
+    RapidjsonCodec.name: RapidjsonCodec,
+}
+
+BINARY_CODECS = {
+    MsgpackCodec.name: MsgpackCodec,
+    CborCodec.name: CborCodec,
+}
+
+
+def get_codec(codec=None, encoder=None):
+    """
+    Returns a codec instance
+    :param codec: name of the backend (json, orjson, ujson, rapidjson) or JsonCodec subclass
+    :param encoder: (optional) json.JSONEncoder subclass used for custom types
+    :return: JsonCodec, the standard library one if the backend is not installed
+    """
+    if codec is None:
+        codec = JsonCodec.name
+    codec_class = CODECS.get(codec) if isinstance(codec, str) else codec
+    if codec_class is None:
+        raise ValueError('Unknown JSON codec: %s' % codec)
+
+    try:
+        return codec_class(encoder)
+    except ImportError:
+        logger.warning('JSON codec %s is not installed, falling back to json' % codec_class.name)
+        return JsonCodec(encoder)
+
+
+def get_binary_codec(codec, encoder=None):
+    """
+    Returns a binary codec instance
+    :param codec: name of the backend (msgpack, cbor) or codec class
+    :param encoder: (optional) json.JSONEncoder subclass used for custom types
+    :return: codec instance, None if the backend is not installed
+    """
+    codec_class = BINARY_CODECS.get(codec) if isinstance(codec, str) else codec
+    if codec_class is None:
+        raise ValueError('Unknown binary codec: %s' % codec)
+
+    try:
+        return codec_class(encoder)
+    except ImportError:
+        logger.warning('Binary codec %s is not installed' % codec_class.name)
+        return None
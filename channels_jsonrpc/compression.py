@@ -0,0 +1,121 @@
+import gzip
+import zlib
+
+# Supported HTTP content-codings, by order of preference
+HTTP_ENCODINGS = ('gzip', 'deflate')
+
+# Suffix of the websocket subprotocols using compressed frames (jsonrpc+deflate, jsonrpc-msgpack+deflate...)
+DEFLATE_SUFFIX = '+deflate'
+# Subprotocol of plain JSON frames, compressed
+JSON_DEFLATE_SUBPROTOCOL = 'jsonrpc' + DEFLATE_SUFFIX
+
+# First byte of the frames sent in compressed mode
+RAW_FRAME = b'\x00'
+DEFLATE_FRAME = b'\x01'
+
+_SYNC_FLUSH_TAIL = b'\x00\x00\xff\xff'
+
+
+class FrameCompressor(object):
+    """
+    Per-connection deflate compressor of the websocket consumers.
+    The compression context is kept from one frame to the next (like permessage-deflate with context takeover),
+    so the client must decompress all the compressed frames of the connection, in order, with a single raw
+    inflate context (wbits=-15), appending 0x00 0x00 0xff 0xff to each payload.
+
+    Every frame starts with one byte: 0x00 if the payload is sent as is, 0x01 if it is compressed.
+    """
+
+    def __init__(self, level=6, threshold=1024):
+        """
+        :param int level: zlib compression level
+        :param int threshold: payloads smaller than this (in bytes) are not compressed
+        """
+        self.threshold = threshold
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+    def frame(self, data):
+        """
+        Build a frame from an encoded payload
+        :param bytes data: encoded payload
+        :return: bytes
+        """
+        if len(data) < self.threshold:
+            return RAW_FRAME + data
+        compressed = self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return DEFLATE_FRAME + compressed[:-len(_SYNC_FLUSH_TAIL)]
+
+
+def accepted_encodings(headers):
+    """
+    Parse the Accept-Encoding header of an HTTP request
+    :param headers: ASGI headers (list of (name, value) bytes tuples)
+    :return: set of accepted content-codings
+    """
+    accepted = set()
+    for name, value in headers:
+        if name.lower() != b'accept-encoding':
+            continue
+        for coding in value.decode('latin-1').split(','):
+            coding, _, params = coding.strip().partition(';')
+            params = params.replace(' ', '')
+            if params.startswith('q=') and params[2:] in ('0', '0.', '0.0', '0.00', '0.000'):
+                continue
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def negotiate_encoding(headers):
+    """
+    Pick the content-coding of an HTTP response
+    :param headers: ASGI headers of the request
+    :return: 'gzip', 'deflate' or None
+    """
+    accepted = accepted_encodings(headers)
+    for encoding in HTTP_ENCODINGS:
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return None
+
+
+def compress_body(body, encoding, level=6):
+    """
+    Compress an HTTP response body
+    :param bytes body:
+    :param str encoding: 'gzip' or 'deflate'
+    :param int level: compression level
+    :return: bytes
+    """
+    if encoding == 'gzip':
+        return gzip.compress(body, level)
+    return zlib.compress(body, level)
+
+
+class BodyCompressor(object):
+    """
+    Incremental compressor of the HTTP response bodies sent in several parts
+    """
+
+    def __init__(self, encoding, level=6):
+        """
+        :param str encoding: 'gzip' or 'deflate'
+        :param int level: compression level
+        """
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS if encoding == 'gzip'
+                                            else zlib.MAX_WBITS)
+
+    def compress(self, data):
+        """
+        Compress a part of the body, flushed so that the client can decompress it right away
+        :param bytes data:
+        :return: bytes
+        """
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data=b''):
+        """
+        Compress the last part of the body
+        :param bytes data:
+        :return: bytes
+        """
+        return self._compressor.compress(data) + self._compressor.flush()
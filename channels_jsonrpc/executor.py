@@ -0,0 +1,86 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+
+class RpcExecutor(object):
+    """
+    Bounded thread pool running the synchronous RPC methods of the async consumers, so that they don't block
+    the event loop. Keeps track of its queue depth and of the time calls wait before being run.
+    Like database_sync_to_async, it closes the database connections of its threads that are broken or older than
+    CONN_MAX_AGE around each call.
+    """
+
+    def __init__(self, max_workers=10):
+        """
+        :param int max_workers: number of threads of the pool
+        """
+        self.max_workers = max_workers
+        self._pool = None
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def _call(self, submitted, func, args, kwargs):
+        wait_time = time.monotonic() - submitted
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.total_wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run a function in the pool
+        :param func: synchronous function
+        :return: the result of the function
+        """
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.max_workers)
+            self.queued += 1
+        future = self._pool.submit(self._call, time.monotonic(), func, args, kwargs)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # the call did not start: it won't be run at all
+            if future.cancel():
+                with self._lock:
+                    self.queued -= 1
+            raise
+
+    def stats(self):
+        """
+        :return: dict with the queue depth, the number of running and completed calls and the wait times (seconds)
+        """
+        with self._lock:
+            started = self.running + self.completed
+            return {
+                'max_workers': self.max_workers,
+                'queued': self.queued,
+                'running': self.running,
+                'completed': self.completed,
+                'total_wait_time': self.total_wait_time,
+                'max_wait_time': self.max_wait_time,
+                'avg_wait_time': self.total_wait_time / started if started else 0.0,
+            }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait)
@@ -0,0 +1,114 @@
+# Results sent from a template, when they are not longer than MAX_CONSTANT_LENGTH
+CONSTANT_TYPES = (str, int, bool)
+MAX_CONSTANT_LENGTH = 64
+
+# Stands for the id while encoding a template
+_ID_MARKER = '\x00jsonrpc-id\x00'
+
+
+class CachedFrame(dict):
+    """
+    Response frame whose encoding is cached: the frames sharing a key only differ by their id
+    """
+
+    __slots__ = ('key',)
+
+
+def error_frame(_id, error):
+    frame = CachedFrame(jsonrpc='2.0')
+    if _id is not None:
+        frame['id'] = _id
+    frame['error'] = error
+    frame.key = ('error', error['code'], error['message'])
+    return frame
+
+
+def result_frame(_id, result):
+    """
+    Response of a call returning a constant-like result (short string, integer or boolean), or None if the result
+    can't be sent from a template
+    :param _id:
+    :param result:
+    :return: CachedFrame or None
+    """
+    kind = type(result)
+    if kind not in CONSTANT_TYPES or (kind is str and len(result) > MAX_CONSTANT_LENGTH):
+        return None
+    frame = CachedFrame(jsonrpc='2.0')
+    if _id is not None:
+        frame['id'] = _id
+    frame['result'] = result
+    # True and 1 are equal, but not encoded the same way
+    frame.key = ('result', kind, result)
+    return frame
+
+
+def _int_bytes(value):
+    return b'%d' % value
+
+
+class FrameCache(object):
+    """
+    Encodings of the cached frames with a codec. Frames without an id are kept as a whole, the others as the parts
+    around their id, which is encoded and spliced in. A template is only built for the frames seen before, so that
+    results that change on every call don't cost more than encoding them.
+    """
+
+    def __init__(self, codec, max_size=256):
+        """
+        :param codec: JSON or binary codec
+        :param int max_size: maximum number of templates
+        """
+        self.codec = codec
+        self.max_size = max_size
+        # plain dicts, whose operations are atomic: they are cleared when full
+        self._templates = dict()
+        self._seen = dict()
+
+    def dumps(self, frame):
+        """
+        :param CachedFrame frame:
+        :return: str
+        """
+        return self._encode(frame, self.codec.dumps, 'str', str)
+
+    def dumpb(self, frame):
+        """
+        :param CachedFrame frame:
+        :return: bytes
+        """
+        return self._encode(frame, self.codec.dumpb, 'bytes', None if self.codec.binary else _int_bytes)
+
+    def _encode(self, frame, dump, kind, dump_int):
+        _id = frame.get('id')
+        key = (kind, _id is None, frame.key)
+        template = self._templates.get(key)
+        if template is None:
+            if key not in self._seen:
+                self._store(self._seen, key, True)
+                return dump(frame)
+            template = self._template(frame, dump)
+            self._store(self._templates, key, template)
+        if _id is None:
+            return template
+        prefix, suffix = template
+        if dump_int is not None and type(_id) is int:
+            # the most common ids, their JSON is their decimal representation
+            return prefix + dump_int(_id) + suffix
+        return prefix + dump(_id) + suffix
+
+    def _store(self, entries, key, value):
+        if len(entries) >= self.max_size:
+            entries.clear()
+        entries[key] = value
+
+    @staticmethod
+    def _template(frame, dump):
+        if 'id' not in frame:
+            return dump(frame)
+        # same position, so that the keys are encoded in the same order. The id comes before the other members
+        # with a value, so it is the first occurrence of the marker.
+        probe = dict(frame)
+        probe['id'] = _ID_MARKER
+        prefix, marker, suffix = dump(probe).partition(dump(_ID_MARKER))
+        return prefix, suffix
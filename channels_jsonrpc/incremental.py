@@ -0,0 +1,110 @@
+import re
+
+# Bytes changing the structure outside of the strings, and ending or escaping inside them
+_STRUCTURAL = re.compile(rb'["\[\]{},]')
+_STRING_SPECIAL = re.compile(rb'["\\]')
+
+_BRACKET = ord('[')
+_QUOTE = ord('"')
+_BACKSLASH = ord('\\')
+_OPENING = (ord('['), ord('{'))
+_CLOSING = (ord(']'), ord('}'))
+_COMMA = ord(',')
+
+
+class BatchParser(object):
+    """
+    Incremental parser of a top-level JSON array, splitting it into its elements while the body is received.
+    The elements are not decoded: invalid ones fail when they are. Other bodies (objects, invalid JSON...) are only
+    buffered, see `buffer`.
+    """
+
+    def __init__(self):
+        # received bytes not consumed yet, the whole body if it is not an array
+        self.buffer = bytearray()
+        # None until the first byte that is not a whitespace, then if the body is an array
+        self.is_batch = None
+        # if the closing bracket of the array was received
+        self.done = False
+        # if something else than whitespaces follows the array
+        self.trailing_data = False
+        # number of elements returned so far
+        self.count = 0
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+
+    def feed(self, data):
+        """
+        :param bytes data: next part of the body
+        :return: list of bytes, the elements completed by this part
+        """
+        if self.done:
+            self.trailing_data = self.trailing_data or bool(data.strip())
+            return []
+        self.buffer += data
+        if self.is_batch is None:
+            stripped = self.buffer.lstrip()
+            if not stripped:
+                return []
+            self.is_batch = stripped[0] == _BRACKET
+            if self.is_batch:
+                self.buffer = stripped[1:]
+                self._depth = 1
+        if not self.is_batch:
+            return []
+        return self._split()
+
+    def _split(self):
+        elements = []
+        buffer = self.buffer
+        start = 0
+        position = self._position
+        while True:
+            if self._in_string:
+                match = _STRING_SPECIAL.search(buffer, position)
+                if match is None:
+                    position = len(buffer)
+                    break
+                if buffer[match.start()] == _BACKSLASH:
+                    if match.end() >= len(buffer):
+                        # the escaped character is in the next part
+                        position = match.start()
+                        break
+                    position = match.end() + 1
+                    continue
+                self._in_string = False
+                position = match.end()
+                continue
+
+            match = _STRUCTURAL.search(buffer, position)
+            if match is None:
+                position = len(buffer)
+                break
+            char = buffer[match.start()]
+            position = match.end()
+            if char == _QUOTE:
+                self._in_string = True
+            elif char in _OPENING:
+                self._depth += 1
+            elif char in _CLOSING:
+                self._depth -= 1
+                if self._depth == 0:
+                    element = bytes(buffer[start:match.start()])
+                    # "[]" has no element, but "[1, ]" has an invalid one
+                    if element.strip() or self.count or elements:
+                        elements.append(element)
+                    self.done = True
+                    self.trailing_data = bool(buffer[position:].strip())
+                    position = len(buffer)
+                    start = position
+                    break
+            elif char == _COMMA and self._depth == 1:
+                elements.append(bytes(buffer[start:match.start()]))
+                start = position
+
+        # only the current element is kept
+        del buffer[:start]
+        self._position = position - start
+        self.count += len(elements)
+        return elements
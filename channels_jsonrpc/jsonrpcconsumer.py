@@ -1,24 +1,68 @@
-import json
+import asyncio
+import inspect
+import itertools
 import logging
-import sys
-
-if sys.version_info < (3, 5):
-    from inspect import getargspec as getfullargspec
-
-    keywords_args = "keywords"
-else:
-    from inspect import getfullargspec
-
-    keywords_args = "varkw"
-
+import reprlib
+import threading
+import time
+from types import MappingProxyType
+
+from asgiref.sync import async_to_sync
+from channels import DEFAULT_CHANNEL_LAYER
+from channels.consumer import AsyncConsumer
+from channels.db import database_sync_to_async
+from channels.exceptions import StopConsumer
 from channels.generic.websocket import JsonWebsocketConsumer, AsyncJsonWebsocketConsumer
 from channels.generic.http import AsyncHttpConsumer
+from channels.layers import get_channel_layer
 from django.conf import settings
 from six import string_types
 
+from .cache import LRUCache, ResultCache
+from .codecs import get_codec, get_binary_codec
+from .compression import DEFLATE_SUFFIX, JSON_DEFLATE_SUBPROTOCOL, BodyCompressor, FrameCompressor, compress_body, \
+    negotiate_encoding
+from .executor import RpcExecutor
+from .frames import CachedFrame, FrameCache, error_frame, result_frame
+from .incremental import BatchParser
+from .limits import check_structure
+from .methods import RpcMethod
+from .metrics import UNKNOWN_METHOD, default_collector
+from .outbound import DROP_OLDEST, NotificationQueue
+from .remote import CALL_EVENT, REPLY_EVENT, RemoteCallError, call_ids
+from .resources import ThreadedUse, aclose_resource, aopen_resource, close_resource, is_async_factory, \
+    open_resource
+from .streaming import PARTIAL_RESULT_METHOD, ResultStream, is_stream, is_stream_function
+from .subscriptions import PUBLISH_EVENT, topic_group, rpc_subscribe, rpc_unsubscribe, async_rpc_subscribe, \
+    async_rpc_unsubscribe
+
 # Get an instance of a logger
 logger = logging.getLogger(__name__)
 
+# Serializes the mutations of the RPC registries
+_registry_lock = threading.Lock()
+
+
+class _LogValue(object):
+    """
+    Params or result of a call, rendered only if the log record is emitted, with bounded effort and length
+    """
+
+    __slots__ = ('value', 'max_length')
+
+    def __init__(self, value, max_length):
+        self.value = value
+        self.max_length = max_length
+
+    def __str__(self):
+        renderer = reprlib.Repr()
+        renderer.maxstring = renderer.maxother = self.max_length
+        renderer.maxlist = renderer.maxtuple = renderer.maxdict = max(self.max_length // 10, 1)
+        text = renderer.repr(self.value)
+        if len(text) > self.max_length:
+            return text[:self.max_length] + '...'
+        return text
+
 
 class JsonRpcException(Exception):
     """
@@ -41,11 +85,7 @@ class JsonRpcException(Exception):
         return RpcBase.error(self.rpc_id, self.code, self.message, self.data)
 
     def __str__(self):
-        return json.dumps(self.as_dict())
-
-
-class MethodNotSupported(Exception):
-    pass
+        return RpcBase.get_codec().dumps(self.as_dict())
 
 
 class RpcBase:
@@ -64,7 +104,12 @@ class RpcBase:
         -32602 	Invalid params 	Invalid method parameter(s).
         -32603 	Internal error 	Internal JSON-RPC error.
         -32099 to -32000
-                Server error 	Reserved for implementation-defined server-errors. (@TODO)
+                Server error 	Reserved for implementation-defined server-errors:
+        -32000 	Application Error 	The method raised an exception.
+        -32001 	Rate Limit Exceeded 	The call was rejected by a rate limit.
+        -32002 	Too Many Concurrent Calls 	The connection has max_concurrent_calls calls in progress.
+        -32003 	Request Timeout 	The call did not complete within its timeout.
+        -32004 	Request Cancelled 	The call was cancelled by a $/cancelRequest notification.
 
         """
 
@@ -74,6 +119,10 @@ class RpcBase:
     INVALID_PARAMS = -32602
     INTERNAL_ERROR = -32603
     GENERIC_APPLICATION_ERROR = -32000
+    RATE_LIMIT_EXCEEDED = -32001
+    TOO_MANY_CONCURRENT_CALLS = -32002
+    REQUEST_TIMEOUT = -32003
+    REQUEST_CANCELLED = -32004
     PARSE_RESULT_ERROR = -32701
     errors = dict()
     errors[PARSE_ERROR] = "Parse Error"
@@ -82,6 +131,10 @@ class RpcBase:
     errors[INVALID_PARAMS] = "Invalid Params"
     errors[INTERNAL_ERROR] = "Internal Error"
     errors[GENERIC_APPLICATION_ERROR] = "Application Error"
+    errors[RATE_LIMIT_EXCEEDED] = "Rate Limit Exceeded"
+    errors[TOO_MANY_CONCURRENT_CALLS] = "Too Many Concurrent Calls"
+    errors[REQUEST_TIMEOUT] = "Request Timeout"
+    errors[REQUEST_CANCELLED] = "Request Cancelled"
     errors[PARSE_RESULT_ERROR] = 'Error while parsing result'
 
     _http_codes = {
@@ -90,61 +143,411 @@ class RpcBase:
         METHOD_NOT_FOUND: 404,
         INVALID_PARAMS: 500,
         INTERNAL_ERROR: 500,
-        GENERIC_APPLICATION_ERROR: 500
+        GENERIC_APPLICATION_ERROR: 500,
+        RATE_LIMIT_EXCEEDED: 429,
+        TOO_MANY_CONCURRENT_CALLS: 429,
+        REQUEST_TIMEOUT: 504,
+        REQUEST_CANCELLED: 500,
+    }
+
+    # Transports of the dispatch tables
+    transports = ('websocket', 'http')
+    # Bumped on every registry mutation, so that the dispatch tables compiled before are rebuilt
+    _registry_version = 0
+
+    # JSON backend: name (json, orjson, ujson, rapidjson) or JsonCodec subclass. Defaults to settings.JSONRPC_CODEC
+    json_codec = None
+    # json.JSONEncoder subclass used to serialize custom types (DjangoJSONEncoder for instance)
+    json_encoder_class = None
+    # Binary subprotocols of the websocket consumers: Sec-WebSocket-Protocol value -> binary codec (msgpack, cbor)
+    subprotocol_codecs = {
+        'jsonrpc-msgpack': 'msgpack',
+        'jsonrpc-cbor': 'cbor',
     }
+    # Codec of the binary subprotocol negotiated by the connection, if any
+    binary_codec = None
+
+    # Opt-in compression of the responses: gzip/deflate content-coding for HTTP, "+deflate" subprotocols
+    # (jsonrpc+deflate, jsonrpc-msgpack+deflate...) for websockets
+    compression = False
+    # Payloads smaller than this (in bytes) are sent uncompressed
+    compression_threshold = 1024
+    compression_level = 6
+    # Frame compressor of the connection, if a "+deflate" subprotocol was negotiated
+    compressor = None
+
+    # Limits of the received frames (websocket) and bodies (http), None for no limit. The size, in bytes (characters
+    # for text frames), is checked before parsing
+    max_frame_size = None
+    # Number of request objects in a batch
+    max_batch_length = None
+    # Nesting of the arrays and objects, and length of the strings
+    max_nesting_depth = None
+    max_string_length = None
+    # Close the websocket connections after this number of rejected frames (limits exceeded or invalid JSON)
+    max_violations = None
+
+    # Maximum number of encoded frames (static errors, constant results) kept per codec, 0 to disable
+    frame_cache_size = 256
+
+    # Maximum number of results in the in-process cache (rpc_method(cache=True))
+    result_cache_size = 1024
+
+    # Number of items per frame (websocket) or body part (http) of the results streamed from generators
+    stream_chunk_size = 100
+
+    # Metrics of the consumer: True to record them in the default in-memory collector, or a MetricsCollector
+    metrics = None
+
+    # RateLimit of the calls of each connection (or of all of them, if shared)
+    rate_limit = None
+
+    # Maximum length of the params and results in the logs
+    log_max_length = 1000
+    # Log one successful call out of log_sample_rate at INFO level (0 to disable)
+    log_sample_rate = 0
+
+    # Seconds call_remote waits for the response by default
+    remote_call_timeout = 10
+
+    # Resources of the connection (see connection_resource): name -> resource, and the generators releasing them
+    _resources = None
+    _resource_teardowns = None
+    # Async consumers: futures of the synchronous methods using the resources in a thread
+    _resource_uses = None
+    # Resource factories can be coroutine functions and async generators
+    _async_resources = False
+
+    # Let the websocket clients subscribe to topics with the rpc.subscribe and rpc.unsubscribe built-in methods
+    allow_subscriptions = False
+    _subscription_methods = {
+        'rpc.subscribe': RpcMethod(rpc_subscribe, 'rpc.subscribe', dict(websocket=True, http=False)),
+        'rpc.unsubscribe': RpcMethod(rpc_unsubscribe, 'rpc.unsubscribe', dict(websocket=True, http=False)),
+    }
+
+    @classmethod
+    def get_codec(cls):
+        """
+        Returns the JSON codec of this consumer. It is built once per class.
+        :return: JsonCodec
+        """
+        codec = cls.__dict__.get('_codec')
+        if codec is None:
+            codec = get_codec(cls.json_codec or getattr(settings, 'JSONRPC_CODEC', None), cls.json_encoder_class)
+            cls._codec = codec
+        return codec
+
+    @classmethod
+    def get_subprotocol_codec(cls, subprotocol):
+        """
+        Returns the binary codec of a subprotocol. It is built once per class.
+        :param str subprotocol: subprotocol requested by the client
+        :return: codec instance, None if the subprotocol is not supported
+        """
+        if subprotocol not in cls.subprotocol_codecs:
+            return None
+        codecs = cls.__dict__.get('_subprotocol_codecs')
+        if codecs is None:
+            codecs = cls._subprotocol_codecs = dict()
+        if subprotocol not in codecs:
+            codecs[subprotocol] = get_binary_codec(cls.subprotocol_codecs[subprotocol], cls.json_encoder_class)
+        return codecs[subprotocol]
+
+    @classmethod
+    def get_frame_cache(cls, codec):
+        """
+        Returns the cache of the frames encoded with a codec of this consumer. It is built once per class and codec.
+        :param codec: JSON or binary codec
+        :return: FrameCache
+        """
+        caches = cls.__dict__.get('_frame_caches')
+        if caches is None:
+            caches = cls._frame_caches = dict()
+        cache = caches.get(codec)
+        if cache is None:
+            cache = caches[codec] = FrameCache(codec, cls.frame_cache_size)
+        return cache
+
+    def _negotiate_subprotocol(self):
+        """
+        Pick the first binary or compressed subprotocol requested by the client that is supported
+        :return: the subprotocol to accept, None for plain JSON
+        """
+        for subprotocol in self.scope.get('subprotocols', []):
+            compressed = self.compression and subprotocol.endswith(DEFLATE_SUFFIX)
+            if compressed and subprotocol == JSON_DEFLATE_SUBPROTOCOL:
+                codec = None
+            else:
+                codec = self.get_subprotocol_codec(subprotocol[:-len(DEFLATE_SUFFIX)] if compressed else subprotocol)
+                if codec is None:
+                    continue
+            self.binary_codec = codec
+            if compressed:
+                self.compressor = FrameCompressor(self.compression_level, self.compression_threshold)
+            return subprotocol
+        return None
+
+    def _frame_bytes(self, content, binary):
+        """
+        Encode a frame to be sent in a binary websocket frame
+        :param content: frame or list of frames
+        :param bool binary: if the frame answers a binary frame
+        :return: bytes, or None if the frame has to be sent as JSON text
+        """
+        if self.compressor is not None:
+            return self.compressor.frame(self._dumpb(content, self.binary_codec))
+        if binary:
+            return self._dumpb(content, self.binary_codec)
+        return None
+
+    def _loads(self, data):
+        """
+        Decode a frame with the codec of the consumer
+        :param data: str or bytes
+        :return: decoded data, raises ValueError on invalid JSON
+        """
+        try:
+            return self.get_codec().loads(data)
+        except RecursionError:
+            raise ValueError('Too deeply nested')
+
+    def _oversized(self, size):
+        """
+        Error answering a frame larger than max_frame_size
+        :param int size: size of the frame
+        :return: error response, None if the frame is within the limit
+        """
+        if self.max_frame_size is None or size <= self.max_frame_size:
+            return None
+        return self.error(None, self.INVALID_REQUEST, self.errors[self.INVALID_REQUEST],
+                          'Frame larger than %d bytes' % self.max_frame_size)
+
+    def _check_frame(self, content):
+        """
+        Check a decoded frame against the limits of the consumer, before processing it
+        :param content: request object or batch
+        :return: error response, None if the frame is within the limits
+        """
+        reason = None
+        if self.max_batch_length is not None and isinstance(content, list) and len(content) > self.max_batch_length:
+            reason = 'Batch longer than %d request objects' % self.max_batch_length
+        elif self.max_nesting_depth is not None or self.max_string_length is not None:
+            reason = check_structure(content, self.max_nesting_depth, self.max_string_length)
+        if reason is None:
+            return None
+        return self.error(None, self.INVALID_REQUEST, self.errors[self.INVALID_REQUEST], reason)
+
+    def _violation(self):
+        """
+        Count a rejected frame
+        :return: bool, if the connection has to be closed
+        """
+        self._violations = self.__dict__.get('_violations', 0) + 1
+        return self.max_violations is not None and self._violations >= self.max_violations
+
+    def _dumps(self, content):
+        """
+        Encode a frame with the codec of the consumer. Results that can't be serialized are replaced by an error.
+        :param content: frame or list of frames
+        :return: str
+        """
+        if isinstance(content, list):
+            return '[%s]' % ','.join(self._dumps(frame) for frame in content)
+
+        codec = self.get_codec()
+        if type(content) is CachedFrame and self.frame_cache_size:
+            return self.get_frame_cache(codec).dumps(content)
+        try:
+            return codec.dumps(content)
+        except codec.encode_errors:
+            return codec.dumps(self._result_error(content))
+
+    def _dumpb(self, content, codec=None):
+        """
+        Same as _dumps, but encode straight to bytes
+        :param content: frame or list of frames
+        :param codec: (optional) codec to use instead of the JSON codec of the consumer
+        :return: bytes
+        """
+        if codec is None:
+            codec = self.get_codec()
+        if isinstance(content, list) and not codec.binary:
+            return b'[' + b','.join(self._dumpb(frame, codec) for frame in content) + b']'
+        if type(content) is CachedFrame and self.frame_cache_size:
+            return self.get_frame_cache(codec).dumpb(content)
+
+        try:
+            return codec.dumpb(content)
+        except codec.encode_errors:
+            if isinstance(content, list):
+                return codec.dumpb([self._encodable(frame, codec) for frame in content])
+            return codec.dumpb(self._result_error(content))
 
-    available_rpc_methods = dict()
-    available_rpc_notifications = dict()
+    def _encodable(self, content, codec):
+        try:
+            codec.dumpb(content)
+        except codec.encode_errors:
+            return self._result_error(content)
+        return content
+
+    def _result_error(self, content):
+        return self.error(None, self.PARSE_ERROR, self.errors[self.PARSE_RESULT_ERROR], '%s' % content['result'])
 
     @classmethod
-    def rpc_method(cls, rpc_name=None, websocket=True, http=True):
+    def rpc_method(cls, rpc_name=None, websocket=True, http=True, thread_sensitive=None, cache=None, ttl=None,
+                   cache_key=None, rate_limit=None, timeout=None):
         """
         Decorator to list RPC methods available. An optional name and protocol rectrictions can be added
         :param rpc_name: RPC name for the function
         :param bool websocket: if websocket transport can use this function
         :param bool http:if http transport can use this function
+        :param thread_sensitive: async consumers only, for synchronous functions: None to run them in the executor
+        of the consumer, True/False to run them with database_sync_to_async(thread_sensitive=...)
+        :param cache: memoize the results: True for the in-process LRU cache of the consumer, or a cache backend
+        (LRUCache, DjangoCache)
+        :param ttl: (optional) lifetime of the cached results, in seconds
+        :param cache_key: (optional) function returning the cache key of the params. Required if the result depends
+        on something else than the params, and for the functions taking the consumer (**kwargs)
+        :param rate_limit: (optional) RateLimit of the calls to this method
+        :param timeout: async consumers only: timeout of the calls, in seconds (call_timeout of the consumer if None)
         :return: decorated function
         """
 
         def wrap(f):
             name = rpc_name if rpc_name is not None else f.__name__
-            cid = id(cls)
-            if cid not in cls.available_rpc_methods:
-                cls.available_rpc_methods[cid] = dict()
-            f.options = dict(websocket=websocket, http=http)
-            cls.available_rpc_methods[cid][name] = f
+            method = RpcMethod(f, name, dict(websocket=websocket, http=http), thread_sensitive,
+                               rate_limit=rate_limit, timeout=timeout)
+            if cache:
+                if is_stream_function(f):
+                    raise ValueError('The results of %s are streamed and can not be cached' % name)
+                if method.accepts_consumer and cache_key is None:
+                    # the default key would share the results of a connection with the other ones
+                    raise ValueError('%s takes the consumer: its results can only be cached with a cache_key'
+                                     % name)
+                method.cache = ResultCache(cls.get_result_cache() if cache is True else cache, name, ttl, cache_key)
+            cls._mutate_registry(False, name, method)
 
             return f
 
         return wrap
 
+    @classmethod
+    def _debug_logging(cls):
+        """
+        Tell if the calls are logged at DEBUG level: only in DEBUG mode, if the logger is enabled for it.
+        Decided once per class.
+        :return: bool
+        """
+        debug = cls.__dict__.get('_log_debug')
+        if debug is None:
+            debug = cls._log_debug = bool(settings.DEBUG) and logger.isEnabledFor(logging.DEBUG)
+        return debug
+
+    @classmethod
+    def _sample_call(cls):
+        """
+        :return: bool, if the current call is part of the sampled request log
+        """
+        if not cls.log_sample_rate:
+            return False
+        counter = cls.__dict__.get('_log_counter')
+        if counter is None:
+            counter = cls._log_counter = itertools.count()
+        return next(counter) % cls.log_sample_rate == 0
+
+    def _log_value(self, value):
+        return _LogValue(value, self.log_max_length)
+
+    @classmethod
+    def get_metrics(cls):
+        """
+        Returns the metrics collector of this consumer
+        :return: MetricsCollector, None if metrics are disabled
+        """
+        if cls.metrics is True:
+            return default_collector
+        return cls.metrics or None
+
+    def _record_frame(self, sent, text_data=None, bytes_data=None, size=None):
+        """
+        Record the size of a frame (or http body) in the metrics
+        :param bool sent: if the frame is sent or received
+        :param int size: (optional) size of a frame that was not kept, instead of its data
+        """
+        metrics = self.get_metrics()
+        data = text_data if text_data is not None else bytes_data
+        if data is not None:
+            size = len(data)
+        if metrics is None or size is None:
+            return
+        if sent:
+            metrics.frame_sent(type(self).__name__, size)
+        else:
+            metrics.frame_received(type(self).__name__, size)
+
+    def _record_call(self, metrics, data, result, started):
+        """
+        Record a processed request object in the metrics
+        :param MetricsCollector metrics:
+        :param data: request object
+        :param result: response, None for notifications
+        :param float started: time.monotonic() when its processing started
+        """
+        code = None
+        if isinstance(result, dict) and 'error' in result:
+            code = result['error']['code']
+        method = data.get('method') if isinstance(data, dict) else None
+        if not isinstance(method, string_types) or code in (self.METHOD_NOT_FOUND, self.INVALID_REQUEST):
+            method = UNKNOWN_METHOD
+        metrics.call_finished(type(self).__name__, method, time.monotonic() - started, code)
+
+    @classmethod
+    def get_result_cache(cls):
+        """
+        Returns the in-process LRU cache of the results of this consumer. It is built once per class.
+        :return: LRUCache
+        """
+        result_cache = cls.__dict__.get('_result_cache')
+        if result_cache is None:
+            result_cache = cls._result_cache = LRUCache(cls.result_cache_size)
+        return result_cache
+
+    @classmethod
+    def invalidate_cache(cls, method_name, prefix=None):
+        """
+        Invalidate the cached results of an RPC method
+        :param str method_name: RPC name of the method
+        :param prefix: (optional) only invalidate the keys starting with this prefix (method name included)
+        :return:
+        """
+        method = cls.get_dispatch_table().get(method_name)
+        if method is not None and method.cache is not None:
+            method.cache.invalidate(prefix)
+
     @classmethod
     def get_rpc_methods(cls):
         """
         Returns the RPC methods available for this consumer
         :return: list
         """
-        if id(cls) not in cls.available_rpc_methods:
-            return []
-        return list(cls.available_rpc_methods[id(cls)].keys())
+        return list(cls.get_dispatch_table())
 
     @classmethod
-    def rpc_notification(cls, rpc_name=None, websocket=True, http=True):
+    def rpc_notification(cls, rpc_name=None, websocket=True, http=True, thread_sensitive=None, rate_limit=None):
         """
         Decorator to list RPC notifications available. An optional name can be added
         :param rpc_name: RPC name for the function
         :param bool websocket: if websocket transport can use this function
         :param bool http:if http transport can use this function
+        :param thread_sensitive: see rpc_method
+        :param rate_limit: (optional) RateLimit of the calls to this notification
         :return: decorated function
         """
 
         def wrap(f):
             name = rpc_name if rpc_name is not None else f.__name__
-            cid = id(cls)
-            if cid not in cls.available_rpc_notifications:
-                cls.available_rpc_notifications[cid] = dict()
-            f.options = dict(websocket=websocket, http=http)
-            cls.available_rpc_notifications[cid][name] = f
+            cls._mutate_registry(True, name, RpcMethod(f, name, dict(websocket=websocket, http=http),
+                                                       thread_sensitive, rate_limit=rate_limit))
             return f
 
         return wrap
@@ -155,9 +558,173 @@ class RpcBase:
         Returns the RPC methods available for this consumer
         :return: list
         """
-        if id(cls) not in cls.available_rpc_notifications:
-            return []
-        return list(cls.available_rpc_notifications[id(cls)].keys())
+        return list(cls.get_dispatch_table(is_notification=True))
+
+    @classmethod
+    def remove_rpc_method(cls, rpc_name):
+        """
+        Remove an RPC method registered on this consumer
+        :param str rpc_name: RPC name of the method
+        :return:
+        """
+        cls._mutate_registry(False, rpc_name, None)
+
+    @classmethod
+    def remove_rpc_notification(cls, rpc_name):
+        """
+        Remove an RPC notification registered on this consumer
+        :param str rpc_name: RPC name of the notification
+        :return:
+        """
+        cls._mutate_registry(True, rpc_name, None)
+
+    @classmethod
+    def clear_rpc_methods(cls):
+        """
+        Remove all the RPC methods and notifications registered on this consumer (inherited ones are kept)
+        :return:
+        """
+        with _registry_lock:
+            cls._rpc_registry = {False: MappingProxyType({}), True: MappingProxyType({})}
+            RpcBase._registry_version += 1
+
+    @classmethod
+    def _mutate_registry(cls, is_notification, rpc_name, method):
+        """
+        Add (or remove, if method is None) an RPC method or notification registered on this consumer.
+        The registry is copied, modified and swapped, so readers never see it half-updated.
+        :param bool is_notification:
+        :param str rpc_name:
+        :param method: RpcMethod or None
+        :return:
+        """
+        with _registry_lock:
+            registry = dict(cls.__dict__.get('_rpc_registry') or {False: MappingProxyType({}),
+                                                                   True: MappingProxyType({})})
+            methods = dict(registry[is_notification])
+            if method is None:
+                methods.pop(rpc_name, None)
+            else:
+                methods[rpc_name] = method
+            registry[is_notification] = MappingProxyType(methods)
+            cls._rpc_registry = registry
+            RpcBase._registry_version += 1
+
+    @classmethod
+    def connection_resource(cls, name=None):
+        """
+        Decorator to declare a resource of the connections (authenticated user, client, prepared query...). It is
+        created by the function the first time a call needs it, then kept until the connection is closed. It is
+        passed to the RPC methods having a parameter of the same name, which the clients can't set.
+        Generator functions yield the resource, and release it after the yield, on disconnect. The async consumers
+        also accept coroutine functions and async generators.
+        :param name: name of the resource, the name of the function by default
+        :return: decorated function
+        """
+
+        def wrap(f):
+            resource_name = name if name is not None else f.__name__
+            if is_async_factory(f) and not cls._async_resources:
+                raise ValueError('The resource %s can only be created by the async consumers' % resource_name)
+            with _registry_lock:
+                resources = dict(cls.__dict__.get('_resource_registry') or {})
+                resources[resource_name] = f
+                cls._resource_registry = MappingProxyType(resources)
+                RpcBase._registry_version += 1
+            return f
+
+        return wrap
+
+    @classmethod
+    def _compile_dispatch_tables(cls):
+        """
+        Merge the registries of the consumer and of its parents, and build one frozen lookup table per transport
+        and kind (method/notification). None as transport gives all the methods.
+        :return: (registry version, dict of tables, resource factories)
+        """
+        version = RpcBase._registry_version
+        resources = dict()
+        for klass in reversed(cls.__mro__):
+            registry = klass.__dict__.get('_resource_registry')
+            if registry is not None:
+                resources.update(registry)
+
+        tables = dict()
+        for is_notification in (False, True):
+            methods = dict(cls._subscription_methods) if cls.allow_subscriptions and not is_notification else dict()
+            for klass in reversed(cls.__mro__):
+                registry = klass.__dict__.get('_rpc_registry')
+                if registry is not None:
+                    methods.update(registry[is_notification])
+            if resources:
+                methods = {name: method.with_resources(resources) for name, method in methods.items()}
+            tables[(None, is_notification)] = MappingProxyType(methods)
+            for transport in cls.transports:
+                tables[(transport, is_notification)] = MappingProxyType(
+                    {name: method for name, method in methods.items() if method.options.get(transport)})
+        compiled = cls._rpc_dispatch = (version, tables, MappingProxyType(resources))
+        return compiled
+
+    @classmethod
+    def _get_compiled(cls):
+        compiled = cls.__dict__.get('_rpc_dispatch')
+        if compiled is None or compiled[0] != RpcBase._registry_version:
+            compiled = cls._compile_dispatch_tables()
+        return compiled
+
+    @classmethod
+    def get_dispatch_table(cls, transport=None, is_notification=False):
+        """
+        Returns the RPC methods (or notifications) of this consumer, inherited ones included
+        :param transport: 'websocket' or 'http' to only get the methods available through this transport
+        :param bool is_notification:
+        :return: read-only dict: RPC name -> RpcMethod
+        """
+        return cls._get_compiled()[1][(transport, is_notification)]
+
+    @classmethod
+    def get_connection_resources(cls):
+        """
+        Returns the resources declared for the connections of this consumer, inherited ones included
+        :return: read-only dict: name -> function creating the resource
+        """
+        return cls._get_compiled()[2]
+
+    def _resource_factory(self, name):
+        factory = self.get_connection_resources().get(name)
+        if factory is None:
+            raise KeyError('No connection resource named %s' % name)
+        return factory
+
+    def get_resource(self, name):
+        """
+        Returns a resource of the connection, created on first use
+        :param str name: name of the resource
+        :return: resource
+        """
+        resources = self._resources
+        if resources is None:
+            resources = self._resources = dict()
+            self._resource_teardowns = []
+        if name not in resources:
+            resource, teardown = open_resource(self._resource_factory(name), self)
+            resources[name] = resource
+            if teardown is not None:
+                self._resource_teardowns.append(teardown)
+        return resources[name]
+
+    def _close_resources(self):
+        """
+        Release the resources of the connection, the last created first
+        :return:
+        """
+        teardowns = self._resource_teardowns
+        self._resources = self._resource_teardowns = None
+        for teardown in reversed(teardowns or ()):
+            try:
+                close_resource(teardown)
+            except Exception:
+                logger.exception('Error while releasing a connection resource')
 
     @staticmethod
     def json_rpc_frame(_id=None, result=None, params=None, method=None, error=None):
@@ -187,8 +754,10 @@ class RpcBase:
         error = {'code': code, 'message': message}
         if data is not None:
             error["data"] = data
+            return RpcBase.json_rpc_frame(error=error, _id=_id)
 
-        return RpcBase.json_rpc_frame(error=error, _id=_id)
+        # the same for all the requests, except for the id
+        return error_frame(_id, error)
 
     def notify_channel(self, method, params):
         """
@@ -199,7 +768,168 @@ class RpcBase:
         :return:
         """
         content = self.json_rpc_frame(method=method, params=params)
-        self.send(self.encode_json(content))
+        self._send_frame(content, self.binary_codec is not None)
+
+    def can_subscribe(self, topic):
+        """
+        Override to control the topics a client can subscribe to
+        :param str topic:
+        :return: bool
+        """
+        return True
+
+    def _subscription_group(self, topic):
+        if not isinstance(topic, string_types) or not self.can_subscribe(topic):
+            raise PermissionError('Subscription refused: %s' % topic)
+        return topic_group(topic)
+
+    def subscribe(self, topic):
+        """
+        Subscribe the connection to a topic: it will get the notifications published on it
+        :param str topic:
+        :return:
+        """
+        group = self._subscription_group(topic)
+        if group not in self.groups:
+            async_to_sync(self.channel_layer.group_add)(group, self.channel_name)
+            # the groups are left by channels on disconnect
+            self.groups = self.groups + [group]
+
+    def unsubscribe(self, topic):
+        """
+        Unsubscribe the connection from a topic
+        :param str topic:
+        :return: bool, if the connection was subscribed to the topic
+        """
+        group = topic_group(topic)
+        if group not in self.groups:
+            return False
+        async_to_sync(self.channel_layer.group_discard)(group, self.channel_name)
+        self.groups = [g for g in self.groups if g != group]
+        return True
+
+    @classmethod
+    async def publish(cls, topic, params, channel_layer=None):
+        """
+        Send a JSON-RPC notification to all the connections subscribed to a topic.
+        The frame is encoded once, whatever the number of subscribers.
+        From synchronous code: async_to_sync(MyConsumer.publish)(topic, params)
+        :param str topic: topic, also used as the method of the notification
+        :param params: params of the notification
+        :param channel_layer: (optional) channel layer to use instead of the one of the consumer
+        :return:
+        """
+        if channel_layer is None:
+            channel_layer = cls._default_channel_layer()
+        text = cls.get_codec().dumps(cls.json_rpc_frame(method=topic, params=params))
+        await channel_layer.group_send(topic_group(topic), {'type': PUBLISH_EVENT, 'text': text})
+
+    @classmethod
+    def _default_channel_layer(cls):
+        return get_channel_layer(getattr(cls, 'channel_layer_alias', DEFAULT_CHANNEL_LAYER))
+
+    @classmethod
+    async def call_remote(cls, channel_name, method, params=None, timeout=None, channel_layer=None):
+        """
+        Call a method of the consumer listening on a channel (a websocket connection, or an AsyncRpcWorkerConsumer),
+        possibly in another worker process, and wait for its result.
+        From synchronous code: async_to_sync(MyConsumer.call_remote)(channel_name, method, params)
+        :param str channel_name: channel of the consumer (its channel_name attribute, or the channel of a worker)
+        :param str method: RPC name of the method
+        :param params: (optional) params of the method, list or dict
+        :param float timeout: (optional) seconds to wait for the response, remote_call_timeout by default
+        :param channel_layer: (optional) channel layer to use instead of the one of the consumer
+        :return: result of the method. Raises RemoteCallError if it failed or didn't answer in time.
+        """
+        if channel_layer is None:
+            channel_layer = cls._default_channel_layer()
+        codec = cls.get_codec()
+        _id = next(call_ids)
+        # the caller gets the response on a channel of its own
+        reply_channel = await channel_layer.new_channel()
+        text = codec.dumps(cls.json_rpc_frame(_id=_id, method=method, params=params if params is not None else []))
+        await channel_layer.send(channel_name, {'type': CALL_EVENT, 'text': text, 'reply_channel': reply_channel})
+
+        try:
+            message = await asyncio.wait_for(channel_layer.receive(reply_channel),
+                                             timeout if timeout is not None else cls.remote_call_timeout)
+        except asyncio.TimeoutError:
+            raise RemoteCallError(cls.REQUEST_TIMEOUT, cls.errors[cls.REQUEST_TIMEOUT], channel_name)
+
+        response = codec.loads(message['text'])
+        if not isinstance(response, dict) or response.get('id') != _id:
+            raise RemoteCallError(cls.INTERNAL_ERROR, cls.errors[cls.INTERNAL_ERROR], response)
+        if 'error' in response:
+            error = response['error']
+            raise RemoteCallError(error.get('code'), error.get('message'), error.get('data'))
+        return response.get('result')
+
+    @classmethod
+    async def notify_remote(cls, channel_name, method, params=None, group=False, channel_layer=None):
+        """
+        Send a notification to the consumer listening on a channel, or to all the consumers of a group
+        :param str channel_name: channel of the consumer, or name of the group
+        :param str method: RPC name of the notification
+        :param params: (optional) params of the notification, list or dict
+        :param bool group: if channel_name is a group
+        :param channel_layer: (optional) channel layer to use instead of the one of the consumer
+        :return:
+        """
+        if channel_layer is None:
+            channel_layer = cls._default_channel_layer()
+        text = cls.get_codec().dumps(cls.json_rpc_frame(method=method, params=params if params is not None else []))
+        message = {'type': CALL_EVENT, 'text': text}
+        if group:
+            await channel_layer.group_send(channel_name, message)
+        else:
+            await channel_layer.send(channel_name, message)
+
+    def _reply(self, result):
+        """
+        Message answering a call_remote
+        :param result: response
+        :return: dict
+        """
+        return {'type': REPLY_EVENT, 'text': self._dumps(result)}
+
+    def jsonrpc_call(self, event):
+        """
+        Called when another consumer calls a method of this one with call_remote or notify_remote
+        """
+        result, is_notification = self._handle(self._loads(event['text']))
+        reply_channel = event.get('reply_channel')
+        if reply_channel is not None and not is_notification:
+            async_to_sync(self.channel_layer.send)(reply_channel, self._reply(self._collect_stream(result)))
+
+    def _connection_opened(self):
+        metrics = self.get_metrics()
+        if metrics is not None:
+            metrics.connection_opened(type(self).__name__)
+            self._metrics_connection = metrics
+
+    def _connection_closed(self):
+        # only the accepted connections were counted
+        metrics = self.__dict__.pop('_metrics_connection', None)
+        if metrics is not None:
+            metrics.connection_closed(type(self).__name__)
+
+    def _published_data(self, text):
+        """
+        Convert a published frame to the format of the connection
+        :param str text: JSON frame
+        :return: (text_data, bytes_data)
+        """
+        if self.binary_codec is not None:
+            return None, self._frame_bytes(self._loads(text), True)
+        if self.compressor is not None:
+            return None, self.compressor.frame(text.encode('utf-8'))
+        return text, None
+
+    def _transport(self):
+        """
+        :return: transport whose methods are available, None for all of them
+        """
+        return self.scope['type']
 
     def _get_method(self, data, is_notification):
 
@@ -216,24 +946,42 @@ class RpcBase:
         if method_name.startswith('_'):
             raise JsonRpcException(data.get('id'), self.METHOD_NOT_FOUND)
 
-        try:
-            if is_notification:
-                method = self.__class__.available_rpc_notifications[id(self.__class__)][method_name]
-            else:
-                method = self.__class__.available_rpc_methods[id(self.__class__)][method_name]
-            # Test if the websocket o http header was at false
-            proto = self.scope['type']
-            if not method.options[proto]:
-                raise MethodNotSupported('Method not available through %s' % proto)
-        except (KeyError, MethodNotSupported):
+        # the tables of each transport only hold the methods available through it
+        method = self.get_dispatch_table(self._transport(), is_notification).get(method_name)
+        if method is None:
             raise JsonRpcException(data.get('id'), self.METHOD_NOT_FOUND)
 
         return method
 
-    def _get_params(self, data):
+    def _check_rate_limits(self, data, method):
+        """
+        Reject the call if it exceeds the rate limit of the consumer or of the method
+        :param dict data: request object
+        :param RpcMethod method:
+        :return:
+        """
+        if self.rate_limit is None and method.rate_limit is None:
+            return
+        buckets = self.__dict__.get('_rate_buckets')
+        if buckets is None:
+            buckets = self._rate_buckets = dict()
+        name = '%s.%s' % (type(self).__module__, type(self).__qualname__)
+        if self.rate_limit is not None and not self.rate_limit.acquire(buckets, name):
+            raise JsonRpcException(data.get('id'), self.RATE_LIMIT_EXCEEDED)
+        if method.rate_limit is not None and not method.rate_limit.acquire(buckets, '%s:%s' % (name, method.name)):
+            raise JsonRpcException(data.get('id'), self.RATE_LIMIT_EXCEEDED)
+
+    def _get_params(self, data, method):
         params = data.get('params', [])
         if not isinstance(params, (list, dict)):
             raise JsonRpcException(data.get('id'), self.INVALID_PARAMS)
+        reason = method.check_params(params)
+        if reason is not None:
+            raise JsonRpcException(data.get('id'), self.INVALID_PARAMS, reason)
+        if method.converters:
+            params, errors = method.convert_params(params)
+            if errors is not None:
+                raise JsonRpcException(data.get('id'), self.INVALID_PARAMS, errors)
         return params
 
     def __process(self, data, is_notification=False):
@@ -245,107 +993,381 @@ class RpcBase:
         :return: dict
         """
         method = self._get_method(data, is_notification=is_notification)
-        params = self._get_params(data)
+        self._check_rate_limits(data, method)
+        params = self._get_params(data, method)
 
         # log call in debug mode
-        if settings.DEBUG:
-            logger.debug('Executing %s(%s)' % (method.__qualname__, json.dumps(params)))
+        debug = self._debug_logging()
+        if debug:
+            logger.debug('Executing %s(%s)', method.qualname, self._log_value(params))
 
         result = self.__get_result(method, params)
+        if self._sample_call():
+            logger.info('Call %s(%s): %s', method.qualname, self._log_value(params), self._log_value(result))
 
         # check and pack result
         if not is_notification:
+            if is_stream(result, asynchronous=False):
+                # sent by chunks
+                return ResultStream(result, data.get('id'), self.stream_chunk_size)
+
             # log call in debug mode
-            if settings.DEBUG:
-                logger.debug('Execution result: %s' % result)
+            if debug:
+                logger.debug('Execution result: %s', self._log_value(result))
 
-            result = self.json_rpc_frame(result=result, _id=data.get('id'))
+            result = self._result_frame(data.get('id'), result)
         elif result is not None:
             logger.warning("The notification method shouldn't return any result")
-            logger.warning("method: %s, params: %s" % (method.__qualname__, params))
+            logger.warning("method: %s, params: %s", method.qualname, self._log_value(params))
             result = None
 
         return result
 
-    def _handle(self, data):
+    def _result_frame(self, _id, result):
         """
-        Handle
-        :param data:
-        :return:
+        Response of a call, encoded from a template for the constant-like results
+        :param _id: id of the request
+        :param result: result of the method
+        :return: dict
         """
-        result = None
-        is_notification = False
+        if self.frame_cache_size:
+            frame = result_frame(_id, result)
+            if frame is not None:
+                return frame
+        return self.json_rpc_frame(result=result, _id=_id)
 
-        if data is not None:
-            if isinstance(data, dict):
+    def _application_error(self, _id, e):
+        """
+        Error answer of a method that raised an exception
+        :param _id: id of the request
+        :param Exception e:
+        :return: dict
+        """
+        logger.debug('Application error: %s', e)
+        return self.error(_id, self.GENERIC_APPLICATION_ERROR, str(e), e.args[0] if len(e.args) == 1 else e.args)
+
+    def _partial_result(self, stream, chunk):
+        return self.json_rpc_frame(method=PARTIAL_RESULT_METHOD, params={'id': stream.id, 'result': chunk})
 
+    def _collect_stream(self, result):
+        """
+        Read a streamed result as a whole, for the batch members
+        :param result: result of _handle_single
+        :return: response
+        """
+        if not isinstance(result, ResultStream):
+            return result
+        try:
+            return self.json_rpc_frame(result=result.collect(), _id=result.id)
+        except Exception as e:
+            return self._application_error(result.id, e)
+        finally:
+            result.close()
+
+    def _send_stream(self, stream, binary=False):
+        """
+        Send a streamed result: a rpc.partialResult notification per chunk, then the response, whose result is the
+        number of items sent
+        :param ResultStream stream:
+        :param bool binary:
+        :return:
+        """
+        try:
+            while True:
                 try:
-                    if data.get('method') is not None and data.get('id') is None:
-                        is_notification = True
-                    result = self.__process(data, is_notification)
-                except JsonRpcException as e:
-                    result = e.as_dict()
+                    chunk = stream.next_chunk()
                 except Exception as e:
-                    logger.debug('Application error', e)
-                    result = self.error(data.get('id'),
-                                        self.GENERIC_APPLICATION_ERROR,
-                                        str(e),
-                                        e.args[0] if len(e.args) == 1 else e.args)
-            elif isinstance(data, list):
-                # TODO: implement batch calls
-                if len([x for x in data if not isinstance(x, dict)]):
-                    result = self.error(None, self.INVALID_REQUEST, self.errors[self.INVALID_REQUEST])
+                    response = self._application_error(stream.id, e)
+                    break
+                if not chunk:
+                    response = self.json_rpc_frame(result=stream.count, _id=stream.id)
+                    break
+                self._send_frame(self._partial_result(stream, chunk), binary)
+        finally:
+            stream.close()
+        self._send_frame(response, binary)
 
-        else:
-            result = self.error(None, self.INVALID_REQUEST, self.errors[self.INVALID_REQUEST])
+    @staticmethod
+    def _pack_batch(responses):
+        """
+        Build the answer of a batch call: notifications are left out and nothing is returned if only
+        notifications were sent
+        :param list responses: list of (result, is_notification) tuples
+        :return: (list, bool)
+        """
+        results = [result for result, is_notification in responses if not is_notification]
+        if not results:
+            return None, True
+        return results, False
+
+    def _handle_single(self, data):
+        """
+        Handle a single request object, recording it in the metrics
+        :param data:
+        :return: (result, is_notification)
+        """
+        metrics = self.get_metrics()
+        if metrics is None:
+            return self._handle_request(data)
 
+        metrics.call_started(type(self).__name__)
+        started = time.monotonic()
+        result = None
+        try:
+            result, is_notification = self._handle_request(data)
+        finally:
+            self._record_call(metrics, data, result, started)
         return result, is_notification
 
-    def __get_result(self, method, params):
+    def _handle_request(self, data):
+        """
+        Handle a single request object
+        :param data:
+        :return: (result, is_notification)
+        """
+        result = None
+        is_notification = False
 
-        func_args = getattr(getfullargspec(method), keywords_args)
-        if func_args and "kwargs" in func_args:
-            if isinstance(params, list):
-                result = method(*params, consumer=self)
-            else:
-                result = method(**params, consumer=self)
+        if isinstance(data, dict):
+
+            try:
+                if data.get('method') is not None and data.get('id') is None:
+                    is_notification = True
+                result = self.__process(data, is_notification)
+            except JsonRpcException as e:
+                result = e.as_dict()
+            except Exception as e:
+                result = self._application_error(data.get('id'), e)
         else:
-            if isinstance(params, list):
-                result = method(*params)
-            else:
-                result = method(**params)
+            result = self.error(None, self.INVALID_REQUEST, self.errors[self.INVALID_REQUEST])
 
-        return result
+        return result, is_notification
+
+    def _handle(self, data):
+        """
+        Handle
+        :param data: request object or batch (list of request objects)
+        :return: (result, is_notification)
+        """
+        if isinstance(data, list) and data:
+            return self._pack_batch([(self._collect_stream(result), is_notification)
+                                     for result, is_notification in map(self._handle_single, data)])
 
-    def _base_receive_json(self, content):
+        return self._handle_single(data)
+
+    def __get_result(self, method, params):
+        if method.injected:
+            # not cached: the result depends on the resources of the connection
+            return method(self, params, {name: self.get_resource(name) for name in method.injected})
+        if method.cache is not None:
+            return method.cache.call(method.cache.key(params), lambda: method(self, params))
+        return method(self, params)
+
+    def _base_receive_json(self, content, binary=False):
         """
         Called when receiving a message.
         :param message: message received
-        :param kwargs:
+        :param bool binary: if the message came in a binary frame, the answer is sent the same way
         :return:
         """
         result, is_notification = self._handle(content)
 
         # Send response back only if it is a call, not notification
-        if not is_notification:
-            self.send_json(result)
+        if isinstance(result, ResultStream):
+            self._send_stream(result, binary)
+        elif not is_notification:
+            self._send_frame(result, binary)
 
 
 class AsyncRpcBase(RpcBase):
-    async def __get_result(self, method, params):
 
-        func_args = getattr(getfullargspec(method), keywords_args)
-        if func_args and "kwargs" in func_args:
-            if isinstance(params, list):
-                result = await method(*params, consumer=self)
-            else:
-                result = await method(**params, consumer=self)
+    _subscription_methods = {
+        'rpc.subscribe': RpcMethod(async_rpc_subscribe, 'rpc.subscribe', dict(websocket=True, http=False)),
+        'rpc.unsubscribe': RpcMethod(async_rpc_unsubscribe, 'rpc.unsubscribe', dict(websocket=True, http=False)),
+    }
+
+    # Maximum number of batch members executed concurrently (None or 0 for no limit)
+    batch_concurrency = 50
+    # Number of threads running the synchronous RPC methods
+    executor_max_workers = 10
+    # Maximum number of calls in progress per connection (None for no limit), the other ones are rejected
+    max_concurrent_calls = None
+    # Default timeout of the calls, in seconds (None for no timeout)
+    call_timeout = None
+    _active_calls = 0
+    _async_resources = True
+
+    @classmethod
+    def get_executor(cls):
+        """
+        Returns the executor running the synchronous RPC methods of this consumer. It is built once per class.
+        Its stats() give the queue depth and the wait times.
+        :return: RpcExecutor
+        """
+        executor = cls.__dict__.get('_executor')
+        if executor is None:
+            executor = cls._executor = RpcExecutor(cls.executor_max_workers)
+        return executor
+
+    async def notify_channel(self, method, params):
+        """
+        Notify a group. Using JSON-RPC notificatons
+        :param method: JSON-RPC method
+        :param params: parmas of the method
+        :return:
+        """
+        content = self.json_rpc_frame(method=method, params=params)
+        await self._send_frame(content, self.binary_codec is not None)
+
+    async def subscribe(self, topic):
+        group = self._subscription_group(topic)
+        if group not in self.groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+            # the groups are left by channels on disconnect
+            self.groups = self.groups + [group]
+
+    async def unsubscribe(self, topic):
+        group = topic_group(topic)
+        if group not in self.groups:
+            return False
+        await self.channel_layer.group_discard(group, self.channel_name)
+        self.groups = [g for g in self.groups if g != group]
+        return True
+
+    def _call_timeout(self, data, method):
+        """
+        Timeout of a call: the one of the method, or call_timeout. The request can shorten it with a
+        "timeout" member (seconds).
+        :param dict data: request object
+        :param RpcMethod method:
+        :return: float, None for no timeout
+        """
+        timeout = method.timeout if method.timeout is not None else self.call_timeout
+        hint = data.get('timeout')
+        if isinstance(hint, (int, float)) and not isinstance(hint, bool) and hint > 0:
+            timeout = hint if timeout is None else min(timeout, hint)
+        return timeout
+
+    async def _run_call(self, data, method, params):
+        """
+        Get the result of a call, within its timeout
+        :param dict data: request object
+        :param RpcMethod method:
+        :param params:
+        :return: result
+        """
+        timeout = self._call_timeout(data, method)
+        if timeout is None:
+            return await self.__get_result(method, params)
+        try:
+            return await asyncio.wait_for(self.__get_result(method, params), timeout)
+        except asyncio.TimeoutError:
+            raise JsonRpcException(data.get('id'), self.REQUEST_TIMEOUT)
+
+    async def get_resource(self, name):
+        """
+        Returns a resource of the connection, created on first use. The concurrent calls needing it while it is
+        created wait for the same one.
+        :param str name: name of the resource
+        :return: resource
+        """
+        resources = self._resources
+        if resources is None:
+            resources = self._resources = dict()
+            self._resource_teardowns = []
+            self._resource_uses = set()
+        future = resources.get(name)
+        if future is None:
+            future = resources[name] = asyncio.ensure_future(self._open_resource(self._resource_factory(name),
+                                                                                 self._resource_teardowns))
+        try:
+            # a cancelled call doesn't cancel the creation, other calls may be waiting for it
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # created again by the next call
+            if resources.get(name) is future:
+                del resources[name]
+            raise
+
+    async def _open_resource(self, factory, teardowns):
+        if is_async_factory(factory):
+            resource, teardown = await aopen_resource(factory, self, self._run_sync)
         else:
-            if isinstance(params, list):
-                result = await method(*params)
-            else:
-                result = await method(**params)
+            opening = asyncio.ensure_future(self._run_sync(open_resource, factory, self))
+            try:
+                resource, teardown = await asyncio.shield(opening)
+            except asyncio.CancelledError:
+                # the thread can't be interrupted: the resource is released once created
+                resource, teardown = await opening
+                if teardown is not None:
+                    await aclose_resource(teardown, self._run_sync)
+                raise
+        if teardown is not None:
+            teardowns.append(teardown)
+        return resource
+
+    async def _run_sync(self, func, *args):
+        return await self.get_executor().run(func, *args)
+
+    async def _close_resources(self):
+        resources = self._resources
+        if resources is None:
+            return
+        self._resources = None
+        creations = [future for future in resources.values() if not future.done()]
+        for future in creations:
+            future.cancel()
+        # the resources are not released while being created, or used by methods running in a thread
+        pending = creations + list(self._resource_uses)
+        if pending:
+            await asyncio.wait(pending)
+        for future in creations:
+            if not future.cancelled():
+                future.exception()
+        teardowns = self._resource_teardowns
+        self._resource_teardowns = self._resource_uses = None
+        for teardown in reversed(teardowns):
+            try:
+                await aclose_resource(teardown, self._run_sync)
+            except Exception:
+                logger.exception('Error while releasing a connection resource')
 
+    async def __get_result(self, method, params):
+        if method.injected:
+            # not cached: the result depends on the resources of the connection
+            resources = dict()
+            for name in method.injected:
+                resources[name] = await self.get_resource(name)
+            return await self.__call_method(method, params, resources)
+        if method.cache is not None:
+            return await method.cache.acall(method.cache.key(params), lambda: self.__call_method(method, params))
+        return await self.__call_method(method, params)
+
+    async def __call_method(self, method, params, resources=None):
+        if method.is_coroutine:
+            return await method(self, params, resources)
+
+        # synchronous function: keep it off the event loop
+        func = method
+        if resources:
+            # the resources are released once the thread is done with them
+            func = ThreadedUse(method, asyncio.get_event_loop())
+            self._resource_uses.add(func.done)
+            func.done.add_done_callback(self._resource_uses.discard)
+        try:
+            if method.thread_sensitive is None:
+                result = await self.get_executor().run(func, self, params, resources)
+            else:
+                run = database_sync_to_async(func, thread_sensitive=method.thread_sensitive)
+                result = await run(self, params, resources)
+        except asyncio.CancelledError:
+            if resources:
+                func.abandon()
+            raise
+        if inspect.isawaitable(result):
+            result = await result
         return result
 
     async def __process(self, data, is_notification=False):
@@ -358,134 +1380,803 @@ class AsyncRpcBase(RpcBase):
         """
 
         method = self._get_method(data, is_notification=is_notification)
-        params = self._get_params(data)
+        self._check_rate_limits(data, method)
+        params = self._get_params(data, method)
 
         # log call in debug mode
-        if settings.DEBUG:
-            logger.debug('Executing %s(%s)' % (method.__qualname__, json.dumps(params)))
-
-        result = await self.__get_result(method, params)
+        debug = self._debug_logging()
+        if debug:
+            logger.debug('Executing %s(%s)', method.qualname, self._log_value(params))
+
+        if self.max_concurrent_calls:
+            if self._active_calls >= self.max_concurrent_calls:
+                raise JsonRpcException(data.get('id'), self.TOO_MANY_CONCURRENT_CALLS)
+            self._active_calls += 1
+            try:
+                result = await self._run_call(data, method, params)
+            finally:
+                self._active_calls -= 1
+        else:
+            result = await self._run_call(data, method, params)
+        if self._sample_call():
+            logger.info('Call %s(%s): %s', method.qualname, self._log_value(params), self._log_value(result))
 
         # check and pack result
         if not is_notification:
+            if is_stream(result):
+                # sent by chunks
+                return ResultStream(result, data.get('id'), self.stream_chunk_size)
+
             # log call in debug mode
-            if settings.DEBUG:
-                logger.debug('Execution result: %s' % result)
+            if debug:
+                logger.debug('Execution result: %s', self._log_value(result))
 
-            result = self.json_rpc_frame(result=result, _id=data.get('id'))
+            result = self._result_frame(data.get('id'), result)
         elif result is not None:
             logger.warning("The notification method shouldn't return any result")
-            logger.warning("method: %s, params: %s" % (method.__qualname__, params))
+            logger.warning("method: %s, params: %s", method.qualname, self._log_value(params))
             result = None
 
         return result
 
-    async def _handle(self, data):
+    async def _handle_single(self, data):
+        metrics = self.get_metrics()
+        if metrics is None:
+            return await self._handle_request(data)
+
+        metrics.call_started(type(self).__name__)
+        started = time.monotonic()
+        result = None
+        try:
+            result, is_notification = await self._handle_request(data)
+        finally:
+            self._record_call(metrics, data, result, started)
+        return result, is_notification
+
+    async def _handle_request(self, data):
         """
-        Handle
+        Handle a single request object
         :param data:
-        :return:
+        :return: (result, is_notification)
         """
         result = None
         is_notification = False
 
-        if data is not None:
-            if isinstance(data, dict):
-
-                try:
-                    if data.get('method') is not None and data.get('id') is None:
-                        is_notification = True
-                    result = await self.__process(data, is_notification)
-                except JsonRpcException as e:
-                    result = e.as_dict()
-                except Exception as e:
-                    logger.debug('Application error', e)
-                    result = self.error(data.get('id'),
-                                        self.GENERIC_APPLICATION_ERROR,
-                                        str(e),
-                                        e.args[0] if len(e.args) == 1 else e.args)
-            elif isinstance(data, list):
-                # TODO: implement batch calls
-                if len([x for x in data if not isinstance(x, dict)]):
-                    result = self.error(None, self.INVALID_REQUEST, self.errors[self.INVALID_REQUEST])
+        if isinstance(data, dict):
 
+            try:
+                if data.get('method') is not None and data.get('id') is None:
+                    is_notification = True
+                result = await self.__process(data, is_notification)
+            except JsonRpcException as e:
+                result = e.as_dict()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result = self._application_error(data.get('id'), e)
         else:
             result = self.error(None, self.INVALID_REQUEST, self.errors[self.INVALID_REQUEST])
 
         return result, is_notification
 
-    async def _base_receive_json(self, content):
+    async def _collect_stream(self, result):
+        if not isinstance(result, ResultStream):
+            return result
+        try:
+            return self.json_rpc_frame(result=await result.acollect(self.get_executor().run), _id=result.id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return self._application_error(result.id, e)
+        finally:
+            await result.aclose()
+
+    async def _send_stream(self, stream, binary=False):
+        try:
+            while True:
+                try:
+                    chunk = await stream.anext_chunk(self.get_executor().run)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    response = self._application_error(stream.id, e)
+                    break
+                if not chunk:
+                    response = self.json_rpc_frame(result=stream.count, _id=stream.id)
+                    break
+                await self._send_frame(self._partial_result(stream, chunk), binary)
+        finally:
+            await stream.aclose()
+        await self._send_frame(response, binary)
+
+    async def jsonrpc_call(self, event):
+        result, is_notification = await self._handle(self._loads(event['text']))
+        reply_channel = event.get('reply_channel')
+        if reply_channel is not None and not is_notification:
+            await self.channel_layer.send(reply_channel, self._reply(await self._collect_stream(result)))
+
+    def _batch_concurrency(self):
+        """
+        :return: int, maximum number of batch members executed concurrently, 0 for no limit
+        """
+        # the members of a batch wait for each other rather than exceeding max_concurrent_calls
+        return min([value for value in (self.batch_concurrency, self.max_concurrent_calls) if value] or [0])
+
+    async def _handle_batch(self, batch):
+        """
+        Run the members of a batch concurrently, at most `batch_concurrency` at a time
+        :param list batch: list of request objects
+        :return: list of (result, is_notification) tuples, in the order of the batch
+        """
+        concurrency = self._batch_concurrency()
+        if not concurrency:
+            return await asyncio.gather(*[self._handle_single(item) for item in batch])
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def bounded(item):
+            async with semaphore:
+                return await self._handle_single(item)
+
+        return await asyncio.gather(*[bounded(item) for item in batch])
+
+    async def _handle(self, data):
+        """
+        Handle
+        :param data: request object or batch (list of request objects)
+        :return: (result, is_notification)
+        """
+        if isinstance(data, list) and data:
+            # no await in comprehensions before Python 3.6
+            results = []
+            for result, is_notification in await self._handle_batch(data):
+                results.append((await self._collect_stream(result), is_notification))
+            return self._pack_batch(results)
+
+        return await self._handle_single(data)
+
+    async def _base_receive_json(self, content, binary=False):
         """
         Called when receiving a message.
         :param content: message received
+        :param bool binary: if the message came in a binary frame, the answer is sent the same way
         :return:
         """
         result, is_notification = await self._handle(content)
 
         # Send response back only if it is a call, not notification
-        if not is_notification:
-            await self.send_json(result)
+        if isinstance(result, ResultStream):
+            await self._send_stream(result, binary)
+        elif not is_notification:
+            await self._send_frame(result, binary)
 
 
 class JsonRpcWebsocketConsumer(JsonWebsocketConsumer, RpcBase):
+
+    def receive(self, text_data=None, bytes_data=None, **kwargs):
+        self._record_frame(False, text_data, bytes_data)
+        binary = text_data is None
+        if binary and bytes_data is None:
+            raise ValueError("No text or bytes section for incoming WebSocket frame!")
+        error = self._oversized(len(bytes_data if binary else text_data))
+        if error is None:
+            try:
+                if binary and self.binary_codec is not None:
+                    content = self.binary_codec.loads(bytes_data)
+                else:
+                    content = self.decode_json(bytes_data if binary else text_data)
+            except ValueError:
+                error = self.error(None, self.PARSE_ERROR, self.errors[self.PARSE_ERROR])
+            else:
+                error = self._check_frame(content)
+        if error is None:
+            self.receive_json(content, binary=binary, **kwargs)
+            return
+
+        self._send_frame(error, binary)
+        if self._violation():
+            self.close(code=1008)
+
     def decode_json(self, data):
-       try:
-           return json.loads(data)
-       except json.decoder.JSONDecodeError as e:
-           frame = self.error(None, self.PARSE_ERROR, self.errors[self.PARSE_ERROR])
-           self.send_json(frame)
-           return None
+        return self._loads(data)
 
     def encode_json(self, data):
+        return self._dumps(data)
+
+    def receive_json(self, content, **kwargs):
+        self._base_receive_json(content, **kwargs)
+
+    def _send_frame(self, content, binary=False):
+        """
+        Send a frame, as bytes if the request came in a binary frame (encoded with the subprotocol codec, if any)
+        :param content: frame or list of frames
+        :param bool binary:
+        :return:
+        """
+        bytes_data = self._frame_bytes(content, binary)
+        if bytes_data is not None:
+            self.send(bytes_data=bytes_data)
+        else:
+            self.send_json(content)
+
+    def accept(self, subprotocol=None):
+        if subprotocol is None:
+            subprotocol = self._negotiate_subprotocol()
+        self._connection_opened()
+        super().accept(subprotocol)
+
+    def send(self, text_data=None, bytes_data=None, close=False):
+        self._record_frame(True, text_data, bytes_data)
+        super().send(text_data, bytes_data, close)
+
+    def send_json(self, content, close=False):
+        # through send, so that the frame is recorded
+        self.send(text_data=self.encode_json(content), close=close)
+
+    def websocket_disconnect(self, message):
+        self._connection_closed()
         try:
-            return json.dumps(data)
-        except TypeError:
-            frame = self.error(None, self.PARSE_ERROR, self.errors[self.PARSE_RESULT_ERROR], '%s' % data['result'])
-            return json.dumps(frame)
+            super().websocket_disconnect(message)
+        finally:
+            self._close_resources()
 
-    def receive_json(self, content):
-        self._base_receive_json(content)
+    def jsonrpc_publish(self, event):
+        """
+        Called when a notification is published on a topic the connection is subscribed to
+        """
+        text_data, bytes_data = self._published_data(event['text'])
+        self.send(text_data=text_data, bytes_data=bytes_data)
 
 
 class AsyncJsonRpcWebsocketConsumer(AsyncJsonWebsocketConsumer, AsyncRpcBase):
 
-    async def receive_json(self, content):
-        await self._base_receive_json(content)
+    # Opt-in: process the requests of a connection concurrently, the responses being sent as they complete
+    pipelining = False
+    # Maximum number of requests processed at the same time per connection, when pipelining
+    max_in_flight = 100
+
+    # Method of the notifications cancelling a request in progress, when pipelining
+    CANCEL_REQUEST_METHOD = '$/cancelRequest'
+
+    # Opt-in: queue the notifications sent with notify_channel and send them every notification_flush_interval
+    notification_queue = False
+    # Seconds between two flushes of the queue
+    notification_flush_interval = 0.05
+    # Maximum number of pending notifications, and what to drop when it is reached (drop_oldest or drop_newest)
+    notification_queue_size = 1000
+    notification_overflow = DROP_OLDEST
+    # Send the notifications pending at flush time in a single batch array
+    notification_batching = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # requests being processed, when pipelining
+        self.pending_tasks = set()
+        # calls that can be cancelled, by request id
+        self.calls = dict()
+        self.outbound = None
+        if self.notification_queue:
+            self.outbound = NotificationQueue(self.notification_queue_size, self.notification_overflow)
+        self._flush_task = None
+
+    async def receive(self, text_data=None, bytes_data=None, **kwargs):
+        self._record_frame(False, text_data, bytes_data)
+        binary = text_data is None
+        if binary and bytes_data is None:
+            raise ValueError("No text or bytes section for incoming WebSocket frame!")
+        error = self._oversized(len(bytes_data if binary else text_data))
+        if error is None:
+            try:
+                if binary and self.binary_codec is not None:
+                    content = self.binary_codec.loads(bytes_data)
+                else:
+                    content = await self.decode_json(bytes_data if binary else text_data)
+            except ValueError:
+                error = self.error(None, self.PARSE_ERROR, self.errors[self.PARSE_ERROR])
+            else:
+                error = self._check_frame(content)
+        if error is None:
+            await self.receive_json(content, binary=binary, **kwargs)
+            return
+
+        await self._send_frame(error, binary)
+        if self._violation():
+            await self.close(code=1008)
+
+    async def decode_json(self, text_data):
+        return self._loads(text_data)
+
+    async def encode_json(self, content):
+        return self._dumps(content)
+
+    async def receive_json(self, content, **kwargs):
+        if self.pipelining:
+            if isinstance(content, dict) and content.get('method') == self.CANCEL_REQUEST_METHOD \
+                    and content.get('id') is None:
+                # handled right away, without waiting for a slot
+                params = content.get('params')
+                if isinstance(params, dict):
+                    self.cancel_request(params.get('id'))
+                return
+            await self._start_task(self._base_receive_json(content, **kwargs))
+        else:
+            await self._base_receive_json(content, **kwargs)
+
+    async def _start_task(self, coroutine):
+        """
+        Process a request in its own task, waiting first for a slot if max_in_flight requests are already processed
+        :param coroutine: processing of the request
+        :return:
+        """
+        while self.max_in_flight and len(self.pending_tasks) >= self.max_in_flight:
+            await asyncio.wait(self.pending_tasks, return_when=asyncio.FIRST_COMPLETED)
+
+        task = asyncio.ensure_future(coroutine)
+        self.pending_tasks.add(task)
+        task.add_done_callback(self._task_done)
+
+    async def _run_call(self, data, method, params):
+        _id = data.get('id')
+        if not self.pipelining or not isinstance(_id, (string_types, int, float)) or _id in self.calls:
+            return await super()._run_call(data, method, params)
+
+        # in its own task, so that $/cancelRequest can cancel it
+        call = asyncio.ensure_future(super()._run_call(data, method, params))
+        self.calls[_id] = call
+        try:
+            return await call
+        except asyncio.CancelledError:
+            if self.calls.get(_id) is call:
+                # not cancelled by the client: the connection is closing
+                raise
+            raise JsonRpcException(_id, self.REQUEST_CANCELLED)
+        finally:
+            if self.calls.get(_id) is call:
+                del self.calls[_id]
+
+    def cancel_request(self, _id):
+        """
+        Cancel a call in progress, which gets a Request Cancelled error. Synchronous methods already running in a
+        thread complete anyway.
+        :param _id: id of the request
+        :return: bool, if the call was in progress
+        """
+        try:
+            call = self.calls.pop(_id)
+        except (KeyError, TypeError):
+            return False
+        call.cancel()
+        return True
+
+    def _task_done(self, task):
+        self.pending_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error('Error while processing a request', exc_info=task.exception())
+
+    async def websocket_disconnect(self, message):
+        # abandoned requests are not processed any further
+        tasks = list(self.pending_tasks)
+        for task in tasks:
+            task.cancel()
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        self._connection_closed()
+        try:
+            if tasks:
+                # nothing runs for the connection once it is closed
+                await asyncio.wait(tasks)
+            await super().websocket_disconnect(message)
+        finally:
+            await self._close_resources()
+
+    def notification_key(self, method, params):
+        """
+        Override to coalesce the queued notifications: of the pending notifications sharing a key, only the latest
+        one is sent. By default, notifications are never coalesced.
+        :param method: JSON-RPC method
+        :param params: params of the method
+        :return: hashable key, or None
+        """
+        return None
+
+    async def notify_channel(self, method, params):
+        if self.outbound is None:
+            await super().notify_channel(method, params)
+            return
 
+        content = self.json_rpc_frame(method=method, params=params)
+        key = self.notification_key(method, params)
+        self.outbound.put(content, None if key is None else (method, key))
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_later())
 
-class AsyncRpcHttpConsumer(AsyncHttpConsumer, RpcBase):
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.notification_flush_interval)
+        finally:
+            self._flush_task = None
+        await self.flush_notifications()
+
+    async def flush_notifications(self):
+        """
+        Send the queued notifications now
+        :return:
+        """
+        pending = self.outbound.drain() if self.outbound is not None else []
+        if not pending:
+            return
+        binary = self.binary_codec is not None
+        if self.notification_batching and len(pending) > 1:
+            await self._send_frame(pending, binary)
+            return
+        for content in pending:
+            await self._send_frame(content, binary)
+
+    def backpressure_stats(self):
+        """
+        :return: dict with the depth and counters of the notification queue of the connection, None if disabled
+        """
+        return self.outbound.stats() if self.outbound is not None else None
+
+    async def _send_frame(self, content, binary=False):
+        """
+        Send a frame, as bytes if the request came in a binary frame (encoded with the subprotocol codec, if any)
+        :param content: frame or list of frames
+        :param bool binary:
+        :return:
+        """
+        bytes_data = self._frame_bytes(content, binary)
+        if bytes_data is not None:
+            await self.send(bytes_data=bytes_data)
+        else:
+            await self.send_json(content)
+
+    async def accept(self, subprotocol=None):
+        if subprotocol is None:
+            subprotocol = self._negotiate_subprotocol()
+        self._connection_opened()
+        await super().accept(subprotocol)
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        self._record_frame(True, text_data, bytes_data)
+        await super().send(text_data, bytes_data, close)
+
+    async def send_json(self, content, close=False):
+        # through send, so that the frame is recorded
+        await self.send(text_data=await self.encode_json(content), close=close)
+
+    async def jsonrpc_publish(self, event):
+        """
+        Called when a notification is published on a topic the connection is subscribed to
+        """
+        text_data, bytes_data = self._published_data(event['text'])
+        await self.send(text_data=text_data, bytes_data=bytes_data)
+
+    async def jsonrpc_call(self, event):
+        if self.pipelining:
+            # concurrently with the requests of the client
+            await self._start_task(super().jsonrpc_call(event))
+        else:
+            await super().jsonrpc_call(event)
+
+
+class AsyncRpcHttpConsumer(AsyncHttpConsumer, AsyncRpcBase):
+
+    # Opt-in: split the batches while their body is received, run their members as soon as they are complete and
+    # send the responses back as they come, in a JSON array sent in several parts
+    incremental_batches = False
 
     async def handle(self, body):
         """
         Called on HTTP request
-        :param message: message received
+        :param bytes body: body of the request
         :return:
         """
-        if body != '':
+        self._record_frame(False, bytes_data=body)
+        is_notification = False
+        if body:
             try:
-                data = json.loads(body)
+                data = self._loads(body)
             except ValueError:
                 # json could not decoded
                 result = self.error(None, self.PARSE_ERROR, self.errors[self.PARSE_ERROR])
             else:
-                result, is_notification = self._handle(data)
-
-            # Set response status code
-            # http://www.jsonrpc.org/historical/json-rpc-over-http.html#response-codes
-            if not is_notification:
-                # call response
-                status_code = 200
-                if 'error' in result:
-                    status_code = self._http_codes[result['error']['code']]
-            else:
-                # notification response
-                status_code = 204
-                if result and 'error' in result:
-                    status_code = self._http_codes[result['error']['code']]
-                result = ''
+                result = self._check_frame(data)
+                if result is None:
+                    result, is_notification = await self._handle(data)
         else:
             result = self.error(None, self.INVALID_REQUEST, self.errors[self.INVALID_REQUEST])
 
-        self.send_response(status_code, json.dumps(result), headers=[
+        if isinstance(result, ResultStream):
+            await self._send_stream_response(result)
+        else:
+            await self._send_result(result, is_notification)
+
+    async def http_request(self, message):
+        """
+        Reject the bodies larger than max_frame_size as soon as they are announced or received, without buffering them
+        """
+        if self.max_frame_size is not None:
+            received = self._body_size = self.__dict__.get('_body_size', 0) + len(message.get('body', b''))
+            error = self._oversized(max(received, self._content_length()))
+            if error is not None:
+                self.body = []
+                try:
+                    await self._reject_body(error)
+                finally:
+                    await self.disconnect()
+                    raise StopConsumer()
+        if self.incremental_batches:
+            await self._receive_incrementally(message)
+        else:
+            await super().http_request(message)
+
+    async def _reject_body(self, error):
+        """
+        Answer a body exceeding max_frame_size: with a 413 response, or, if the responses of some batch members were
+        sent already, as the last member of the response array
+        :param dict error:
+        :return:
+        """
+        await self._cancel_batch_members()
+        if not self.__dict__.get('_response_started'):
+            await self._send_result(error, status_code=413)
+            return
+        await self._send_member(error)
+        compressor = self._response_compressor
+        await self.send_body(compressor.finish(b']') if compressor is not None else b']')
+
+    async def http_disconnect(self, message):
+        # the members of a batch are not run any further
+        await self._cancel_batch_members()
+        await super().http_disconnect(message)
+
+    async def _cancel_batch_members(self):
+        members = self.__dict__.get('_batch_members')
+        if members:
+            for task in members:
+                task.cancel()
+            await asyncio.wait(members)
+
+    async def disconnect(self):
+        # called once the response is sent, or when the client is gone: the connection resources live for a request
+        try:
+            await super().disconnect()
+        finally:
+            await self._close_resources()
+
+    async def _receive_incrementally(self, message):
+        """
+        Start the batch members completed by a part of the body. Bodies that are not arrays are handled as usual,
+        once received.
+        :param dict message: http.request message
+        :return:
+        """
+        parser = self.__dict__.get('_batch_parser')
+        if parser is None:
+            parser = self._batch_parser = BatchParser()
+            self._batch_members = []
+            self._batch_size = 0
+            concurrency = self._batch_concurrency()
+            self._batch_semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+            self._response_lock = asyncio.Lock()
+            self._response_compressor = None
+            self._response_started = False
+
+        body = message.get('body', b'')
+        self._batch_size += len(body)
+        for element in parser.feed(body):
+            if self.max_batch_length is not None and len(self._batch_members) >= self.max_batch_length:
+                if len(self._batch_members) == self.max_batch_length:
+                    # the members already started are answered anyway
+                    self._batch_members.append(asyncio.ensure_future(self._send_member(self.error(
+                        None, self.INVALID_REQUEST, self.errors[self.INVALID_REQUEST],
+                        'Batch longer than %d request objects' % self.max_batch_length))))
+                continue
+            self._batch_members.append(asyncio.ensure_future(self._run_member(element)))
+        if message.get('more_body'):
+            return
+
+        try:
+            if parser.is_batch:
+                self._record_frame(False, size=self._batch_size)
+                await self._finish_batch(parser)
+            else:
+                await self.handle(bytes(parser.buffer))
+        finally:
+            await self.disconnect()
+            raise StopConsumer()
+
+    async def _run_member(self, element):
+        if self._batch_semaphore is None:
+            await self._process_member(element)
+            return
+        async with self._batch_semaphore:
+            await self._process_member(element)
+
+    async def _process_member(self, element):
+        """
+        Decode, run and answer a batch member
+        :param bytes element: JSON of the member
+        :return:
+        """
+        is_notification = False
+        try:
+            data = self._loads(element)
+        except ValueError:
+            result = self.error(None, self.PARSE_ERROR, self.errors[self.PARSE_ERROR])
+        else:
+            # checked as a batch of its own
+            result = self._check_frame([data])
+            if result is None:
+                result, is_notification = await self._handle_single(data)
+                result = await self._collect_stream(result)
+        if not is_notification:
+            await self._send_member(result)
+
+    async def _send_member(self, response):
+        """
+        Send the response of a batch member, starting the response array with the first one
+        :param dict response:
+        :return:
+        """
+        async with self._response_lock:
+            if self._response_started:
+                part = b','
+            else:
+                self._response_started = True
+                headers, self._response_compressor = self._stream_headers()
+                await self.send_headers(status=200, headers=headers)
+                part = b'['
+            part += self._dumpb(response)
+            compressor = self._response_compressor
+            await self.send_body(compressor.compress(part) if compressor is not None else part, more_body=True)
+
+    async def _finish_batch(self, parser):
+        """
+        Wait for the batch members, and end the response
+        :param BatchParser parser:
+        :return:
+        """
+        if self._batch_members:
+            await asyncio.gather(*self._batch_members)
+
+        invalid = not parser.done or parser.trailing_data
+        if not self._response_started and (invalid or not parser.count):
+            # nothing was sent yet: regular error response
+            code = self.PARSE_ERROR if invalid else self.INVALID_REQUEST
+            await self._send_result(self.error(None, code, self.errors[code]))
+            return
+        if invalid:
+            # the body is truncated or followed by garbage
+            await self._send_member(self.error(None, self.PARSE_ERROR, self.errors[self.PARSE_ERROR]))
+        if not self._response_started:
+            # only notifications
+            await self._send_result(None, is_notification=True)
+            return
+        compressor = self._response_compressor
+        await self.send_body(compressor.finish(b']') if compressor is not None else b']')
+
+    def _content_length(self):
+        """
+        :return: int, length of the body announced by the client, 0 if unknown
+        """
+        for name, value in self.scope.get('headers', []):
+            if name.lower() == b'content-length':
+                try:
+                    return int(value)
+                except ValueError:
+                    return 0
+        return 0
+
+    async def _send_result(self, result, is_notification=False, status_code=None):
+        """
+        Send the response
+        :param result: response, or list of responses
+        :param bool is_notification:
+        :param int status_code: (optional) status of the response, from the error code by default
+        :return:
+        """
+        # Set response status code
+        # http://www.jsonrpc.org/historical/json-rpc-over-http.html#response-codes
+        if status_code is None:
+            status_code = 200
+            if isinstance(result, dict) and 'error' in result:
+                status_code = self._http_codes.get(result['error']['code'], 500)
+
+        headers = [
             (b'Content-Type', b'application/json-rpc'),
-        ])
+        ]
+        if is_notification:
+            # notification response
+            if status_code == 200:
+                status_code = 204
+            content = b''
+        else:
+            # call response
+            content = self._dumpb(result)
+            if self.compression:
+                headers.append((b'Vary', b'Accept-Encoding'))
+                if len(content) >= self.compression_threshold:
+                    encoding = negotiate_encoding(self.scope.get('headers', []))
+                    if encoding is not None:
+                        content = compress_body(content, encoding, self.compression_level)
+                        headers.append((b'Content-Encoding', encoding.encode('ascii')))
+
+        await self.send_response(status_code, content, headers=headers)
+
+    async def send_body(self, body, *, more_body=False):
+        self._record_frame(True, bytes_data=body)
+        await super().send_body(body, more_body=more_body)
+
+    def _stream_headers(self):
+        """
+        Headers of a response sent in several parts, and the compressor of its body if the client accepts a
+        compressed one
+        :return: (list of headers, BodyCompressor or None)
+        """
+        headers = [
+            (b'Content-Type', b'application/json-rpc'),
+        ]
+        compressor = None
+        if self.compression:
+            headers.append((b'Vary', b'Accept-Encoding'))
+            encoding = negotiate_encoding(self.scope.get('headers', []))
+            if encoding is not None:
+                compressor = BodyCompressor(encoding, self.compression_level)
+                headers.append((b'Content-Encoding', encoding.encode('ascii')))
+        return headers, compressor
+
+    async def _send_stream_response(self, stream):
+        """
+        Send a streamed result: the result array of the response is encoded and sent chunk by chunk.
+        The first chunk is read before answering, so that a method failing right away gets a regular error response.
+        A failure afterwards leaves the response truncated (invalid JSON).
+        :param ResultStream stream:
+        :return:
+        """
+        run_sync = self.get_executor().run
+        try:
+            try:
+                chunk = await stream.anext_chunk(run_sync)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await self._send_result(self._application_error(stream.id, e))
+                return
+
+            headers, compressor = self._stream_headers()
+            await self.send_headers(status=200, headers=headers)
+
+            codec = self.get_codec()
+            part = b'{"jsonrpc": "2.0", "id": ' + codec.dumpb(stream.id) + b', "result": ['
+            separator = b''
+            try:
+                while chunk:
+                    part += separator + b','.join(codec.dumpb(item) for item in chunk)
+                    await self.send_body(compressor.compress(part) if compressor is not None else part,
+                                         more_body=True)
+                    part = b''
+                    separator = b','
+                    chunk = await stream.anext_chunk(run_sync)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.error('Error while streaming the result of request %s', stream.id, exc_info=True)
+                part = b''
+            else:
+                part += b']}'
+            await self.send_body(compressor.finish(part) if compressor is not None else part)
+        finally:
+            await stream.aclose()
+
+
+class AsyncRpcWorkerConsumer(AsyncConsumer, AsyncRpcBase):
+    """
+    Consumer of a channel (see channels.routing.ChannelNameRouter and the runworker command), whose methods are
+    called by the other consumers with call_remote and notify_remote. It has no client: all its methods are
+    available, whatever their transports. The calls are processed one at a time.
+    """
+
+    def _transport(self):
+        return None
@@ -0,0 +1,25 @@
+def check_structure(content, max_depth=None, max_string_length=None):
+    """
+    Check the nesting and the strings of a decoded frame, without recursion
+    :param content: decoded frame
+    :param int max_depth: (optional) maximum nesting of arrays and objects, the frame itself being at depth 1
+    :param int max_string_length: (optional) maximum length of the strings, keys included
+    :return: str, the reason why the frame is rejected, None if it is within the limits
+    """
+    stack = [(content, 1)]
+    while stack:
+        value, depth = stack.pop()
+        if isinstance(value, str):
+            if max_string_length is not None and len(value) > max_string_length:
+                return 'string longer than %d characters' % max_string_length
+        elif isinstance(value, (list, dict)):
+            if max_depth is not None and depth > max_depth:
+                return 'nested deeper than %d levels' % max_depth
+            if isinstance(value, dict):
+                if max_string_length is not None:
+                    for key in value:
+                        if isinstance(key, str) and len(key) > max_string_length:
+                            return 'string longer than %d characters' % max_string_length
+                value = value.values()
+            stack.extend((item, depth + 1) for item in value)
+    return None
@@ -0,0 +1,202 @@
+import asyncio
+import copy
+import inspect
+import typing
+
+from .validation import compile_converter, optional_converter
+
+
+class RpcMethod(object):
+    """
+    Invocation descriptor of an RPC method or notification.
+    Everything dispatch needs to know about the function is resolved once, when it is registered,
+    so that calling it does not require any introspection.
+    """
+
+    __slots__ = ('func', 'name', 'options', 'is_coroutine', 'thread_sensitive', 'cache', 'rate_limit', 'timeout',
+                 'accepts_consumer', 'accepts_varargs', 'positional_names', 'required_positional', 'keyword_names',
+                 'required_keywords', 'converters', 'injected')
+
+    def __init__(self, func, name, options, thread_sensitive=None, cache=None, rate_limit=None, timeout=None):
+        """
+        :param func: the registered function
+        :param str name: RPC name of the function
+        :param dict options: transport options (websocket/http)
+        :param thread_sensitive: how async consumers run the function if it is synchronous: None to use the
+        executor of the consumer, True/False to use database_sync_to_async(thread_sensitive=...)
+        :param cache: (optional) ResultCache of the method
+        :param rate_limit: (optional) RateLimit of the method
+        :param timeout: (optional) timeout of the calls, in seconds (async consumers)
+        """
+        self.func = func
+        self.name = name
+        self.options = options
+        self.is_coroutine = asyncio.iscoroutinefunction(func)
+        self.thread_sensitive = thread_sensitive
+        self.cache = cache
+        self.rate_limit = rate_limit
+        self.timeout = timeout
+
+        self.accepts_consumer = False
+        self.accepts_varargs = False
+        self.positional_names = []
+        self.required_positional = 0
+        self.keyword_names = set()
+        self.required_keywords = set()
+        # param name -> function validating and coercing it, from the type annotations
+        self.converters = dict()
+        # params that are resources of the connection (see with_resources)
+        self.injected = frozenset()
+
+        try:
+            parameters = inspect.signature(func).parameters.values()
+        except (TypeError, ValueError):
+            # No signature available (builtins...): do not check anything
+            self.accepts_varargs = True
+            self.keyword_names = None
+            return
+
+        try:
+            hints = typing.get_type_hints(func)
+        except Exception:
+            # unresolvable forward references...
+            hints = dict()
+
+        for param in parameters:
+            if param.name in hints and param.kind not in (param.VAR_KEYWORD, param.VAR_POSITIONAL):
+                converter = compile_converter(hints[param.name])
+                if converter is not None:
+                    self.converters[param.name] = optional_converter(converter) if param.default is None \
+                        else converter
+
+            if param.kind == param.VAR_KEYWORD:
+                self.accepts_consumer = True
+            elif param.kind == param.VAR_POSITIONAL:
+                self.accepts_varargs = True
+            elif param.kind == param.KEYWORD_ONLY:
+                self.keyword_names.add(param.name)
+                if param.default is param.empty:
+                    self.required_keywords.add(param.name)
+            else:
+                self.positional_names.append(param.name)
+                if param.kind == param.POSITIONAL_OR_KEYWORD:
+                    self.keyword_names.add(param.name)
+                if param.default is param.empty:
+                    self.required_positional += 1
+
+    def with_resources(self, names):
+        """
+        Copy of the method whose params named after a resource of the connection are injected, instead of being
+        taken from the request
+        :param names: names of the resources of the consumer
+        :return: RpcMethod, self if none of its params is a resource
+        """
+        injected = self.keyword_names.intersection(names) if self.keyword_names else None
+        if injected and self.accepts_varargs:
+            # the positional params are filled in order by the lists of params, only the keyword-only ones can be
+            # injected
+            injected.difference_update(self.positional_names)
+        if not injected:
+            return self
+
+        method = copy.copy(self)
+        method.injected = frozenset(injected)
+        method.keyword_names = self.keyword_names - injected
+        method.required_keywords = self.required_keywords - injected
+        method.positional_names = [name for name in self.positional_names if name not in injected]
+        method.required_positional = len([name for name in self.positional_names[:self.required_positional]
+                                          if name not in injected])
+        method.converters = {name: converter for name, converter in self.converters.items() if name not in injected}
+        return method
+
+    @property
+    def qualname(self):
+        return getattr(self.func, '__qualname__', self.name)
+
+    def check_params(self, params):
+        """
+        Check the params against the signature of the function
+        :param params: list or dict of params
+        :return: None if the params are valid, the reason why they are not otherwise
+        """
+        if isinstance(params, list):
+            if len(params) < self.required_positional:
+                return 'missing positional parameter(s): %s' % ', '.join(
+                    self.positional_names[len(params):self.required_positional])
+            if not self.accepts_varargs and len(params) > len(self.positional_names):
+                return 'takes %d positional parameter(s) but %d were given' % (len(self.positional_names),
+                                                                              len(params))
+            if self.required_keywords:
+                return 'missing keyword parameter(s): %s' % ', '.join(sorted(self.required_keywords))
+            return None
+
+        if self.accepts_consumer and 'consumer' in params:
+            return "unexpected parameter: consumer"
+        if self.injected and not self.injected.isdisjoint(params):
+            return 'unexpected parameter(s): %s' % ', '.join(sorted(self.injected.intersection(params)))
+        if self.keyword_names is None:
+            return None
+        if not self.accepts_consumer:
+            unexpected = [key for key in params if key not in self.keyword_names]
+            if unexpected:
+                return 'unexpected parameter(s): %s' % ', '.join(sorted(unexpected))
+        missing = [name for name in self.positional_names[:self.required_positional] if name not in params]
+        missing.extend(sorted(name for name in self.required_keywords if name not in params))
+        if missing:
+            return 'missing parameter(s): %s' % ', '.join(missing)
+        return None
+
+    def convert_params(self, params):
+        """
+        Validate and coerce the params according to the type annotations of the function
+        :param params: list or dict of params, already checked by check_params
+        :return: (params, errors): the coerced params, and a dict of the reasons why params are invalid (None if
+        they are all valid)
+        """
+        errors = None
+        if isinstance(params, list):
+            converted = list(params)
+            items = zip(range(len(params)), self.positional_names, params)
+        else:
+            converted = dict(params)
+            items = ((name, name, value) for name, value in params.items())
+
+        for key, name, value in items:
+            converter = self.converters.get(name)
+            if converter is None:
+                continue
+            try:
+                converted[key] = converter(value)
+            except ValueError as e:
+                if errors is None:
+                    errors = dict()
+                errors[name] = str(e)
+        return converted, errors
+
+    def __call__(self, consumer, params, resources=None):
+        """
+        Call the function with the params, passing the consumer along if the function accepts **kwargs
+        :param consumer: the consumer handling the call
+        :param params: list or dict of params
+        :param dict resources: (optional) values of the injected params
+        :return: the result of the function (a coroutine for async functions)
+        """
+        if resources:
+            if isinstance(params, list) and not self.accepts_varargs:
+                # by name, wherever the injected params are in the signature
+                params = dict(zip(self.positional_names, params))
+            kwargs = dict(resources)
+            if self.accepts_consumer:
+                kwargs['consumer'] = consumer
+            if isinstance(params, list):
+                return self.func(*params, **kwargs)
+            kwargs.update(params)
+            return self.func(**kwargs)
+
+        if self.accepts_consumer:
+            if isinstance(params, list):
+                return self.func(*params, consumer=consumer)
+            return self.func(consumer=consumer, **params)
+        if isinstance(params, list):
+            return self.func(*params)
+        return self.func(**params)
@@ -0,0 +1,206 @@
+import threading
+from bisect import bisect_left
+
+from channels.generic.http import AsyncHttpConsumer
+
+# Buckets of the latency histograms, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Buckets of the frame size histograms, in bytes
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152)
+
+# Label of the calls to methods that don't exist, so that clients can't blow the number of series up
+UNKNOWN_METHOD = '<unknown>'
+
+
+class MetricsCollector(object):
+    """
+    Interface of the metrics collectors of the consumers (see RpcBase.metrics). This one records nothing.
+    The hooks are called on the hot path: they should be cheap and must not raise.
+    """
+
+    def call_started(self, consumer):
+        """
+        A request object starts being processed
+        :param str consumer: name of the consumer class
+        """
+
+    def call_finished(self, consumer, method, duration, code=None):
+        """
+        A request object has been processed
+        :param str consumer: name of the consumer class
+        :param str method: RPC name of the method
+        :param float duration: processing time, in seconds
+        :param code: JSON-RPC error code, None on success
+        """
+
+    def frame_received(self, consumer, size):
+        """
+        :param str consumer: name of the consumer class
+        :param int size: size of the request (websocket frame or http body)
+        """
+
+    def frame_sent(self, consumer, size):
+        """
+        :param str consumer: name of the consumer class
+        :param int size: size of the response (websocket frame or http body part)
+        """
+
+    def connection_opened(self, consumer):
+        pass
+
+    def connection_closed(self, consumer):
+        pass
+
+    def exposition(self):
+        """
+        :return: str, the metrics in the Prometheus text format
+        """
+        return ''
+
+
+class Histogram(object):
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # last one for the values above the highest bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ','.join('%s="%s"' % (name, _escape(value)) for name, value in zip(names, values))
+
+
+class InMemoryCollector(MetricsCollector):
+    """
+    Collector keeping the metrics of the process in memory, without dependencies
+    """
+
+    def __init__(self, latency_buckets=LATENCY_BUCKETS, size_buckets=SIZE_BUCKETS):
+        self.latency_buckets = latency_buckets
+        self.size_buckets = size_buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # (consumer, method) -> count
+            self.calls = dict()
+            # (consumer, method, code) -> count
+            self.errors = dict()
+            # (consumer, method) -> Histogram
+            self.latencies = dict()
+            # consumer -> Histogram
+            self.request_sizes = dict()
+            self.response_sizes = dict()
+            # consumer -> gauge
+            self.in_flight = dict()
+            self.connections = dict()
+
+    def call_started(self, consumer):
+        with self._lock:
+            self.in_flight[consumer] = self.in_flight.get(consumer, 0) + 1
+
+    def call_finished(self, consumer, method, duration, code=None):
+        key = (consumer, method)
+        with self._lock:
+            self.in_flight[consumer] = self.in_flight.get(consumer, 0) - 1
+            self.calls[key] = self.calls.get(key, 0) + 1
+            if code is not None:
+                error_key = (consumer, method, code)
+                self.errors[error_key] = self.errors.get(error_key, 0) + 1
+            histogram = self.latencies.get(key)
+            if histogram is None:
+                histogram = self.latencies[key] = Histogram(self.latency_buckets)
+            histogram.observe(duration)
+
+    def _observe_size(self, histograms, consumer, size):
+        with self._lock:
+            histogram = histograms.get(consumer)
+            if histogram is None:
+                histogram = histograms[consumer] = Histogram(self.size_buckets)
+            histogram.observe(size)
+
+    def frame_received(self, consumer, size):
+        self._observe_size(self.request_sizes, consumer, size)
+
+    def frame_sent(self, consumer, size):
+        self._observe_size(self.response_sizes, consumer, size)
+
+    def connection_opened(self, consumer):
+        with self._lock:
+            self.connections[consumer] = self.connections.get(consumer, 0) + 1
+
+    def connection_closed(self, consumer):
+        with self._lock:
+            self.connections[consumer] = self.connections.get(consumer, 0) - 1
+
+    @staticmethod
+    def _render_values(lines, name, kind, help_text, label_names, values):
+        lines.append('# HELP %s %s' % (name, help_text))
+        lines.append('# TYPE %s %s' % (name, kind))
+        for key, value in sorted(values.items()):
+            key = key if isinstance(key, tuple) else (key,)
+            lines.append('%s{%s} %s' % (name, _labels(label_names, key), value))
+
+    @staticmethod
+    def _render_histograms(lines, name, help_text, label_names, histograms):
+        lines.append('# HELP %s %s' % (name, help_text))
+        lines.append('# TYPE %s histogram' % name)
+        for key, histogram in sorted(histograms.items()):
+            labels = _labels(label_names, key if isinstance(key, tuple) else (key,))
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                cumulative += count
+                lines.append('%s_bucket{%s,le="%s"} %s' % (name, labels, '+Inf' if bound == float('inf') else bound,
+                                                           cumulative))
+            lines.append('%s_sum{%s} %s' % (name, labels, histogram.sum))
+            lines.append('%s_count{%s} %s' % (name, labels, histogram.count))
+
+    def exposition(self):
+        lines = []
+        with self._lock:
+            self._render_values(lines, 'jsonrpc_calls_total', 'counter', 'Processed request objects',
+                                ('consumer', 'method'), self.calls)
+            self._render_values(lines, 'jsonrpc_errors_total', 'counter', 'Error responses, by JSON-RPC error code',
+                                ('consumer', 'method', 'code'), self.errors)
+            self._render_histograms(lines, 'jsonrpc_call_duration_seconds', 'Processing time of the request objects',
+                                    ('consumer', 'method'), self.latencies)
+            self._render_histograms(lines, 'jsonrpc_request_size_bytes', 'Size of the received frames and bodies',
+                                    ('consumer',), self.request_sizes)
+            self._render_histograms(lines, 'jsonrpc_response_size_bytes', 'Size of the sent frames and bodies',
+                                    ('consumer',), self.response_sizes)
+            self._render_values(lines, 'jsonrpc_calls_in_flight', 'gauge', 'Request objects being processed',
+                                ('consumer',), self.in_flight)
+            self._render_values(lines, 'jsonrpc_open_connections', 'gauge', 'Open websocket connections',
+                                ('consumer',), self.connections)
+        return '\n'.join(lines) + '\n'
+
+
+# Collector of the consumers whose metrics attribute is True
+default_collector = InMemoryCollector()
+
+
+class MetricsHttpConsumer(AsyncHttpConsumer):
+    """
+    Text exposition endpoint of the metrics, to be scraped by Prometheus
+    """
+
+    # collector to expose, the default one if None
+    collector = None
+
+    async def handle(self, body):
+        collector = self.collector if self.collector is not None else default_collector
+        await self.send_response(200, collector.exposition().encode('utf-8'),
+                                 headers=[(b'Content-Type', b'text/plain; version=0.0.4; charset=utf-8')])
@@ -0,0 +1,88 @@
+from collections import OrderedDict
+
+# What to do with a new notification when the queue is full
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+
+
+class NotificationQueue(object):
+    """
+    Outbound queue of the notifications of a connection, flushed periodically by the consumer.
+    Notifications sharing a coalescing key replace each other: only the latest one is sent. When the queue is full,
+    the oldest notification (or the new one, with DROP_NEWEST) is dropped.
+    """
+
+    def __init__(self, max_size=1000, overflow=DROP_OLDEST):
+        """
+        :param int max_size: maximum number of pending notifications
+        :param str overflow: DROP_OLDEST or DROP_NEWEST
+        """
+        if overflow not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError('Unknown overflow policy: %s' % overflow)
+        self.max_size = max_size
+        self.overflow = overflow
+        self._pending = OrderedDict()
+        self._sequence = 0
+        self.enqueued = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.sent = 0
+        self.flushes = 0
+        self.max_depth = 0
+
+    def put(self, content, key=None):
+        """
+        Queue a notification
+        :param content: notification frame
+        :param key: (optional) coalescing key, a pending notification with the same key is replaced
+        :return: bool, if the notification was queued
+        """
+        self.enqueued += 1
+        if key is None:
+            self._sequence += 1
+            key = (None, self._sequence)
+        elif key in self._pending:
+            self.coalesced += 1
+            self._pending[key] = content
+            self._pending.move_to_end(key)
+            return True
+
+        if len(self._pending) >= self.max_size:
+            self.dropped += 1
+            if self.overflow == DROP_NEWEST:
+                return False
+            self._pending.popitem(last=False)
+
+        self._pending[key] = content
+        self.max_depth = max(self.max_depth, len(self._pending))
+        return True
+
+    def drain(self):
+        """
+        Remove all the pending notifications
+        :return: list of notification frames, oldest first
+        """
+        pending = list(self._pending.values())
+        self._pending.clear()
+        if pending:
+            self.sent += len(pending)
+            self.flushes += 1
+        return pending
+
+    def stats(self):
+        """
+        :return: dict with the current and maximum depth of the queue and the notification counters
+        """
+        return {
+            'depth': len(self._pending),
+            'max_depth': self.max_depth,
+            'max_size': self.max_size,
+            'enqueued': self.enqueued,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'sent': self.sent,
+            'flushes': self.flushes,
+        }
+
+    def __len__(self):
+        return len(self._pending)
@@ -0,0 +1,91 @@
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+    In-process token bucket: `rate` tokens per second, up to `capacity` tokens
+    """
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', '_lock')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token
+        :return: bool, False if the bucket is empty
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class RateLimit(object):
+    """
+    Rate limit of the calls of a consumer (RpcBase.rate_limit) or of a method (rpc_method(rate_limit=...)):
+    `rate` calls per second on average, with bursts of at most `burst` calls.
+
+    By default, each websocket connection has its own limit. Shared limits apply to all the connections of the
+    process, or of all the workers when they are kept in a Django cache. The Django cache counts the calls in
+    fixed windows of burst / rate seconds, which allows up to twice the burst across a window boundary.
+    """
+
+    def __init__(self, rate, burst=None, per_connection=True, cache=None, key_prefix='jsonrpc-ratelimit'):
+        """
+        :param float rate: calls per second
+        :param int burst: (optional) maximum number of calls in a burst, rate by default (at least 1)
+        :param bool per_connection: False to share the limit between all the connections
+        :param str cache: (optional) alias of the Django cache sharing the limit between workers, if not per_connection
+        :param str key_prefix: prefix of the keys in the Django cache
+        """
+        if rate <= 0:
+            raise ValueError('The rate must be positive')
+        if per_connection and cache is not None:
+            raise ValueError('Only shared limits can be kept in a Django cache')
+        self.rate = rate
+        self.burst = burst if burst is not None else max(int(rate), 1)
+        self.per_connection = per_connection
+        self.cache = cache
+        self.key_prefix = key_prefix
+        self._bucket = TokenBucket(self.rate, self.burst)
+
+    def acquire(self, buckets, key):
+        """
+        Admit a call
+        :param dict buckets: buckets of the connection
+        :param str key: name of the limit (consumer or method), unique across workers
+        :return: bool, False if the call exceeds the limit
+        """
+        if self.cache is not None:
+            return self._acquire_cached(key)
+        if not self.per_connection:
+            return self._bucket.acquire()
+
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(self.rate, self.burst)
+        return bucket.acquire()
+
+    def _acquire_cached(self, key):
+        from django.core.cache import caches
+        cache = caches[self.cache]
+        window = self.burst / self.rate
+        cache_key = '%s:%s:%d' % (self.key_prefix, key, time.time() // window)
+        # expires with its window, with some margin for the clock skew between workers
+        cache.add(cache_key, 0, int(window) + 2)
+        try:
+            return cache.incr(cache_key) <= self.burst
+        except ValueError:
+            # expired in between
+            return True
@@ -0,0 +1,32 @@
+import itertools
+
+# Type of the channel layer messages carrying a request for the consumer of a channel (handled by jsonrpc_call)
+CALL_EVENT = 'jsonrpc.call'
+# Type of the messages carrying the response, sent to the reply channel of the caller
+REPLY_EVENT = 'jsonrpc.reply'
+
+# Ids of the requests sent by call_remote, unique in the process
+call_ids = itertools.count(1)
+
+
+class RemoteCallError(Exception):
+    """
+    Raised by call_remote when the remote method fails, or doesn't answer in time
+    """
+
+    def __init__(self, code, message, data=None):
+        """
+        :param int code: JSON-RPC error code
+        :param str message: message of the error
+        :param data: (optional) data of the error
+        """
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.data = data
+
+    def as_dict(self):
+        error = {'code': self.code, 'message': self.message}
+        if self.data is not None:
+            error['data'] = self.data
+        return error
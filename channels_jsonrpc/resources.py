@@ -0,0 +1,108 @@
+import asyncio
+import inspect
+import threading
+
+_isasyncgenfunction = getattr(inspect, 'isasyncgenfunction', lambda f: False)
+
+
+def open_resource(factory, consumer):
+    """
+    Create a resource of a connection. Factories that are generators yield the resource, and release it after
+    the yield.
+    :param factory: function taking the consumer
+    :param consumer:
+    :return: (resource, generator to resume on teardown or None)
+    """
+    resource = factory(consumer)
+    if inspect.isgenerator(resource):
+        return next(resource), resource
+    return resource, None
+
+
+def close_resource(teardown):
+    """
+    Run the code of a generator factory after its yield
+    :param teardown: generator
+    :return:
+    """
+    try:
+        next(teardown)
+    except StopIteration:
+        return
+    teardown.close()
+
+
+async def aopen_resource(factory, consumer, run_sync):
+    """
+    Same as open_resource, for the coroutine functions and async generators as well
+    :param factory:
+    :param consumer:
+    :param run_sync: coroutine function running a synchronous function off the event loop
+    :return: (resource, generator or async generator to resume on teardown, or None)
+    """
+    if asyncio.iscoroutinefunction(factory):
+        return await factory(consumer), None
+    if _isasyncgenfunction(factory):
+        teardown = factory(consumer)
+        return await teardown.__anext__(), teardown
+    return await run_sync(open_resource, factory, consumer)
+
+
+async def aclose_resource(teardown, run_sync):
+    if not hasattr(teardown, '__anext__'):
+        await run_sync(close_resource, teardown)
+        return
+    try:
+        await teardown.__anext__()
+    except StopAsyncIteration:
+        return
+    await teardown.aclose()
+
+
+class ThreadedUse(object):
+    """
+    Synchronous function using resources of a connection, run in a thread. The resources are released once `done`
+    is set: when the function returned, or when it was abandoned before it started.
+    """
+
+    __slots__ = ('func', 'loop', 'done', '_lock', '_state')
+
+    def __init__(self, func, loop):
+        self.func = func
+        self.loop = loop
+        self.done = loop.create_future()
+        self._lock = threading.Lock()
+        # None until the function is started or abandoned
+        self._state = None
+
+    def __call__(self, *args):
+        with self._lock:
+            if self._state is not None:
+                return None
+            self._state = 'running'
+        try:
+            return self.func(*args)
+        finally:
+            self.loop.call_soon_threadsafe(self._finish)
+
+    def abandon(self):
+        """
+        Called when the caller stops waiting for the function: if it was not started, it won't be
+        :return:
+        """
+        with self._lock:
+            if self._state is None:
+                self._state = 'abandoned'
+                self._finish()
+
+    def _finish(self):
+        if not self.done.done():
+            self.done.set_result(None)
+
+
+def is_async_factory(factory):
+    """
+    :param factory:
+    :return: bool, if the factory can only be used by the async consumers
+    """
+    return asyncio.iscoroutinefunction(factory) or _isasyncgenfunction(factory)
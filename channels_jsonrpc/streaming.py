@@ -0,0 +1,108 @@
+import inspect
+import itertools
+
+# Method of the notifications carrying the chunks of a streamed result, on the websocket consumers
+PARTIAL_RESULT_METHOD = 'rpc.partialResult'
+
+
+def is_stream(result, asynchronous=True):
+    """
+    Tell if the result of a method has to be streamed
+    :param result: result of a method
+    :param bool asynchronous: if async iterators are supported
+    :return: bool
+    """
+    return inspect.isgenerator(result) or (asynchronous and hasattr(result, '__anext__'))
+
+
+def is_stream_function(func):
+    """
+    Tell if a function returns a generator or an async generator
+    :param func:
+    :return: bool
+    """
+    return inspect.isgeneratorfunction(func) or getattr(inspect, 'isasyncgenfunction', lambda f: False)(func)
+
+
+class ResultStream(object):
+    """
+    Result of a method returning a generator or an async iterator. The transports send it in chunks of chunk_size
+    items, so that it is never held in memory as a whole.
+    """
+
+    __slots__ = ('iterator', 'id', 'chunk_size', 'count')
+
+    def __init__(self, iterator, _id, chunk_size=100):
+        """
+        :param iterator: generator or async iterator
+        :param _id: id of the request
+        :param int chunk_size: maximum number of items per chunk
+        """
+        self.iterator = iterator
+        self.id = _id
+        self.chunk_size = chunk_size
+        # number of items read so far
+        self.count = 0
+
+    @property
+    def asynchronous(self):
+        return hasattr(self.iterator, '__anext__')
+
+    def next_chunk(self):
+        """
+        Read the next items of a generator
+        :return: list of at most chunk_size items, empty once the stream is exhausted
+        """
+        chunk = list(itertools.islice(self.iterator, self.chunk_size))
+        self.count += len(chunk)
+        return chunk
+
+    async def anext_chunk(self, run_sync):
+        """
+        Same as next_chunk, for generators and async iterators
+        :param run_sync: coroutine function running a synchronous function off the event loop
+        :return: list
+        """
+        if not self.asynchronous:
+            return await run_sync(self.next_chunk)
+
+        chunk = []
+        while len(chunk) < self.chunk_size:
+            try:
+                chunk.append(await self.iterator.__anext__())
+            except StopAsyncIteration:
+                break
+        self.count += len(chunk)
+        return chunk
+
+    def collect(self):
+        """
+        Read all the remaining items
+        :return: list
+        """
+        items = list(self.iterator)
+        self.count += len(items)
+        return items
+
+    async def acollect(self, run_sync):
+        items = []
+        chunk = await self.anext_chunk(run_sync)
+        while chunk:
+            items.extend(chunk)
+            chunk = await self.anext_chunk(run_sync)
+        return items
+
+    def close(self):
+        """
+        Release a generator that won't be read any further
+        :return:
+        """
+        if inspect.isgenerator(self.iterator):
+            self.iterator.close()
+
+    async def aclose(self):
+        aclose = getattr(self.iterator, 'aclose', None)
+        if aclose is not None:
+            await aclose()
+        else:
+            self.close()
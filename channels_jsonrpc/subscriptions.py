@@ -0,0 +1,49 @@
+import hashlib
+import re
+
+# Type of the channel layer messages carrying a published notification (handled by jsonrpc_publish)
+PUBLISH_EVENT = 'jsonrpc.publish'
+
+GROUP_PREFIX = 'jsonrpc.'
+
+_valid_group = re.compile(r'^[a-zA-Z\d\-_.]+$')
+
+
+def topic_group(topic):
+    """
+    Returns the name of the channel layer group of a topic. Topics that are not valid group names are hashed.
+    :param str topic:
+    :return: str
+    """
+    group = GROUP_PREFIX + topic
+    if len(group) < 100 and _valid_group.match(group):
+        return group
+    return GROUP_PREFIX + hashlib.sha1(topic.encode('utf-8')).hexdigest()
+
+
+def rpc_subscribe(topic, **kwargs):
+    """
+    Built-in method: subscribe the connection to a topic
+    :param str topic:
+    :return: True
+    """
+    kwargs['consumer'].subscribe(topic)
+    return True
+
+
+def rpc_unsubscribe(topic, **kwargs):
+    """
+    Built-in method: unsubscribe the connection from a topic
+    :param str topic:
+    :return: bool, if the connection was subscribed to the topic
+    """
+    return kwargs['consumer'].unsubscribe(topic)
+
+
+async def async_rpc_subscribe(topic, **kwargs):
+    await kwargs['consumer'].subscribe(topic)
+    return True
+
+
+async def async_rpc_unsubscribe(topic, **kwargs):
+    return await kwargs['consumer'].unsubscribe(topic)
@@ -0,0 +1,187 @@
+import datetime
+import decimal
+import types
+import typing
+import uuid
+
+from django.utils.dateparse import parse_date, parse_datetime, parse_time
+
+NoneType = type(None)
+# int | None (Python 3.10+)
+UnionType = getattr(types, 'UnionType', None)
+
+
+def _json_type(value):
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, (int, float)):
+        return 'number'
+    if isinstance(value, str):
+        return 'string'
+    if isinstance(value, list):
+        return 'array'
+    if isinstance(value, dict):
+        return 'object'
+    return type(value).__name__
+
+
+def _expected(expected, value):
+    return ValueError('expected %s, got %s' % (expected, _json_type(value)))
+
+
+def _convert_int(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    raise _expected('integer', value)
+
+
+def _convert_float(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    raise _expected('number', value)
+
+
+def _instance_converter(cls, expected):
+    def convert(value):
+        if isinstance(value, cls):
+            return value
+        raise _expected(expected, value)
+    return convert
+
+
+def _convert_decimal(value):
+    if isinstance(value, (int, float, str)) and not isinstance(value, bool):
+        try:
+            return decimal.Decimal(str(value))
+        except decimal.InvalidOperation:
+            pass
+    raise _expected('decimal', value)
+
+
+def _parser_converter(parse, expected):
+    def convert(value):
+        if isinstance(value, str):
+            try:
+                parsed = parse(value)
+            except ValueError:
+                parsed = None
+            if parsed is not None:
+                return parsed
+        raise _expected(expected, value)
+    return convert
+
+
+def _convert_uuid(value):
+    if isinstance(value, str):
+        try:
+            return uuid.UUID(value)
+        except ValueError:
+            pass
+    raise _expected('UUID', value)
+
+
+_CONVERTERS = {
+    int: _convert_int,
+    float: _convert_float,
+    str: _instance_converter(str, 'string'),
+    bool: _instance_converter(bool, 'boolean'),
+    list: _instance_converter(list, 'array'),
+    dict: _instance_converter(dict, 'object'),
+    NoneType: _instance_converter(NoneType, 'null'),
+    decimal.Decimal: _convert_decimal,
+    datetime.datetime: _parser_converter(parse_datetime, 'ISO 8601 datetime'),
+    datetime.date: _parser_converter(parse_date, 'ISO 8601 date'),
+    datetime.time: _parser_converter(parse_time, 'ISO 8601 time'),
+    uuid.UUID: _convert_uuid,
+}
+
+
+def _list_converter(item_converter):
+    def convert(value):
+        if not isinstance(value, list):
+            raise _expected('array', value)
+        if item_converter is None:
+            return value
+        result = []
+        for index, item in enumerate(value):
+            try:
+                result.append(item_converter(item))
+            except ValueError as e:
+                raise ValueError('item %d: %s' % (index, e))
+        return result
+    return convert
+
+
+def _dict_converter(value_converter):
+    def convert(value):
+        if not isinstance(value, dict):
+            raise _expected('object', value)
+        if value_converter is None:
+            return value
+        result = dict()
+        for key, item in value.items():
+            try:
+                result[key] = value_converter(item)
+            except ValueError as e:
+                raise ValueError('key %s: %s' % (key, e))
+        return result
+    return convert
+
+
+def _union_converter(converters):
+    def convert(value):
+        errors = []
+        for converter in converters:
+            try:
+                return converter(value)
+            except ValueError as e:
+                errors.append(str(e))
+        raise ValueError(' or '.join(errors))
+    return convert
+
+
+def compile_converter(annotation):
+    """
+    Build the function validating and coercing a param from its type annotation.
+    Supported: int, float, str, bool, list, dict, None, Decimal, datetime, date, time, UUID and the typing List,
+    Dict, Union and Optional of them. Other annotations are not checked.
+    :param annotation:
+    :return: function taking the value of the param, returning the coerced value and raising ValueError with the
+    reason if it is invalid. None if the annotation is not supported.
+    """
+    if annotation is None:
+        annotation = NoneType
+    converter = _CONVERTERS.get(annotation)
+    if converter is not None:
+        return converter
+
+    origin = getattr(annotation, '__origin__', None)
+    args = getattr(annotation, '__args__', None) or ()
+    if origin is typing.Union or (UnionType is not None and isinstance(annotation, UnionType)):
+        converters = [compile_converter(arg) for arg in args]
+        if None in converters:
+            # one of the members is not supported: the value can't be checked
+            return None
+        return _union_converter(converters)
+    if origin in (list, typing.List):
+        return _list_converter(compile_converter(args[0]) if args else None)
+    if origin in (dict, typing.Dict):
+        return _dict_converter(compile_converter(args[1]) if len(args) == 2 else None)
+    return None
+
+
+def optional_converter(converter):
+    """
+    Accept None as well, for the params whose default value is None
+    :param converter:
+    :return: converter
+    """
+    def convert(value):
+        if value is None:
+            return None
+        return converter(value)
+    return convert
@@ -0,0 +1,239 @@
+"""
+Benchmarks of the dispatch path of the consumers: calls per second and latency percentiles of JsonRpcWebsocketConsumer,
+AsyncJsonRpcWebsocketConsumer and AsyncRpcHttpConsumer, for several payload sizes, batch sizes, ratios of
+notifications and numbers of concurrent connections. Each dimension is varied in turn from a baseline scenario.
+
+Run from the example directory:
+
+    DJANGO_SETTINGS_MODULE=django_example.settings python -m django_example.benchmark --output results.json
+
+The results are written as JSON (a list of scenarios with their measures), to compare them between releases.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.testing import HttpCommunicator, WebsocketCommunicator
+from django.conf.urls import url
+
+from channels_jsonrpc import AsyncJsonRpcWebsocketConsumer, AsyncRpcHttpConsumer, JsonRpcWebsocketConsumer
+
+
+class BenchJsonRpcWebsocketConsumer(JsonRpcWebsocketConsumer):
+    pass
+
+
+class BenchAsyncJsonRpcWebsocketConsumer(AsyncJsonRpcWebsocketConsumer):
+    pass
+
+
+class BenchAsyncRpcHttpConsumer(AsyncRpcHttpConsumer):
+    pass
+
+
+@BenchJsonRpcWebsocketConsumer.rpc_method('echo')
+def echo(payload):
+    return payload
+
+
+@BenchJsonRpcWebsocketConsumer.rpc_notification('notify')
+def notify(payload):
+    pass
+
+
+@BenchAsyncJsonRpcWebsocketConsumer.rpc_method('echo')
+@BenchAsyncRpcHttpConsumer.rpc_method('echo')
+async def async_echo(payload):
+    return payload
+
+
+@BenchAsyncJsonRpcWebsocketConsumer.rpc_notification('notify')
+@BenchAsyncRpcHttpConsumer.rpc_notification('notify')
+async def async_notify(payload):
+    pass
+
+
+application = ProtocolTypeRouter({
+    'http': URLRouter([
+        url(r'^rpc/$', BenchAsyncRpcHttpConsumer),
+    ]),
+    'websocket': URLRouter([
+        url(r'^sync/$', BenchJsonRpcWebsocketConsumer),
+        url(r'^async/$', BenchAsyncJsonRpcWebsocketConsumer),
+    ]),
+})
+
+# Consumer of each transport: name -> websocket path (None for http)
+CONSUMERS = {
+    'JsonRpcWebsocketConsumer': '/sync/',
+    'AsyncJsonRpcWebsocketConsumer': '/async/',
+    'AsyncRpcHttpConsumer': None,
+}
+
+BASELINE = {'payload_size': 64, 'batch_size': 1, 'notification_ratio': 0.0, 'connections': 1}
+
+# Values taken by each dimension, the other ones keeping their baseline value
+DIMENSIONS = {
+    'payload_size': (1024, 65536),
+    'batch_size': (10, 100),
+    'notification_ratio': (0.5,),
+    'connections': (10,),
+}
+
+
+def scenarios():
+    """
+    :return: list of scenarios (dicts with a value for each dimension)
+    """
+    result = [dict(BASELINE)]
+    for dimension, values in sorted(DIMENSIONS.items()):
+        for value in values:
+            scenario = dict(BASELINE)
+            scenario[dimension] = value
+            result.append(scenario)
+    return result
+
+
+def build_messages(scenario, count):
+    """
+    Build the messages sent by a connection
+    :param dict scenario:
+    :param int count: number of messages
+    :return: list of (message, expects_response) tuples
+    """
+    payload = 'x' * scenario['payload_size']
+    batch_size = scenario['batch_size']
+    # notifications every `period` request objects
+    period = int(round(1 / scenario['notification_ratio'])) if scenario['notification_ratio'] else 0
+
+    messages = []
+    index = 0
+    for i in range(count):
+        items = []
+        for j in range(batch_size):
+            index += 1
+            if period and index % period == 0:
+                items.append({"jsonrpc": "2.0", "method": "notify", "params": [payload]})
+            else:
+                items.append({"jsonrpc": "2.0", "method": "echo", "params": [payload], "id": index})
+        expects_response = any('id' in item for item in items)
+        messages.append((items if batch_size > 1 else items[0], expects_response))
+    return messages
+
+
+async def run_websocket_connection(path, messages, latencies):
+    client = WebsocketCommunicator(application, path)
+    connected, _ = await client.connect()
+    if not connected:
+        raise RuntimeError('Connection to %s refused' % path)
+    for message, expects_response in messages:
+        started = time.perf_counter()
+        await client.send_to(text_data=json.dumps(message))
+        if expects_response:
+            await client.receive_from(timeout=10)
+            latencies.append(time.perf_counter() - started)
+    # the last notifications are processed before disconnecting
+    await client.send_to(text_data=json.dumps({"jsonrpc": "2.0", "method": "echo", "params": [""], "id": 0}))
+    await client.receive_from(timeout=10)
+    await client.disconnect()
+
+
+async def run_http_connection(messages, latencies):
+    for message, expects_response in messages:
+        started = time.perf_counter()
+        communicator = HttpCommunicator(application, 'POST', '/rpc/', body=json.dumps(message).encode('utf-8'))
+        await communicator.get_response(timeout=10)
+        if expects_response:
+            latencies.append(time.perf_counter() - started)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(round(fraction * (len(values) - 1))), len(values) - 1)]
+
+
+async def run_scenario(consumer, scenario, messages_per_connection):
+    """
+    Run a scenario
+    :param str consumer: name of the consumer (key of CONSUMERS)
+    :param dict scenario:
+    :param int messages_per_connection:
+    :return: dict, the scenario with its measures
+    """
+    path = CONSUMERS[consumer]
+    latencies = []
+    connections = []
+    for i in range(scenario['connections']):
+        messages = build_messages(scenario, messages_per_connection)
+        if path is None:
+            connections.append(run_http_connection(messages, latencies))
+        else:
+            connections.append(run_websocket_connection(path, messages, latencies))
+
+    started = time.perf_counter()
+    await asyncio.gather(*connections)
+    elapsed = time.perf_counter() - started
+
+    request_objects = scenario['connections'] * messages_per_connection * scenario['batch_size']
+    result = dict(scenario)
+    result.update({
+        'consumer': consumer,
+        'messages': scenario['connections'] * messages_per_connection,
+        'request_objects': request_objects,
+        'elapsed': elapsed,
+        'calls_per_second': request_objects / elapsed,
+        'p50_ms': percentile(latencies, 0.5) * 1000 if latencies else None,
+        'p99_ms': percentile(latencies, 0.99) * 1000 if latencies else None,
+    })
+    return result
+
+
+async def run(consumers=None, messages_per_connection=200, warmup=20):
+    """
+    Run all the scenarios
+    :param consumers: (optional) names of the consumers to benchmark, all of them by default
+    :param int messages_per_connection:
+    :param int warmup: number of messages sent to each consumer before measuring
+    :return: list of results
+    """
+    results = []
+    for consumer in consumers or sorted(CONSUMERS):
+        if warmup:
+            await run_scenario(consumer, dict(BASELINE), warmup)
+        for scenario in scenarios():
+            results.append(await run_scenario(consumer, scenario, messages_per_connection))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the dispatch of the JSON-RPC consumers')
+    parser.add_argument('--consumer', action='append', choices=sorted(CONSUMERS),
+                        help='consumer to benchmark (repeatable), all of them by default')
+    parser.add_argument('--messages', type=int, default=200, help='messages sent per connection and scenario')
+    parser.add_argument('--output', help='file to write the JSON results to, stdout by default')
+    args = parser.parse_args(argv)
+
+    import django
+    django.setup()
+
+    results = asyncio.get_event_loop().run_until_complete(run(args.consumer, args.messages))
+    for result in results:
+        sys.stderr.write('%(consumer)-30s payload=%(payload_size)-6d batch=%(batch_size)-4d '
+                         'notifications=%(notification_ratio)-4.2f connections=%(connections)-3d '
+                         '%(calls_per_second)10.0f calls/s  p50=%(p50_ms).2fms  p99=%(p99_ms).2fms\n' % result)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,11 @@
+import asyncio
+import time
+
 from django.core.serializers.json import DjangoJSONEncoder
 
-from .consumer_test import JsonRpcConsumerTest
+from channels_jsonrpc import AsyncRpcHttpConsumer, AsyncRpcWorkerConsumer
+from channels_jsonrpc.metrics import InMemoryCollector
+from .consumer_test import JsonRpcConsumerTest, AsyncJsonRpcConsumerTest
 # import the logging library
 import logging
 
@@ -9,13 +14,7 @@ logger = logging.getLogger(__name__)
 
 
 class MyJsonRpcWebsocketConsumerTest(JsonRpcConsumerTest):
-
-    def connection_groups(self, **kwargs):
-        """
-        Called to return the list of groups to automatically add/remove
-        this connection to/from.
-        """
-        return ["test"]
+    allow_subscriptions = True
 
     def connect(self):
         """
@@ -61,6 +60,186 @@ def ping(fake_an_error, **kwargs):
 
 
 class DjangoJsonRpcWebsocketConsumerTest(JsonRpcConsumerTest):
+    json_encoder_class = DjangoJSONEncoder
+
+
+class OrjsonDjangoJsonRpcWebsocketConsumerTest(JsonRpcConsumerTest):
+    json_codec = 'orjson'
+    json_encoder_class = DjangoJSONEncoder
+
+
+class MyAsyncJsonRpcWebsocketConsumerTest(AsyncJsonRpcConsumerTest):
+    allow_subscriptions = True
+    metrics = InMemoryCollector()
+    compression = True
+    compression_threshold = 100
+
+    async def connect(self):
+        """
+        Perform things on connection start
+        """
+        logger.info("connect")
+        await self.accept()
+
+
+@MyAsyncJsonRpcWebsocketConsumerTest.rpc_method()
+async def ping(fake_an_error=False, **kwargs):
+    if fake_an_error:
+        raise Exception(False)
+    return "pong"
+
+
+class MyAsyncRpcHttpConsumerTest(AsyncRpcHttpConsumer):
+    metrics = True
+    compression = True
+    compression_threshold = 100
+
+
+@MyAsyncRpcHttpConsumerTest.rpc_method()
+def ping(fake_an_error=False, **kwargs):
+    if fake_an_error:
+        raise Exception(False)
+    return "pong"
+
+
+class PipeliningJsonRpcWebsocketConsumerTest(AsyncJsonRpcConsumerTest):
+    pipelining = True
+    max_in_flight = 3
+
+
+class QueuedJsonRpcWebsocketConsumerTest(AsyncJsonRpcConsumerTest):
+    notification_queue = True
+    notification_queue_size = 3
+    notification_batching = True
+
+    def notification_key(self, method, params):
+        # only the latest progress of a job is worth sending
+        if method == 'progress':
+            return params['job']
+        return None
+
+
+class ShardRpcWorkerConsumerTest(AsyncRpcWorkerConsumer):
+    # state owned by the worker of the shard
+    counters = dict()
+
+
+@ShardRpcWorkerConsumerTest.rpc_method(websocket=False, http=False)
+def shard_increment(name, **kwargs):
+    counters = kwargs['consumer'].counters
+    counters[name] = counters.get(name, 0) + 1
+    return counters[name]
+
+
+class LimitedJsonRpcWebsocketConsumerTest(AsyncJsonRpcConsumerTest):
+    max_frame_size = 200
+    max_batch_length = 2
+    max_nesting_depth = 4
+    max_string_length = 20
+    max_violations = 3
+
+
+class LimitedRpcHttpConsumerTest(AsyncRpcHttpConsumer):
+    max_frame_size = 200
+    max_batch_length = 2
+    max_nesting_depth = 4
+    max_string_length = 20
+
+
+@LimitedJsonRpcWebsocketConsumerTest.rpc_method()
+@LimitedRpcHttpConsumerTest.rpc_method()
+def limited_echo(value):
+    return value
+
+
+class IncrementalRpcHttpConsumerTest(AsyncRpcHttpConsumer):
+    incremental_batches = True
+
+
+class LimitedIncrementalRpcHttpConsumerTest(IncrementalRpcHttpConsumerTest):
+    max_frame_size = 300
+
+
+@IncrementalRpcHttpConsumerTest.rpc_method()
+async def incremental_echo(value, delay=0):
+    await asyncio.sleep(delay)
+    return value
+
+
+@IncrementalRpcHttpConsumerTest.rpc_notification()
+def incremental_notify(value):
+    pass
+
+
+class ResourcesJsonRpcWebsocketConsumerTest(JsonRpcConsumerTest):
+    # sessions released on disconnect
+    released = []
+
+
+@ResourcesJsonRpcWebsocketConsumerTest.connection_resource()
+def session(consumer):
+    session = {'channel': consumer.channel_name, 'calls': 0}
+    yield session
+    ResourcesJsonRpcWebsocketConsumerTest.released.append(session)
+
+
+@ResourcesJsonRpcWebsocketConsumerTest.rpc_method()
+def session_calls(session, step=1):
+    session['calls'] += step
+    return session['calls']
+
+
+class AsyncResourcesJsonRpcWebsocketConsumerTest(AsyncJsonRpcConsumerTest):
+    pipelining = True
+    opened = 0
+    released = []
+    # state of the slow sessions seen by the methods using them
+    observed = []
+
+
+class ResourcesRpcHttpConsumerTest(AsyncRpcHttpConsumer):
+    opened = 0
+    released = []
+
+
+@AsyncResourcesJsonRpcWebsocketConsumerTest.connection_resource('client')
+@ResourcesRpcHttpConsumerTest.connection_resource('client')
+async def open_client(consumer):
+    # slow to open: the concurrent calls wait for the same client
+    await asyncio.sleep(0.05)
+    type(consumer).opened += 1
+    return {'requests': 0}
+
+
+@AsyncResourcesJsonRpcWebsocketConsumerTest.connection_resource()
+@ResourcesRpcHttpConsumerTest.connection_resource()
+def journal(consumer):
+    # created in the executor, released on disconnect
+    values = []
+    yield values
+    type(consumer).released.append(values)
+
+
+@AsyncResourcesJsonRpcWebsocketConsumerTest.connection_resource()
+def slow_session(consumer):
+    # created in a thread, which can't be interrupted
+    time.sleep(0.1)
+    session = {'closed': False}
+    yield session
+    session['closed'] = True
+    type(consumer).released.append(session)
+
+
+@AsyncResourcesJsonRpcWebsocketConsumerTest.rpc_method()
+def slow_session_use(slow_session, delay=0, **kwargs):
+    time.sleep(delay)
+    type(kwargs['consumer']).observed.append(slow_session['closed'])
+    return slow_session['closed']
+
 
-    def encode_json(self, data):
-        return DjangoJSONEncoder().encode(data)
+@AsyncResourcesJsonRpcWebsocketConsumerTest.rpc_method()
+@ResourcesRpcHttpConsumerTest.rpc_method()
+def client_request(client, journal, value):
+    client['requests'] += 1
+    journal.append(value)
+    return client['requests']
@@ -1,4 +1,25 @@
-from channels_jsonrpc import JsonRpcWebsocketConsumer
+from channels_jsonrpc import JsonRpcWebsocketConsumer, AsyncJsonRpcWebsocketConsumer
+
+
+class AsyncRange(object):
+    """
+    Async iterator over range(count), raising an exception at the end if fail is set (async generators are not
+    available on Python 3.5)
+    """
+
+    def __init__(self, count, fail=False):
+        self.items = iter(range(count))
+        self.fail = fail
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        for item in self.items:
+            return item
+        if self.fail:
+            raise Exception("stream_error")
+        raise StopAsyncIteration
 
 
 class JsonRpcConsumerTest(JsonRpcWebsocketConsumer):
@@ -8,5 +29,14 @@ class JsonRpcConsumerTest(JsonRpcWebsocketConsumer):
         Clean the class method name for tests
         :return: None
         """
-        if id(cls) in cls.available_rpc_methods:
-            del cls.available_rpc_methods[id(cls)]
\ No newline at end of file
+        cls.clear_rpc_methods()
+
+
+class AsyncJsonRpcConsumerTest(AsyncJsonRpcWebsocketConsumer):
+    @classmethod
+    def clean(cls):
+        """
+        Clean the class method name for tests
+        :return: None
+        """
+        cls.clear_rpc_methods()
@@ -1,18 +1,47 @@
-from .consumer import MyJsonRpcWebsocketConsumerTest, DjangoJsonRpcWebsocketConsumerTest
+from .consumer import MyJsonRpcWebsocketConsumerTest, DjangoJsonRpcWebsocketConsumerTest, \
+    MyAsyncJsonRpcWebsocketConsumerTest, OrjsonDjangoJsonRpcWebsocketConsumerTest, MyAsyncRpcHttpConsumerTest, \
+    PipeliningJsonRpcWebsocketConsumerTest, \
+    QueuedJsonRpcWebsocketConsumerTest, ShardRpcWorkerConsumerTest, LimitedJsonRpcWebsocketConsumerTest, \
+    LimitedRpcHttpConsumerTest, IncrementalRpcHttpConsumerTest, ResourcesJsonRpcWebsocketConsumerTest, \
+    AsyncResourcesJsonRpcWebsocketConsumerTest, ResourcesRpcHttpConsumerTest, LimitedIncrementalRpcHttpConsumerTest
 from django.urls import re_path
-from channels.routing import ProtocolTypeRouter, URLRouter
+from channels_jsonrpc.metrics import MetricsHttpConsumer
+from channels.routing import ChannelNameRouter, ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from django.conf.urls import url
 
 websocket_urlpatterns = [
     url(r'^django/$', DjangoJsonRpcWebsocketConsumerTest),
+    url(r'^orjson/$', OrjsonDjangoJsonRpcWebsocketConsumerTest),
     url(r'^ws/', MyJsonRpcWebsocketConsumerTest),
+    url(r'^async/', MyAsyncJsonRpcWebsocketConsumerTest),
+    url(r'^pipelining/', PipeliningJsonRpcWebsocketConsumerTest),
+    url(r'^queued/', QueuedJsonRpcWebsocketConsumerTest),
+    url(r'^limited/', LimitedJsonRpcWebsocketConsumerTest),
+    url(r'^resources/', ResourcesJsonRpcWebsocketConsumerTest),
+    url(r'^async-resources/', AsyncResourcesJsonRpcWebsocketConsumerTest),
+]
+
+http_urlpatterns = [
+    url(r'^rpc/$', MyAsyncRpcHttpConsumerTest),
+    url(r'^metrics/$', MetricsHttpConsumer),
+    url(r'^limited/$', LimitedRpcHttpConsumerTest),
+    url(r'^incremental/$', IncrementalRpcHttpConsumerTest),
+    url(r'^limited-incremental/$', LimitedIncrementalRpcHttpConsumerTest),
+    url(r'^resources/$', ResourcesRpcHttpConsumerTest),
 ]
 
 application = ProtocolTypeRouter({
+    'http': URLRouter(
+        http_urlpatterns
+    ),
     'websocket': AuthMiddlewareStack(
         URLRouter(
             websocket_urlpatterns
         )
     ),
+    # python manage.py runworker jsonrpc-shard
+    'channel': ChannelNameRouter({
+        'jsonrpc-shard': ShardRpcWorkerConsumerTest,
+    }),
 })
\ No newline at end of file
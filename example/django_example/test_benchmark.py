@@ -0,0 +1,13 @@
+import aiounittest
+
+from .benchmark import CONSUMERS, run, scenarios
+
+
+class TestsBenchmark(aiounittest.AsyncTestCase):
+
+    async def test_run(self):
+        results = await run(messages_per_connection=2, warmup=0)
+        self.assertEqual(len(results), len(CONSUMERS) * len(scenarios()))
+        for result in results:
+            self.assertGreater(result['calls_per_second'], 0)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
@@ -0,0 +1,349 @@
+import asyncio
+import gzip
+import json
+import zlib
+
+import aiounittest
+from channels.testing import ApplicationCommunicator, HttpCommunicator
+from channels_jsonrpc.ratelimit import RateLimit
+
+from .consumer import MyAsyncRpcHttpConsumerTest, ResourcesRpcHttpConsumerTest
+from .consumer_test import AsyncRange
+from .routing import application
+
+
+def rpc_request(body, headers=None):
+    if not isinstance(body, bytes):
+        body = json.dumps(body).encode('utf-8')
+    return HttpCommunicator(application, 'POST', '/rpc/', body=body, headers=headers)
+
+
+class TestsHttp(aiounittest.AsyncTestCase):
+
+    async def test_call(self):
+        response = await rpc_request({"id": 1, "jsonrpc": "2.0", "method": "ping", "params": []}).get_response()
+        self.assertEqual(response['status'], 200)
+        self.assertIn((b'Content-Type', b'application/json-rpc'), response['headers'])
+        self.assertEqual(json.loads(response['body'].decode()), {"jsonrpc": "2.0", "id": 1, "result": "pong"})
+
+    async def test_application_error(self):
+        response = await rpc_request({"id": 1, "jsonrpc": "2.0", "method": "ping", "params": [True]}).get_response()
+        self.assertEqual(response['status'], 500)
+        msg = json.loads(response['body'].decode())
+        self.assertEqual(msg['error']['code'], MyAsyncRpcHttpConsumerTest.GENERIC_APPLICATION_ERROR)
+
+    async def test_method_not_found(self):
+        response = await rpc_request({"id": 1, "jsonrpc": "2.0", "method": "unknown", "params": []}).get_response()
+        self.assertEqual(response['status'], 404)
+
+    async def test_parse_error(self):
+        response = await rpc_request(b'sqwdw').get_response()
+        self.assertEqual(response['status'], 500)
+        msg = json.loads(response['body'].decode())
+        self.assertEqual(msg['error']['code'], MyAsyncRpcHttpConsumerTest.PARSE_ERROR)
+
+    async def test_empty_body(self):
+        response = await rpc_request(b'').get_response()
+        self.assertEqual(response['status'], 400)
+        msg = json.loads(response['body'].decode())
+        self.assertEqual(msg['error']['code'], MyAsyncRpcHttpConsumerTest.INVALID_REQUEST)
+
+    async def test_notification(self):
+        @MyAsyncRpcHttpConsumerTest.rpc_notification()
+        def http_notif():
+            pass
+
+        response = await rpc_request({"jsonrpc": "2.0", "method": "http_notif", "params": []}).get_response()
+        self.assertEqual(response['status'], 204)
+        self.assertEqual(response['body'], b'')
+
+    async def test_batch(self):
+        response = await rpc_request([{"id": 1, "jsonrpc": "2.0", "method": "ping", "params": []},
+                                      {"id": 2, "jsonrpc": "2.0", "method": "ping", "params": [False]}]).get_response()
+        self.assertEqual(response['status'], 200)
+        self.assertEqual([r['result'] for r in json.loads(response['body'].decode())], ["pong", "pong"])
+
+    async def test_compression(self):
+        @MyAsyncRpcHttpConsumerTest.rpc_method()
+        def http_echo(value):
+            return value
+
+        value = "large" * 100
+        request = {"id": 1, "jsonrpc": "2.0", "method": "http_echo", "params": [value]}
+
+        response = await rpc_request(request, [(b'accept-encoding', b'gzip')]).get_response()
+        self.assertIn((b'Content-Encoding', b'gzip'), response['headers'])
+        self.assertIn((b'Vary', b'Accept-Encoding'), response['headers'])
+        self.assertEqual(json.loads(gzip.decompress(response['body']).decode())['result'], value)
+
+        response = await rpc_request(request, [(b'accept-encoding', b'deflate')]).get_response()
+        self.assertIn((b'Content-Encoding', b'deflate'), response['headers'])
+        self.assertEqual(json.loads(zlib.decompress(response['body']).decode())['result'], value)
+
+        # no compression without Accept-Encoding
+        response = await rpc_request(request).get_response()
+        self.assertEqual(json.loads(response['body'].decode())['result'], value)
+
+        # nor below the threshold
+        request['params'] = ["small"]
+        response = await rpc_request(request, [(b'accept-encoding', b'gzip')]).get_response()
+        self.assertNotIn((b'Content-Encoding', b'gzip'), response['headers'])
+        self.assertEqual(json.loads(response['body'].decode())['result'], "small")
+
+    async def test_coroutine_methods(self):
+        running = {'current': 0, 'max': 0}
+
+        @MyAsyncRpcHttpConsumerTest.rpc_method()
+        async def http_async_sleep(value):
+            running['current'] += 1
+            running['max'] = max(running['max'], running['current'])
+            await asyncio.sleep(0.01)
+            running['current'] -= 1
+            return value
+
+        response = await rpc_request({"id": 1, "jsonrpc": "2.0", "method": "http_async_sleep",
+                                      "params": [1]}).get_response()
+        self.assertEqual(json.loads(response['body'].decode())['result'], 1)
+
+        # batch members run concurrently
+        response = await rpc_request([{"id": i, "jsonrpc": "2.0", "method": "http_async_sleep", "params": [i]}
+                                      for i in range(5)]).get_response()
+        self.assertEqual([r['result'] for r in json.loads(response['body'].decode())], list(range(5)))
+        self.assertEqual(running['max'], 5)
+
+    async def test_concurrent_requests(self):
+        import threading
+        main_thread = threading.current_thread()
+        threads = []
+
+        @MyAsyncRpcHttpConsumerTest.rpc_method()
+        def http_sync_method():
+            threads.append(threading.current_thread())
+            return True
+
+        responses = await asyncio.gather(*[
+            rpc_request({"id": i, "jsonrpc": "2.0", "method": "http_sync_method", "params": []}).get_response()
+            for i in range(3)])
+        self.assertEqual([json.loads(r['body'].decode())['result'] for r in responses], [True] * 3)
+        self.assertNotIn(main_thread, threads)
+
+    async def test_streamed_result(self):
+        @MyAsyncRpcHttpConsumerTest.rpc_method()
+        def http_stream(count):
+            for i in range(count):
+                yield {"index": i}
+
+        request = {"id": 1, "jsonrpc": "2.0", "method": "http_stream", "params": [250]}
+        response = await rpc_request(request).get_response()
+        self.assertEqual(response['status'], 200)
+        msg = json.loads(response['body'].decode())
+        self.assertEqual(msg['id'], 1)
+        self.assertEqual(msg['result'], [{"index": i} for i in range(250)])
+
+        request['params'] = [0]
+        response = await rpc_request(request).get_response()
+        self.assertEqual(json.loads(response['body'].decode())['result'], [])
+
+        request['params'] = [250]
+        response = await rpc_request(request, [(b'accept-encoding', b'gzip')]).get_response()
+        self.assertIn((b'Content-Encoding', b'gzip'), response['headers'])
+        self.assertEqual(len(json.loads(gzip.decompress(response['body']).decode())['result']), 250)
+
+    async def test_streamed_result_error(self):
+        @MyAsyncRpcHttpConsumerTest.rpc_method()
+        async def http_failing_stream(fail_at):
+            return AsyncRange(fail_at, fail=True)
+
+        # failing before the first chunk: regular error response
+        request = {"id": 1, "jsonrpc": "2.0", "method": "http_failing_stream", "params": [0]}
+        response = await rpc_request(request).get_response()
+        self.assertEqual(response['status'], 500)
+        self.assertEqual(json.loads(response['body'].decode())['error']['data'], "stream_error")
+
+        # failing afterwards: truncated response
+        request['params'] = [150]
+        response = await rpc_request(request).get_response()
+        self.assertEqual(response['status'], 200)
+        with self.assertRaises(ValueError):
+            json.loads(response['body'].decode())
+
+    async def test_metrics_endpoint(self):
+        await rpc_request({"id": 1, "jsonrpc": "2.0", "method": "ping", "params": []}).get_response()
+        response = await HttpCommunicator(application, 'GET', '/metrics/').get_response()
+        self.assertEqual(response['status'], 200)
+        self.assertIn('# TYPE jsonrpc_calls_total counter', response['body'].decode())
+        self.assertIn('jsonrpc_calls_total{consumer="MyAsyncRpcHttpConsumerTest",method="ping"}',
+                      response['body'].decode())
+
+    async def test_rate_limit(self):
+        @MyAsyncRpcHttpConsumerTest.rpc_method(rate_limit=RateLimit(0.01, burst=1, per_connection=False))
+        def http_limited_ping():
+            return "pong"
+
+        request = {"id": 1, "jsonrpc": "2.0", "method": "http_limited_ping"}
+        self.assertEqual((await rpc_request(request).get_response())['status'], 200)
+        response = await rpc_request(request).get_response()
+        self.assertEqual(response['status'], 429)
+        self.assertEqual(json.loads(response['body'].decode())['error']['code'],
+                         MyAsyncRpcHttpConsumerTest.RATE_LIMIT_EXCEEDED)
+
+    async def test_timeout(self):
+        @MyAsyncRpcHttpConsumerTest.rpc_method(timeout=0.05)
+        async def http_sleep(delay):
+            await asyncio.sleep(delay)
+
+        response = await rpc_request({"id": 1, "jsonrpc": "2.0", "method": "http_sleep", "params": [1]}).get_response()
+        self.assertEqual(response['status'], 504)
+        self.assertEqual(json.loads(response['body'].decode())['error']['code'],
+                         MyAsyncRpcHttpConsumerTest.REQUEST_TIMEOUT)
+
+    async def test_limits(self):
+        def limited_request(body, headers=None):
+            return HttpCommunicator(application, 'POST', '/limited/', body=json.dumps(body).encode('utf-8'),
+                                    headers=headers)
+
+        response = await limited_request({"id": 1, "jsonrpc": "2.0", "method": "limited_echo",
+                                          "params": [[[1]]]}).get_response()
+        self.assertEqual(json.loads(response['body'].decode())['result'], [[1]])
+
+        response = await limited_request({"id": 1, "jsonrpc": "2.0", "method": "limited_echo",
+                                          "params": ["x" * 300]}).get_response()
+        self.assertEqual(response['status'], 413)
+        self.assertEqual(json.loads(response['body'].decode())['error']['data'], 'Frame larger than 200 bytes')
+
+        response = await limited_request({"id": 1, "jsonrpc": "2.0", "method": "limited_echo",
+                                          "params": [[[[1]]]]}).get_response()
+        self.assertEqual(response['status'], 400)
+        self.assertEqual(json.loads(response['body'].decode())['error']['data'], 'nested deeper than 4 levels')
+
+        # announced
+        response = await limited_request({"id": 1, "jsonrpc": "2.0", "method": "limited_echo", "params": [1]},
+                                         headers=[(b'content-length', b'100000')]).get_response()
+        self.assertEqual(response['status'], 413)
+
+    async def test_oversized_body_parts(self):
+        communicator = ApplicationCommunicator(application, {
+            'type': 'http', 'http_version': '1.1', 'method': 'POST', 'path': '/limited/', 'query_string': b'',
+            'headers': [],
+        })
+        await communicator.send_input({'type': 'http.request', 'body': b'[' + b' ' * 150, 'more_body': True})
+        await communicator.send_input({'type': 'http.request', 'body': b' ' * 150, 'more_body': True})
+        # answered before the end of the body
+        start = await communicator.receive_output(1)
+        self.assertEqual(start['status'], 413)
+        body = await communicator.receive_output(1)
+        self.assertEqual(json.loads(body['body'].decode())['error']['code'],
+                         MyAsyncRpcHttpConsumerTest.INVALID_REQUEST)
+        await communicator.wait()
+
+
+def incremental_request(path='/incremental/'):
+    return ApplicationCommunicator(application, {
+        'type': 'http', 'http_version': '1.1', 'method': 'POST', 'path': path, 'query_string': b'',
+        'headers': [],
+    })
+
+
+async def read_body(communicator):
+    body = b''
+    while True:
+        message = await communicator.receive_output(1)
+        body += message['body']
+        if not message.get('more_body'):
+            return body
+
+
+class TestsIncrementalBatches(aiounittest.AsyncTestCase):
+
+    async def test_results_before_the_end_of_the_body(self):
+        communicator = incremental_request()
+        await communicator.send_input({'type': 'http.request', 'more_body': True, 'body':
+                                       b'[{"jsonrpc": "2.0", "method": "incremental_echo", "params": ["a, ]"], "id": 1},'
+                                       b' {"jsonrpc": "2.0", "method": "incremental_echo", "params": '})
+        start = await communicator.receive_output(1)
+        self.assertEqual(start['status'], 200)
+        first = await communicator.receive_output(1)
+        self.assertEqual(first['body'], b'[{"jsonrpc": "2.0", "id": 1, "result": "a, ]"}')
+        self.assertTrue(first['more_body'])
+
+        await communicator.send_input({'type': 'http.request', 'more_body': True, 'body':
+                                       b'{"value": "b", "delay": 0.05}, "id": 2}, {"jsonrpc": "2.0", '
+                                       b'"method": "incremental_notify", "params": [1]}, {"jsonrpc": "2.0", '
+                                       b'"method": "incremental_echo", "params": ["c"], "id": 3}, 42'})
+        await communicator.send_input({'type': 'http.request', 'body': b']'})
+        responses = json.loads((first['body'] + await read_body(communicator)).decode())
+        # in the order they complete
+        self.assertEqual([response.get('id') for response in responses], [1, 3, None, 2])
+        self.assertEqual(responses[2]['error']['code'], MyAsyncRpcHttpConsumerTest.INVALID_REQUEST)
+        self.assertEqual(responses[3]['result'], 'b')
+        await communicator.wait()
+
+    async def test_oversized_body(self):
+        member = b'{"jsonrpc": "2.0", "method": "incremental_echo", "params": [1], "id": 1}'
+        slow_member = b'{"jsonrpc": "2.0", "method": "incremental_echo", "params": [2, 10], "id": 2}'
+
+        # nothing sent yet: 413 response
+        communicator = incremental_request('/limited-incremental/')
+        await communicator.send_input({'type': 'http.request', 'more_body': True, 'body': b'[' + slow_member})
+        await communicator.send_input({'type': 'http.request', 'more_body': True, 'body': b',' + b' ' * 300})
+        start = await communicator.receive_output(1)
+        self.assertEqual(start['status'], 413)
+        self.assertEqual(json.loads((await read_body(communicator)).decode())['error']['code'],
+                         MyAsyncRpcHttpConsumerTest.INVALID_REQUEST)
+        await communicator.wait()
+
+        # the response array was started: the error ends it, and the pending members are cancelled
+        communicator = incremental_request('/limited-incremental/')
+        await communicator.send_input({'type': 'http.request', 'more_body': True, 'body': b'[' + member + b','})
+        start = await communicator.receive_output(1)
+        self.assertEqual(start['status'], 200)
+        first = await communicator.receive_output(1)
+        await communicator.send_input({'type': 'http.request', 'more_body': True, 'body': slow_member + b','})
+        await communicator.send_input({'type': 'http.request', 'more_body': True, 'body': b' ' * 200})
+        responses = json.loads((first['body'] + await read_body(communicator)).decode())
+        self.assertEqual(responses[0]['result'], 1)
+        self.assertEqual([response['error']['code'] for response in responses[1:]],
+                         [MyAsyncRpcHttpConsumerTest.INVALID_REQUEST])
+        await communicator.wait()
+
+    async def test_bodies(self):
+        for body, status, expected in (
+                (b'{"jsonrpc": "2.0", "method": "incremental_echo", "params": [1], "id": 1}', 200,
+                 {"jsonrpc": "2.0", "id": 1, "result": 1}),
+                (b' [ ] ', 400, {"jsonrpc": "2.0", "error": {"code": -32600, "message": "Invalid Request"}}),
+                (b'[{"jsonrpc": "2.0", "method": "incremental_echo", "params": [1]', 500,
+                 {"jsonrpc": "2.0", "error": {"code": -32700, "message": "Parse Error"}}),
+                (b'[{"jsonrpc": "2.0", "method": "incremental_echo", "params": [1], "id": 1}, {"id": }]', 200,
+                 [{"jsonrpc": "2.0", "id": 1, "result": 1},
+                  {"jsonrpc": "2.0", "error": {"code": -32700, "message": "Parse Error"}}])):
+            response = await HttpCommunicator(application, 'POST', '/incremental/', body=body).get_response()
+            self.assertEqual(response['status'], status)
+            if isinstance(expected, list):
+                # the members are answered in the order they complete
+                self.assertCountEqual(json.loads(response['body'].decode()), expected)
+            else:
+                self.assertEqual(json.loads(response['body'].decode()), expected)
+
+        response = await HttpCommunicator(application, 'POST', '/incremental/', body=json.dumps([
+            {"jsonrpc": "2.0", "method": "incremental_notify", "params": [1]}]).encode()).get_response()
+        self.assertEqual(response['status'], 204)
+        self.assertEqual(response['body'], b'')
+
+
+class TestsConnectionResources(aiounittest.AsyncTestCase):
+
+    async def test_released_after_the_response(self):
+        consumer = ResourcesRpcHttpConsumerTest
+        consumer.opened = 0
+        del consumer.released[:]
+        body = json.dumps([{"jsonrpc": "2.0", "method": "client_request", "params": {"value": i}, "id": i}
+                           for i in range(3)]).encode()
+        response = await HttpCommunicator(application, 'POST', '/resources/', body=body).get_response()
+        self.assertCountEqual([item['result'] for item in json.loads(response['body'].decode())], [1, 2, 3])
+        self.assertEqual(consumer.opened, 1)
+        self.assertEqual(len(consumer.released), 1)
+        self.assertCountEqual(consumer.released[0], [0, 1, 2])
+
+        # one per request
+        await HttpCommunicator(application, 'POST', '/resources/', body=body).get_response()
+        self.assertEqual(consumer.opened, 2)
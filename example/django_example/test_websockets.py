@@ -1,11 +1,22 @@
+import asyncio
+import logging
+import json
+from collections import OrderedDict, namedtuple
 from datetime import datetime
-from .consumer_test import JsonRpcConsumerTest
-from channels_jsonrpc import JsonRpcException
-from channels.testing import WebsocketCommunicator
+from typing import List, Optional
+from .consumer_test import AsyncRange, JsonRpcConsumerTest
+from channels_jsonrpc import JsonRpcException, RemoteCallError
+from channels_jsonrpc.frames import CachedFrame
+from channels_jsonrpc.ratelimit import RateLimit
+from channels.layers import get_channel_layer
+from channels.testing import ApplicationCommunicator, WebsocketCommunicator
 from .routing import application
-from .consumer import MyJsonRpcWebsocketConsumerTest, DjangoJsonRpcWebsocketConsumerTest
+from .consumer import MyJsonRpcWebsocketConsumerTest, DjangoJsonRpcWebsocketConsumerTest, \
+    MyAsyncJsonRpcWebsocketConsumerTest, OrjsonDjangoJsonRpcWebsocketConsumerTest, PipeliningJsonRpcWebsocketConsumerTest, \
+    QueuedJsonRpcWebsocketConsumerTest, ResourcesJsonRpcWebsocketConsumerTest, AsyncResourcesJsonRpcWebsocketConsumerTest
 
 from channels.routing import ProtocolTypeRouter, URLRouter
+from django.utils.safestring import mark_safe
 
 
 class MyJsonRpcConsumer(JsonRpcConsumerTest):
@@ -60,6 +71,14 @@ class MyTest(aiounittest.AsyncTestCase):
 
         await client.send_json_to(["value", "my_value"])
         response = await client.receive_json_from()
+        assert len(response) == 2
+        for error in response:
+            assert (error['error'] == {u'code': JsonRpcConsumerTest.INVALID_REQUEST,
+                                       u'message': JsonRpcConsumerTest.errors[
+                                           JsonRpcConsumerTest.INVALID_REQUEST]})
+
+        await client.send_json_to([])
+        response = await client.receive_json_from()
         assert (response['error'] == {u'code': JsonRpcConsumerTest.INVALID_REQUEST,
                                       u'message': JsonRpcConsumerTest.errors[
                                           JsonRpcConsumerTest.INVALID_REQUEST]})
@@ -152,7 +171,7 @@ class MyTest(aiounittest.AsyncTestCase):
         await client.disconnect()
 
     async def test_parsing_with_good_request_wrong_params(self):
-        @JsonRpcConsumerTest.rpc_method()
+        @MyJsonRpcWebsocketConsumerTest.rpc_method()
         def ping2():
             return "pong2"
 
@@ -162,13 +181,12 @@ class MyTest(aiounittest.AsyncTestCase):
 
         await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "ping2", "params": ["test"]})
         msg = await client.receive_json_from()
-        self.assertIn(msg['error']['message'],
-                      [u'ping2() takes no arguments (1 given)',  # python 2
-                       u'ping2() takes 0 positional arguments but 1 was given'])  # python 3
+        self.assertEqual(msg['error']['code'], JsonRpcConsumerTest.INVALID_PARAMS)
+        self.assertEqual(msg['error']['data'], 'takes 0 positional parameter(s) but 1 were given')
         await client.disconnect()
 
     async def test_parsing_with_good_request_ainvalid_paramas(self):
-        @JsonRpcConsumerTest.rpc_method()
+        @MyJsonRpcWebsocketConsumerTest.rpc_method()
         def ping2(test):
             return "pong2"
 
@@ -182,6 +200,49 @@ class MyTest(aiounittest.AsyncTestCase):
                                             JsonRpcConsumerTest.INVALID_PARAMS]})
         await client.disconnect()
 
+    async def test_invalid_params_rejected_before_call(self):
+        calls = []
+
+        @MyJsonRpcWebsocketConsumerTest.rpc_method()
+        def ping_params(a, b=2, **kwargs):
+            calls.append((a, b))
+            return a + b
+
+        client = WebsocketCommunicator(application, 'ws/')
+        await client.connect()
+
+        for params, data in (([], 'missing positional parameter(s): a'),
+                             ({"b": 1}, 'missing parameter(s): a'),
+                             ({"a": 1, "consumer": 2}, 'unexpected parameter: consumer')):
+            await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "ping_params", "params": params})
+            msg = await client.receive_json_from()
+            self.assertEqual(msg['error'], {u'code': JsonRpcConsumerTest.INVALID_PARAMS,
+                                            u'message': JsonRpcConsumerTest.errors[JsonRpcConsumerTest.INVALID_PARAMS],
+                                            u'data': data})
+        self.assertEqual(calls, [])
+
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "ping_params", "params": {"a": 1}})
+        msg = await client.receive_json_from()
+        self.assertEqual(msg['result'], 3)
+        await client.disconnect()
+
+    async def test_method_descriptor(self):
+        class DescriptorJsonRpcConsumer(JsonRpcConsumerTest):
+            pass
+
+        @DescriptorJsonRpcConsumer.rpc_method()
+        async def described(a, b, *args, c=None, **kwargs):
+            pass
+
+        method = DescriptorJsonRpcConsumer.get_dispatch_table('websocket')['described']
+        self.assertIs(method.func, described)
+        self.assertTrue(method.is_coroutine)
+        self.assertTrue(method.accepts_consumer)
+        self.assertEqual(method.positional_names, ['a', 'b'])
+        self.assertEqual(method.keyword_names, {'a', 'b', 'c'})
+        self.assertIsNone(method.check_params([1, 2, 3, 4]))
+        self.assertIsNotNone(method.check_params([1]))
+
     async def test_parsing_with_good_request(self):
         # Test that parsing a ping request works
         client = WebsocketCommunicator(application, 'ws/')
@@ -548,3 +609,1411 @@ class TestsNotifications(aiounittest.AsyncTestCase):
         await client.send_json_to({"jsonrpc": "2.0", "method": "dwqwdq", "params": []})
         self.assertEqual(await client.receive_nothing(), True)
         await client.disconnect()
+
+
+class TestsBatch(aiounittest.AsyncTestCase):
+
+    async def test_batch_call(self):
+        @MyJsonRpcWebsocketConsumerTest.rpc_method()
+        def batch_sum(a, b):
+            return a + b
+
+        @MyJsonRpcWebsocketConsumerTest.rpc_notification()
+        def batch_notif():
+            pass
+
+        client = WebsocketCommunicator(application, 'ws/')
+        await client.connect()
+
+        await client.send_json_to([
+            {"id": 1, "jsonrpc": "2.0", "method": "batch_sum", "params": [1, 2]},
+            {"jsonrpc": "2.0", "method": "batch_notif", "params": []},
+            {"id": 2, "jsonrpc": "2.0", "method": "unknown_method", "params": []},
+            "invalid",
+            {"id": 3, "jsonrpc": "2.0", "method": "batch_sum", "params": {"a": 3, "b": 4}},
+        ])
+        response = await client.receive_json_from()
+        self.assertEqual(len(response), 4)
+        self.assertEqual(response[0], {"jsonrpc": "2.0", "id": 1, "result": 3})
+        self.assertEqual(response[1]['id'], 2)
+        self.assertEqual(response[1]['error']['code'], JsonRpcConsumerTest.METHOD_NOT_FOUND)
+        self.assertEqual(response[2]['error']['code'], JsonRpcConsumerTest.INVALID_REQUEST)
+        self.assertEqual(response[3], {"jsonrpc": "2.0", "id": 3, "result": 7})
+        await client.disconnect()
+
+    async def test_batch_of_notifications(self):
+        @MyJsonRpcWebsocketConsumerTest.rpc_notification()
+        def batch_notif2():
+            pass
+
+        client = WebsocketCommunicator(application, 'ws/')
+        await client.connect()
+
+        await client.send_json_to([
+            {"jsonrpc": "2.0", "method": "batch_notif2", "params": []},
+            {"jsonrpc": "2.0", "method": "batch_notif2", "params": []},
+        ])
+        self.assertEqual(await client.receive_nothing(), True)
+        await client.disconnect()
+
+    async def test_async_batch_is_concurrent(self):
+        running = {'current': 0, 'max': 0}
+
+        @MyAsyncJsonRpcWebsocketConsumerTest.rpc_method()
+        async def batch_sleep(value):
+            running['current'] += 1
+            running['max'] = max(running['max'], running['current'])
+            await asyncio.sleep(0.01)
+            running['current'] -= 1
+            return value
+
+        client = WebsocketCommunicator(application, 'async/')
+        await client.connect()
+
+        await client.send_json_to([{"id": i, "jsonrpc": "2.0", "method": "batch_sleep", "params": [i]}
+                                   for i in range(10)])
+        response = await client.receive_json_from()
+        self.assertEqual([r['result'] for r in response], list(range(10)))
+        self.assertEqual(running['max'], 10)
+        await client.disconnect()
+
+    async def test_async_batch_concurrency_cap(self):
+        running = {'current': 0, 'max': 0}
+
+        @MyAsyncJsonRpcWebsocketConsumerTest.rpc_method()
+        async def batch_sleep2(value):
+            running['current'] += 1
+            running['max'] = max(running['max'], running['current'])
+            await asyncio.sleep(0.01)
+            running['current'] -= 1
+            return value
+
+        MyAsyncJsonRpcWebsocketConsumerTest.batch_concurrency = 3
+        try:
+            client = WebsocketCommunicator(application, 'async/')
+            await client.connect()
+
+            await client.send_json_to([{"id": i, "jsonrpc": "2.0", "method": "batch_sleep2", "params": [i]}
+                                       for i in range(10)])
+            response = await client.receive_json_from()
+            self.assertEqual([r['result'] for r in response], list(range(10)))
+            self.assertEqual(running['max'], 3)
+            await client.disconnect()
+        finally:
+            del MyAsyncJsonRpcWebsocketConsumerTest.batch_concurrency
+
+
+class TestsCodec(aiounittest.AsyncTestCase):
+
+    async def test_orjson_codec_with_custom_encoder(self):
+        some_date = datetime.utcnow()
+
+        @OrjsonDjangoJsonRpcWebsocketConsumerTest.rpc_method()
+        def orjson_method():
+            return {'date': some_date, 'value': 'a/b'}
+
+        client = WebsocketCommunicator(application, 'orjson/')
+        await client.connect()
+
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "orjson_method", "params": {}})
+        msg = await client.receive_json_from()
+        self.assertEqual(msg['result'], {u'date': some_date.isoformat()[:-3], u'value': u'a/b'})
+
+        # subclasses of the JSON types are passed through to the encoder as well
+        @OrjsonDjangoJsonRpcWebsocketConsumerTest.rpc_method()
+        def orjson_subclasses():
+            return {'safe': mark_safe('<b>'), 'ordered': OrderedDict(a=1), 'point': namedtuple('Point', 'x y')(1, 2)}
+
+        await client.send_json_to({"id": 2, "jsonrpc": "2.0", "method": "orjson_subclasses", "params": {}})
+        msg = await client.receive_json_from()
+        self.assertEqual(msg['result'], {'safe': '<b>', 'ordered': {'a': 1}, 'point': [1, 2]})
+
+        await client.send_to(text_data='sqwdw')
+        msg = await client.receive_json_from()
+        self.assertEqual(msg['error']['code'], JsonRpcConsumerTest.PARSE_ERROR)
+        await client.disconnect()
+
+    async def test_codec_per_consumer(self):
+        self.assertEqual(OrjsonDjangoJsonRpcWebsocketConsumerTest.get_codec().name, 'orjson')
+        self.assertEqual(DjangoJsonRpcWebsocketConsumerTest.get_codec().name, 'json')
+
+    async def test_codec_fallback(self):
+        from channels_jsonrpc.codecs import JsonCodec
+
+        class MissingCodec(JsonCodec):
+            name = 'missing'
+
+            def __init__(self, encoder=None):
+                raise ImportError()
+
+        class MissingCodecConsumer(JsonRpcConsumerTest):
+            json_codec = MissingCodec
+
+        self.assertEqual(MissingCodecConsumer.get_codec().name, 'json')
+
+    async def test_async_parse_error(self):
+        client = WebsocketCommunicator(application, 'async/')
+        await client.connect()
+
+        await client.send_to(text_data='sqwdw')
+        msg = await client.receive_json_from()
+        self.assertEqual(msg['error']['code'], JsonRpcConsumerTest.PARSE_ERROR)
+        self.assertEqual(await client.receive_nothing(), True)
+        await client.disconnect()
+
+
+class TestsBinaryFrames(aiounittest.AsyncTestCase):
+
+    async def _test_binary_frames(self, path):
+        import json
+
+        @MyJsonRpcWebsocketConsumerTest.rpc_method()
+        def binary_ping():
+            return "pong"
+
+        @MyAsyncJsonRpcWebsocketConsumerTest.rpc_method('binary_ping')
+        async def async_binary_ping():
+            return "pong"
+
+        client = WebsocketCommunicator(application, path)
+        await client.connect()
+
+        await client.send_to(bytes_data=b'{"id": 1, "jsonrpc": "2.0", "method": "binary_ping", "params": []}')
+        response = await client.receive_from()
+        self.assertIsInstance(response, bytes)
+        self.assertEqual(json.loads(response.decode('utf-8')), {"jsonrpc": "2.0", "id": 1, "result": "pong"})
+
+        await client.send_to(bytes_data=b'sqwdw')
+        response = await client.receive_from()
+        self.assertIsInstance(response, bytes)
+        self.assertEqual(json.loads(response.decode('utf-8'))['error']['code'], JsonRpcConsumerTest.PARSE_ERROR)
+
+        # text frames are still answered with text
+        await client.send_json_to({"id": 2, "jsonrpc": "2.0", "method": "binary_ping", "params": []})
+        response = await client.receive_from()
+        self.assertIsInstance(response, str)
+        await client.disconnect()
+
+    async def test_binary_frames(self):
+        await self._test_binary_frames('ws/')
+
+    async def test_async_binary_frames(self):
+        await self._test_binary_frames('async/')
+
+
+class TestsBinarySubprotocols(aiounittest.AsyncTestCase):
+
+    async def _test_subprotocol(self, path, subprotocol, loads, dumps):
+
+        @MyJsonRpcWebsocketConsumerTest.rpc_method()
+        def binary_echo(value):
+            return value
+
+        @MyAsyncJsonRpcWebsocketConsumerTest.rpc_method('binary_echo')
+        async def async_binary_echo(value):
+            return value
+
+        client = WebsocketCommunicator(application, path, subprotocols=['unknown', subprotocol])
+        connected, accepted = await client.connect()
+        self.assertTrue(connected)
+        self.assertEqual(accepted, subprotocol)
+
+        # plain JSON clients on the same route are not affected
+        json_client = WebsocketCommunicator(application, path)
+        connected, accepted = await json_client.connect()
+        self.assertIsNone(accepted)
+
+        await client.send_to(bytes_data=dumps({"id": 1, "jsonrpc": "2.0", "method": "binary_echo",
+                                               "params": [b"\x00\x01"]}))
+        self.assertEqual(loads(await client.receive_from()), {"jsonrpc": "2.0", "id": 1, "result": b"\x00\x01"})
+
+        await client.send_to(bytes_data=dumps([{"id": 1, "jsonrpc": "2.0", "method": "binary_echo", "params": [1]},
+                                               {"id": 2, "jsonrpc": "2.0", "method": "binary_echo", "params": [2]}]))
+        self.assertEqual([r['result'] for r in loads(await client.receive_from())], [1, 2])
+
+        await client.send_to(bytes_data=b'\xc1')
+        self.assertEqual(loads(await client.receive_from())['error']['code'], JsonRpcConsumerTest.PARSE_ERROR)
+
+        await json_client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "binary_echo", "params": ["json"]})
+        self.assertEqual((await json_client.receive_json_from())['result'], "json")
+
+        await client.disconnect()
+        await json_client.disconnect()
+
+    async def test_msgpack(self):
+        import msgpack
+        await self._test_subprotocol('ws/', 'jsonrpc-msgpack', lambda data: msgpack.unpackb(data, raw=False),
+                                     msgpack.packb)
+
+    async def test_async_msgpack(self):
+        import msgpack
+        await self._test_subprotocol('async/', 'jsonrpc-msgpack', lambda data: msgpack.unpackb(data, raw=False),
+                                     msgpack.packb)
+
+    async def test_cbor(self):
+        import cbor2
+        await self._test_subprotocol('ws/', 'jsonrpc-cbor', cbor2.loads, cbor2.dumps)
+
+    async def test_msgpack_notifications(self):
+        import msgpack
+
+        @MyJsonRpcWebsocketConsumerTest.rpc_method()
+        def binary_notify(**kwargs):
+            kwargs['consumer'].notify_channel("notification.binary", {"payload": 12})
+            return True
+
+        client = WebsocketCommunicator(application, 'ws/', subprotocols=['jsonrpc-msgpack'])
+        await client.connect()
+        await client.send_to(bytes_data=msgpack.packb({"id": 1, "jsonrpc": "2.0", "method": "binary_notify"}))
+        msg = msgpack.unpackb(await client.receive_from(), raw=False)
+        self.assertEqual(msg, {"jsonrpc": "2.0", "method": "notification.binary", "params": {"payload": 12}})
+        msg = msgpack.unpackb(await client.receive_from(), raw=False)
+        self.assertEqual(msg['result'], True)
+        await client.disconnect()
+
+
+class TestsCompression(aiounittest.AsyncTestCase):
+
+    @staticmethod
+    def _decompressor():
+        import zlib
+        inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+
+        def decompress(frame):
+            if frame[:1] == b'\x00':
+                return frame[1:]
+            return inflater.decompress(frame[1:] + b'\x00\x00\xff\xff')
+        return decompress
+
+    async def test_compressed_json_frames(self):
+        import json
+
+        @MyAsyncJsonRpcWebsocketConsumerTest.rpc_method()
+        async def compressed_echo(value):
+            return value
+
+        client = WebsocketCommunicator(application, 'async/', subprotocols=['jsonrpc+deflate'])
+        connected, accepted = await client.connect()
+        self.assertEqual(accepted, 'jsonrpc+deflate')
+        decompress = self._decompressor()
+
+        # small frames are not compressed
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "compressed_echo", "params": ["small"]})
+        frame = await client.receive_from()
+        self.assertEqual(frame[:1], b'\x00')
+        self.assertEqual(json.loads(decompress(frame).decode())['result'], "small")
+
+        # the compression context is kept between frames
+        for i in range(3):
+            value = "large" * 100
+            await client.send_json_to({"id": i, "jsonrpc": "2.0", "method": "compressed_echo", "params": [value]})
+            frame = await client.receive_from()
+            self.assertEqual(frame[:1], b'\x01')
+            self.assertLess(len(frame), len(value))
+            self.assertEqual(json.loads(decompress(frame).decode())['result'], value)
+        await client.disconnect()
+
+    async def test_compressed_msgpack_frames(self):
+        import msgpack
+
+        @MyAsyncJsonRpcWebsocketConsumerTest.rpc_method()
+        async def compressed_echo2(value):
+            return value
+
+        client = WebsocketCommunicator(application, 'async/', subprotocols=['jsonrpc-msgpack+deflate'])
+        connected, accepted = await client.connect()
+        self.assertEqual(accepted, 'jsonrpc-msgpack+deflate')
+
+        value = list(range(500))
+        await client.send_to(bytes_data=msgpack.packb({"id": 1, "jsonrpc": "2.0", "method": "compressed_echo2",
+                                                       "params": [value]}))
+        frame = await client.receive_from()
+        self.assertEqual(frame[:1], b'\x01')
+        self.assertEqual(msgpack.unpackb(self._decompressor()(frame), raw=False)['result'], value)
+        await client.disconnect()
+
+    async def test_compression_is_opt_in(self):
+        client = WebsocketCommunicator(application, 'ws/', subprotocols=['jsonrpc+deflate'])
+        connected, accepted = await client.connect()
+        self.assertTrue(connected)
+        self.assertIsNone(accepted)
+        await client.disconnect()
+
+    async def test_accept_encoding(self):
+        from channels_jsonrpc.compression import negotiate_encoding
+
+        self.assertEqual(negotiate_encoding([(b'accept-encoding', b'gzip, deflate, br')]), 'gzip')
+        self.assertEqual(negotiate_encoding([(b'Accept-Encoding', b'gzip;q=0, deflate;q=0.5')]), 'deflate')
+        self.assertEqual(negotiate_encoding([(b'accept-encoding', b'*')]), 'gzip')
+        self.assertIsNone(negotiate_encoding([(b'accept-encoding', b'br')]))
+        self.assertIsNone(negotiate_encoding([]))
+
+
+class TestsSyncMethodsOnAsyncConsumers(aiounittest.AsyncTestCase):
+
+    async def test_sync_method_runs_in_executor(self):
+        import threading
+        import time
+
+        main_thread = threading.current_thread()
+        threads = []
+
+        @MyAsyncJsonRpcWebsocketConsumerTest.rpc_method()
+        def sync_sleep(value, **kwargs):
+            threads.append(threading.current_thread())
+            time.sleep(0.05)
+            return value
+
+        client = WebsocketCommunicator(application, 'async/')
+        await client.connect()
+
+        started = time.monotonic()
+        await client.send_json_to([{"id": i, "jsonrpc": "2.0", "method": "sync_sleep", "params": [i]}
+                                   for i in range(4)])
+        response = await client.receive_json_from()
+        self.assertEqual([r['result'] for r in response], list(range(4)))
+        # the calls ran concurrently, outside of the event loop
+        self.assertLess(time.monotonic() - started, 0.19)
+        self.assertNotIn(main_thread, threads)
+
+        stats = MyAsyncJsonRpcWebsocketConsumerTest.get_executor().stats()
+        self.assertEqual(stats['queued'], 0)
+        self.assertEqual(stats['running'], 0)
+        self.assertGreaterEqual(stats['completed'], 4)
+        await client.disconnect()
+
+    async def test_thread_sensitive_method(self):
+        import threading
+
+        threads = []
+
+        @MyAsyncJsonRpcWebsocketConsumerTest.rpc_method(thread_sensitive=True)
+        def sync_thread_sensitive():
+            threads.append(threading.current_thread())
+            return True
+
+        client = WebsocketCommunicator(application, 'async/')
+        await client.connect()
+        for i in range(2):
+            await client.send_json_to({"id": i, "jsonrpc": "2.0", "method": "sync_thread_sensitive", "params": []})
+            self.assertEqual((await client.receive_json_from())['result'], True)
+        self.assertEqual(len(threads), 2)
+        self.assertIs(threads[0], threads[1])
+        self.assertIsNot(threads[0], threading.current_thread())
+        await client.disconnect()
+
+    async def test_executor_stats(self):
+        from channels_jsonrpc.executor import RpcExecutor
+
+        executor = RpcExecutor(max_workers=1)
+        results = await asyncio.gather(*[executor.run(lambda x: x * 2, i) for i in range(3)])
+        self.assertEqual(results, [0, 2, 4])
+        stats = executor.stats()
+        self.assertEqual((stats['queued'], stats['running'], stats['completed']), (0, 0, 3))
+        self.assertGreaterEqual(stats['max_wait_time'], 0.0)
+        executor.shutdown()
+
+    async def test_executor_closes_old_connections(self):
+        from unittest import mock
+        from channels_jsonrpc.executor import RpcExecutor
+
+        executor = RpcExecutor(max_workers=1)
+        with mock.patch('channels_jsonrpc.executor.close_old_connections') as close_old_connections:
+            self.assertEqual(await executor.run(lambda: close_old_connections.call_count), 1)
+        self.assertEqual(close_old_connections.call_count, 2)
+        executor.shutdown()
+
+
+class TestsPipelining(aiounittest.AsyncTestCase):
+
+    async def test_cancelled_on_disconnect(self):
+        events = []
+
+        @PipeliningJsonRpcWebsocketConsumerTest.rpc_method()
+        async def pipelined_forever():
+            try:
+                await asyncio.sleep(10)
+            finally:
+                await asyncio.sleep(0.01)
+                events.append('cancelled')
+
+        client = WebsocketCommunicator(application, 'pipelining/')
+        await client.connect()
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "pipelined_forever", "params": []})
+        await asyncio.sleep(0.01)
+        await client.disconnect()
+        # the disconnection waited for the cancelled requests
+        self.assertEqual(events, ['cancelled'])
+
+    async def test_out_of_order_responses(self):
+        @PipeliningJsonRpcWebsocketConsumerTest.rpc_method()
+        async def pipelined_sleep(delay):
+            await asyncio.sleep(delay)
+            return delay
+
+        client = WebsocketCommunicator(application, 'pipelining/')
+        await client.connect()
+
+        await client.send_json_to({"id": "slow", "jsonrpc": "2.0", "method": "pipelined_sleep", "params": [0.1]})
+        await client.send_json_to({"id": "fast", "jsonrpc": "2.0", "method": "pipelined_sleep", "params": [0]})
+        self.assertEqual((await client.receive_json_from())['id'], "fast")
+        self.assertEqual((await client.receive_json_from())['id'], "slow")
+        await client.disconnect()
+
+    async def test_in_flight_limit(self):
+        running = {'current': 0, 'max': 0}
+
+        @PipeliningJsonRpcWebsocketConsumerTest.rpc_method()
+        async def pipelined_count():
+            running['current'] += 1
+            running['max'] = max(running['max'], running['current'])
+            await asyncio.sleep(0.02)
+            running['current'] -= 1
+            return True
+
+        client = WebsocketCommunicator(application, 'pipelining/')
+        await client.connect()
+        for i in range(6):
+            await client.send_json_to({"id": i, "jsonrpc": "2.0", "method": "pipelined_count", "params": []})
+        ids = set()
+        for i in range(6):
+            ids.add((await client.receive_json_from())['id'])
+        self.assertEqual(ids, set(range(6)))
+        self.assertEqual(running['max'], PipeliningJsonRpcWebsocketConsumerTest.max_in_flight)
+        await client.disconnect()
+
+    async def test_disconnect_cancels_requests(self):
+        state = {'started': False, 'cancelled': False}
+
+        @PipeliningJsonRpcWebsocketConsumerTest.rpc_method()
+        async def pipelined_forever():
+            state['started'] = True
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                state['cancelled'] = True
+                raise
+
+        client = WebsocketCommunicator(application, 'pipelining/')
+        await client.connect()
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "pipelined_forever", "params": []})
+        await client.receive_nothing(0.05)
+        self.assertTrue(state['started'])
+        await client.disconnect()
+        await asyncio.sleep(0)
+        self.assertTrue(state['cancelled'])
+
+
+class TestsResultCache(aiounittest.AsyncTestCase):
+
+    async def test_cached_method(self):
+        calls = []
+
+        @MyJsonRpcWebsocketConsumerTest.rpc_method(cache=True)
+        def cached_square(value):
+            calls.append(value)
+            return value * value
+
+        client = WebsocketCommunicator(application, 'ws/')
+        await client.connect()
+        for value in (2, 2, 3, 2):
+            await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "cached_square", "params": [value]})
+            self.assertEqual((await client.receive_json_from())['result'], value * value)
+        self.assertEqual(calls, [2, 3])
+
+        MyJsonRpcWebsocketConsumerTest.invalidate_cache('cached_square')
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "cached_square", "params": [2]})
+        self.assertEqual((await client.receive_json_from())['result'], 4)
+        self.assertEqual(calls, [2, 3, 2])
+        await client.disconnect()
+
+    async def test_single_flight(self):
+        calls = []
+
+        @MyAsyncJsonRpcWebsocketConsumerTest.rpc_method(cache=True, ttl=60)
+        async def cached_slow(value):
+            calls.append(value)
+            await asyncio.sleep(0.02)
+            return value
+
+        client = WebsocketCommunicator(application, 'async/')
+        await client.connect()
+        await client.send_json_to([{"id": i, "jsonrpc": "2.0", "method": "cached_slow", "params": {"value": 1}}
+                                   for i in range(5)])
+        response = await client.receive_json_from()
+        self.assertEqual([r['result'] for r in response], [1] * 5)
+        self.assertEqual(calls, [1])
+        await client.disconnect()
+
+    async def test_cancelled_first_call(self):
+        calls = []
+
+        @MyAsyncJsonRpcWebsocketConsumerTest.rpc_method(cache=True)
+        async def cached_slow_square(value):
+            calls.append(value)
+            await asyncio.sleep(0.1)
+            return value * value
+
+        first = WebsocketCommunicator(application, 'async/')
+        await first.connect()
+        second = WebsocketCommunicator(application, 'async/')
+        await second.connect()
+        await first.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "cached_slow_square", "params": [3],
+                                  "timeout": 0.02})
+        await asyncio.sleep(0.01)
+        await second.send_json_to({"id": 2, "jsonrpc": "2.0", "method": "cached_slow_square", "params": [3]})
+
+        self.assertEqual((await first.receive_json_from())['error']['code'], JsonRpcConsumerTest.REQUEST_TIMEOUT)
+        # the identical call runs the method on its own
+        self.assertEqual((await second.receive_json_from(1))['result'], 9)
+        self.assertEqual(calls, [3, 3])
+        await first.disconnect()
+        await second.disconnect()
+
+    async def test_streams_are_not_cached(self):
+        @MyJsonRpcWebsocketConsumerTest.rpc_method(cache=True)
+        def cached_generator(count):
+            return (i for i in range(count))
+
+        @MyAsyncJsonRpcWebsocketConsumerTest.rpc_method(cache=True)
+        async def cached_async_iterator(count):
+            return AsyncRange(count)
+
+        for path, method in (('ws/', 'cached_generator'), ('async/', 'cached_async_iterator')):
+            client = WebsocketCommunicator(application, path)
+            await client.connect()
+            for i in range(2):
+                # batch members get the whole result
+                await client.send_json_to([{"id": i, "jsonrpc": "2.0", "method": method, "params": [3]}])
+                self.assertEqual((await client.receive_json_from())[0]['result'], [0, 1, 2])
+            await client.disconnect()
+
+    def test_methods_taking_the_consumer_need_a_key(self):
+        with self.assertRaises(ValueError):
+            @MyJsonRpcWebsocketConsumerTest.rpc_method(cache=True)
+            def cached_user(**kwargs):
+                return kwargs['consumer'].scope.get('user')
+
+        @MyJsonRpcWebsocketConsumerTest.rpc_method(cache=True, cache_key=lambda params: params['name'])
+        def cached_greeting(name, **kwargs):
+            return 'hello %s' % name
+
+        self.assertIsNotNone(MyJsonRpcWebsocketConsumerTest.get_dispatch_table()['cached_greeting'].cache)
+
+    async def test_errors_are_not_cached(self):
+        calls = []
+
+        @MyAsyncJsonRpcWebsocketConsumerTest.rpc_method(cache=True)
+        async def cached_error():
+            calls.append(True)
+            raise Exception("cached_error")
+
+        client = WebsocketCommunicator(application, 'async/')
+        await client.connect()
+        for i in range(2):
+            await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "cached_error", "params": []})
+            self.assertEqual((await client.receive_json_from())['error']['message'], "cached_error")
+        self.assertEqual(len(calls), 2)
+        await client.disconnect()
+
+    async def test_lru_cache(self):
+        import time
+        from channels_jsonrpc.cache import LRUCache, MISSING
+
+        cache = LRUCache(max_size=2)
+        cache.set('a:1', 1)
+        cache.set('a:2', 2)
+        cache.get('a:1')
+        cache.set('b:3', 3)
+        self.assertEqual(cache.get('a:2'), MISSING)
+        self.assertEqual(cache.get('a:1'), 1)
+
+        cache.invalidate('a:')
+        self.assertEqual(cache.get('a:1'), MISSING)
+        self.assertEqual(cache.get('b:3'), 3)
+
+        cache.set('b:4', 4, ttl=0.01)
+        time.sleep(0.02)
+        self.assertEqual(cache.get('b:4'), MISSING)
+
+    async def test_django_cache(self):
+        from channels_jsonrpc.cache import DjangoCache, ResultCache, MISSING
+
+        result_cache = ResultCache(DjangoCache(), 'django_cached', key=lambda params: params['user'])
+        key = result_cache.key({'user': 12, 'page': 1})
+        self.assertEqual(key, 'django_cached:12')
+        self.assertEqual(result_cache.call(key, lambda: 'result'), 'result')
+        self.assertEqual(result_cache.call(key, lambda: 'other result'), 'result')
+        result_cache.invalidate()
+        self.assertEqual(result_cache.backend.get(key), MISSING)
+
+
+class TestsDispatchTables(aiounittest.AsyncTestCase):
+
+    async def test_inheritance(self):
+        class ParentJsonRpcConsumer(JsonRpcConsumerTest):
+            pass
+
+        class ChildJsonRpcConsumer(ParentJsonRpcConsumer):
+            pass
+
+        @ParentJsonRpcConsumer.rpc_method()
+        def inherited():
+            return "parent"
+
+        @ParentJsonRpcConsumer.rpc_method()
+        def overridden():
+            return "parent"
+
+        @ChildJsonRpcConsumer.rpc_method('overridden')
+        def child_overridden():
+            return "child"
+
+        @ChildJsonRpcConsumer.rpc_notification(http=False)
+        def child_notification():
+            pass
+
+        self.assertEqual(sorted(ChildJsonRpcConsumer.get_rpc_methods()), ['inherited', 'overridden'])
+        self.assertEqual(sorted(ParentJsonRpcConsumer.get_rpc_methods()), ['inherited', 'overridden'])
+        self.assertIs(ChildJsonRpcConsumer.get_dispatch_table('websocket')['overridden'].func, child_overridden)
+        self.assertIs(ParentJsonRpcConsumer.get_dispatch_table('websocket')['overridden'].func, overridden)
+        self.assertEqual(ChildJsonRpcConsumer.get_rpc_notifications(), ['child_notification'])
+        self.assertIn('child_notification', ChildJsonRpcConsumer.get_dispatch_table('websocket', True))
+        self.assertNotIn('child_notification', ChildJsonRpcConsumer.get_dispatch_table('http', True))
+        self.assertEqual(ParentJsonRpcConsumer.get_rpc_notifications(), [])
+
+        # registering on a parent after the tables were compiled rebuilds them
+        @ParentJsonRpcConsumer.rpc_method()
+        def late():
+            pass
+
+        self.assertIn('late', ChildJsonRpcConsumer.get_rpc_methods())
+
+    async def test_tables_are_frozen(self):
+        class FrozenJsonRpcConsumer(JsonRpcConsumerTest):
+            pass
+
+        @FrozenJsonRpcConsumer.rpc_method()
+        def frozen():
+            pass
+
+        table = FrozenJsonRpcConsumer.get_dispatch_table('websocket')
+        with self.assertRaises(TypeError):
+            table['other'] = table['frozen']
+        self.assertIs(FrozenJsonRpcConsumer.get_dispatch_table('websocket'), table)
+
+        FrozenJsonRpcConsumer.remove_rpc_method('frozen')
+        self.assertEqual(FrozenJsonRpcConsumer.get_rpc_methods(), [])
+        # tables handed out before are left untouched
+        self.assertIn('frozen', table)
+
+    async def test_removed_method_is_not_found(self):
+        @MyJsonRpcWebsocketConsumerTest.rpc_method()
+        def removed_method():
+            return True
+
+        client = WebsocketCommunicator(application, 'ws/')
+        await client.connect()
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "removed_method", "params": []})
+        self.assertEqual((await client.receive_json_from())['result'], True)
+
+        MyJsonRpcWebsocketConsumerTest.remove_rpc_method('removed_method')
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "removed_method", "params": []})
+        self.assertEqual((await client.receive_json_from())['error']['code'], JsonRpcConsumerTest.METHOD_NOT_FOUND)
+        await client.disconnect()
+
+
+class TestsSubscriptions(aiounittest.AsyncTestCase):
+
+    async def test_subscribe_and_publish(self):
+        for path, consumer in (('ws/', MyJsonRpcWebsocketConsumerTest), ('async/', MyAsyncJsonRpcWebsocketConsumerTest)):
+            client = WebsocketCommunicator(application, path)
+            await client.connect()
+            await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "rpc.subscribe", "params": ["news"]})
+            self.assertEqual((await client.receive_json_from())['result'], True)
+
+            await consumer.publish('news', {"title": "hello"})
+            self.assertEqual(await client.receive_json_from(),
+                             {"jsonrpc": "2.0", "method": "news", "params": {"title": "hello"}})
+
+            # topics that are not valid group names are supported too
+            await client.send_json_to({"id": 2, "jsonrpc": "2.0", "method": "rpc.subscribe", "params": ["news/é"]})
+            self.assertEqual((await client.receive_json_from())['result'], True)
+            await consumer.publish('news/é', [1])
+            self.assertEqual((await client.receive_json_from())['params'], [1])
+
+            await client.send_json_to({"id": 3, "jsonrpc": "2.0", "method": "rpc.unsubscribe", "params": ["news"]})
+            self.assertEqual((await client.receive_json_from())['result'], True)
+            await client.send_json_to({"id": 4, "jsonrpc": "2.0", "method": "rpc.unsubscribe", "params": ["news"]})
+            self.assertEqual((await client.receive_json_from())['result'], False)
+
+            await consumer.publish('news', {"title": "not sent"})
+            self.assertTrue(await client.receive_nothing())
+            await client.disconnect()
+
+    async def test_subscriptions_disabled(self):
+        client = WebsocketCommunicator(application, 'django/')
+        await client.connect()
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "rpc.subscribe", "params": ["news"]})
+        self.assertEqual((await client.receive_json_from())['error']['code'], JsonRpcConsumerTest.METHOD_NOT_FOUND)
+        await client.disconnect()
+        self.assertNotIn('rpc.subscribe', DjangoJsonRpcWebsocketConsumerTest.get_rpc_methods())
+
+    async def test_subscription_refused(self):
+        client = WebsocketCommunicator(application, 'ws/')
+        await client.connect()
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "rpc.subscribe", "params": [42]})
+        response = await client.receive_json_from()
+        self.assertEqual(response['error']['code'], JsonRpcConsumerTest.GENERIC_APPLICATION_ERROR)
+        await client.disconnect()
+
+
+class TestsNotificationQueue(aiounittest.AsyncTestCase):
+
+    async def test_coalesced_batch(self):
+        @QueuedJsonRpcWebsocketConsumerTest.rpc_method()
+        async def queued_progress(**kwargs):
+            consumer = kwargs['consumer']
+            for percent in (10, 50, 90):
+                await consumer.notify_channel('progress', {'job': 1, 'percent': percent})
+            await consumer.notify_channel('progress', {'job': 2, 'percent': 5})
+            await consumer.notify_channel('log', 'done')
+            return consumer.backpressure_stats()
+
+        client = WebsocketCommunicator(application, 'queued/')
+        await client.connect()
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "queued_progress"})
+        # the response is not delayed by the queue
+        stats = (await client.receive_json_from())['result']
+        self.assertEqual(stats['depth'], 3)
+        self.assertEqual(stats['coalesced'], 2)
+        self.assertEqual(stats['dropped'], 0)
+
+        batch = await client.receive_json_from()
+        self.assertEqual(batch, [
+            {"jsonrpc": "2.0", "method": "progress", "params": {'job': 1, 'percent': 90}},
+            {"jsonrpc": "2.0", "method": "progress", "params": {'job': 2, 'percent': 5}},
+            {"jsonrpc": "2.0", "method": "log", "params": 'done'},
+        ])
+        await client.disconnect()
+
+    async def test_overflow(self):
+        @QueuedJsonRpcWebsocketConsumerTest.rpc_method()
+        async def queued_flood(**kwargs):
+            consumer = kwargs['consumer']
+            for i in range(5):
+                await consumer.notify_channel('tick', i)
+            await consumer.flush_notifications()
+            await consumer.notify_channel('tick', 5)
+            return consumer.backpressure_stats()
+
+        client = WebsocketCommunicator(application, 'queued/')
+        await client.connect()
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "queued_flood"})
+        batch = await client.receive_json_from()
+        self.assertEqual([notification['params'] for notification in batch], [2, 3, 4])
+        stats = (await client.receive_json_from())['result']
+        self.assertEqual(stats['dropped'], 2)
+        self.assertEqual(stats['sent'], 3)
+        self.assertEqual(stats['max_depth'], 3)
+
+        # a single pending notification is not wrapped in a batch
+        self.assertEqual((await client.receive_json_from())['params'], 5)
+        await client.disconnect()
+
+
+class TestsStreaming(aiounittest.AsyncTestCase):
+
+    async def test_generator_result(self):
+        @MyJsonRpcWebsocketConsumerTest.rpc_method()
+        def stream_range(count):
+            for i in range(count):
+                yield i
+
+        client = WebsocketCommunicator(application, 'ws/')
+        await client.connect()
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "stream_range", "params": [250]})
+        items = []
+        for size in (100, 100, 50):
+            msg = await client.receive_json_from()
+            self.assertEqual(msg['method'], 'rpc.partialResult')
+            self.assertEqual(msg['params']['id'], 1)
+            self.assertEqual(len(msg['params']['result']), size)
+            items.extend(msg['params']['result'])
+        self.assertEqual(items, list(range(250)))
+        self.assertEqual(await client.receive_json_from(), {"jsonrpc": "2.0", "id": 1, "result": 250})
+
+        # batch members get the whole result
+        await client.send_json_to([{"id": 2, "jsonrpc": "2.0", "method": "stream_range", "params": [3]}])
+        self.assertEqual(await client.receive_json_from(), [{"jsonrpc": "2.0", "id": 2, "result": [0, 1, 2]}])
+        await client.disconnect()
+
+    async def test_async_iterator_result(self):
+        @MyAsyncJsonRpcWebsocketConsumerTest.rpc_method()
+        async def async_stream_range(count, fail=False):
+            return AsyncRange(count, fail)
+
+        client = WebsocketCommunicator(application, 'async/')
+        await client.connect()
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "async_stream_range", "params": [120]})
+        self.assertEqual(len((await client.receive_json_from())['params']['result']), 100)
+        self.assertEqual((await client.receive_json_from())['params']['result'], list(range(100, 120)))
+        self.assertEqual((await client.receive_json_from())['result'], 120)
+
+        # an error ends the stream with an error response
+        await client.send_json_to({"id": 3, "jsonrpc": "2.0", "method": "async_stream_range", "params": [150, True]})
+        self.assertEqual((await client.receive_json_from())['params']['result'], list(range(100)))
+        msg = await client.receive_json_from()
+        self.assertEqual(msg['id'], 3)
+        self.assertEqual(msg['error']['data'], "stream_error")
+        await client.disconnect()
+
+    async def test_streamed_methods_are_not_cached(self):
+        with self.assertRaises(ValueError):
+            @MyJsonRpcWebsocketConsumerTest.rpc_method(cache=True)
+            def cached_stream():
+                yield 1
+
+
+class TestsMetrics(aiounittest.AsyncTestCase):
+
+    async def test_calls(self):
+        @MyAsyncJsonRpcWebsocketConsumerTest.rpc_method()
+        async def metrics_fail():
+            raise Exception("fail")
+
+        metrics = MyAsyncJsonRpcWebsocketConsumerTest.metrics
+        metrics.reset()
+        consumer = 'MyAsyncJsonRpcWebsocketConsumerTest'
+
+        client = WebsocketCommunicator(application, 'async/')
+        await client.connect()
+        self.assertEqual(metrics.connections[consumer], 1)
+        await client.send_json_to([{"id": 1, "jsonrpc": "2.0", "method": "ping"},
+                                   {"id": 2, "jsonrpc": "2.0", "method": "metrics_fail"},
+                                   {"id": 3, "jsonrpc": "2.0", "method": "not_a_method"}])
+        await client.receive_json_from()
+        await client.disconnect()
+
+        self.assertEqual(metrics.connections[consumer], 0)
+        self.assertEqual(metrics.in_flight[consumer], 0)
+        self.assertEqual(metrics.calls[(consumer, 'ping')], 1)
+        self.assertEqual(metrics.errors, {
+            (consumer, 'metrics_fail', JsonRpcConsumerTest.GENERIC_APPLICATION_ERROR): 1,
+            (consumer, '<unknown>', JsonRpcConsumerTest.METHOD_NOT_FOUND): 1,
+        })
+        self.assertEqual(metrics.latencies[(consumer, 'ping')].count, 1)
+        self.assertEqual(metrics.request_sizes[consumer].count, 1)
+        self.assertEqual(metrics.response_sizes[consumer].count, 1)
+
+        text = metrics.exposition()
+        self.assertIn('jsonrpc_calls_total{consumer="%s",method="ping"} 1\n' % consumer, text)
+        self.assertIn('jsonrpc_call_duration_seconds_bucket{consumer="%s",method="ping",le="+Inf"} 1\n' % consumer,
+                      text)
+        self.assertIn('jsonrpc_open_connections{consumer="%s"} 0\n' % consumer, text)
+
+
+class TestsLogging(aiounittest.AsyncTestCase):
+
+    async def test_sampled_calls(self):
+        @MyJsonRpcWebsocketConsumerTest.rpc_method()
+        def sampled_echo(value):
+            return value
+
+        MyJsonRpcWebsocketConsumerTest.log_sample_rate = 2
+        try:
+            client = WebsocketCommunicator(application, 'ws/')
+            await client.connect()
+            with self.assertLogs('channels_jsonrpc.jsonrpcconsumer', 'INFO') as logs:
+                for i in range(4):
+                    await client.send_json_to({"id": i, "jsonrpc": "2.0", "method": "sampled_echo",
+                                               "params": ["x" * 5000]})
+                    await client.receive_json_from()
+            await client.disconnect()
+        finally:
+            MyJsonRpcWebsocketConsumerTest.log_sample_rate = 0
+
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn('sampled_echo', logs.output[0])
+        # params and results are truncated
+        self.assertLess(len(logs.output[0]), 2 * MyJsonRpcWebsocketConsumerTest.log_max_length + 200)
+
+    async def test_debug_logging_decided_once(self):
+        class QuietJsonRpcConsumer(JsonRpcConsumerTest):
+            pass
+
+        self.assertFalse(QuietJsonRpcConsumer._debug_logging())
+        with self.assertLogs('channels_jsonrpc.jsonrpcconsumer', 'DEBUG'):
+            class VerboseJsonRpcConsumer(JsonRpcConsumerTest):
+                pass
+
+            self.assertTrue(VerboseJsonRpcConsumer._debug_logging())
+            self.assertFalse(QuietJsonRpcConsumer._debug_logging())
+            logging.getLogger('channels_jsonrpc.jsonrpcconsumer').debug('done')
+
+
+class TestsRateLimits(aiounittest.AsyncTestCase):
+
+    async def test_method_rate_limit(self):
+        @MyJsonRpcWebsocketConsumerTest.rpc_method(rate_limit=RateLimit(0.01, burst=2))
+        def limited_ping():
+            return "pong"
+
+        client = WebsocketCommunicator(application, 'ws/')
+        await client.connect()
+        for i in range(2):
+            await client.send_json_to({"id": i, "jsonrpc": "2.0", "method": "limited_ping"})
+            self.assertEqual((await client.receive_json_from())['result'], "pong")
+        await client.send_json_to({"id": 2, "jsonrpc": "2.0", "method": "limited_ping"})
+        msg = await client.receive_json_from()
+        self.assertEqual(msg['id'], 2)
+        self.assertEqual(msg['error']['code'], JsonRpcConsumerTest.RATE_LIMIT_EXCEEDED)
+        await client.disconnect()
+
+        # each connection has its own limit
+        client = WebsocketCommunicator(application, 'ws/')
+        await client.connect()
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "limited_ping"})
+        self.assertEqual((await client.receive_json_from())['result'], "pong")
+        await client.disconnect()
+
+    async def test_shared_rate_limit(self):
+        for rate_limit in (RateLimit(0.01, burst=2, per_connection=False),
+                           RateLimit(0.01, burst=2, per_connection=False, cache='default')):
+            @MyAsyncJsonRpcWebsocketConsumerTest.rpc_method(rate_limit=rate_limit)
+            async def shared_limited_ping():
+                return "pong"
+
+            responses = []
+            for i in range(3):
+                client = WebsocketCommunicator(application, 'async/')
+                await client.connect()
+                await client.send_json_to({"id": i, "jsonrpc": "2.0", "method": "shared_limited_ping"})
+                responses.append(await client.receive_json_from())
+                await client.disconnect()
+            self.assertEqual([response.get('result') for response in responses], ["pong", "pong", None])
+            self.assertEqual(responses[2]['error']['code'], JsonRpcConsumerTest.RATE_LIMIT_EXCEEDED)
+
+    async def test_max_concurrent_calls(self):
+        @PipeliningJsonRpcWebsocketConsumerTest.rpc_method()
+        async def concurrent_sleep(delay):
+            await asyncio.sleep(delay)
+            return delay
+
+        PipeliningJsonRpcWebsocketConsumerTest.max_concurrent_calls = 1
+        try:
+            client = WebsocketCommunicator(application, 'pipelining/')
+            await client.connect()
+            await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "concurrent_sleep", "params": [0.1]})
+            await client.send_json_to({"id": 2, "jsonrpc": "2.0", "method": "concurrent_sleep", "params": [0]})
+            msg = await client.receive_json_from()
+            self.assertEqual(msg['id'], 2)
+            self.assertEqual(msg['error']['code'], JsonRpcConsumerTest.TOO_MANY_CONCURRENT_CALLS)
+            self.assertEqual((await client.receive_json_from())['result'], 0.1)
+
+            # batches wait for their turn instead
+            await client.send_json_to([{"id": i, "jsonrpc": "2.0", "method": "concurrent_sleep", "params": [0]}
+                                       for i in range(3)])
+            self.assertEqual([response['result'] for response in await client.receive_json_from()], [0, 0, 0])
+            await client.disconnect()
+        finally:
+            PipeliningJsonRpcWebsocketConsumerTest.max_concurrent_calls = None
+
+
+class TestsDeadlines(aiounittest.AsyncTestCase):
+
+    async def test_timeouts(self):
+        @MyAsyncJsonRpcWebsocketConsumerTest.rpc_method(timeout=0.05)
+        async def deadline_sleep(delay):
+            await asyncio.sleep(delay)
+            return delay
+
+        @MyAsyncJsonRpcWebsocketConsumerTest.rpc_method()
+        async def unbounded_sleep(delay):
+            await asyncio.sleep(delay)
+            return delay
+
+        client = WebsocketCommunicator(application, 'async/')
+        await client.connect()
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "deadline_sleep", "params": [0]})
+        self.assertEqual((await client.receive_json_from())['result'], 0)
+        await client.send_json_to({"id": 2, "jsonrpc": "2.0", "method": "deadline_sleep", "params": [1]})
+        msg = await client.receive_json_from()
+        self.assertEqual(msg['id'], 2)
+        self.assertEqual(msg['error']['code'], JsonRpcConsumerTest.REQUEST_TIMEOUT)
+
+        # deadline hint of the request
+        await client.send_json_to({"id": 3, "jsonrpc": "2.0", "method": "unbounded_sleep", "params": [1],
+                                   "timeout": 0.05})
+        self.assertEqual((await client.receive_json_from())['error']['code'], JsonRpcConsumerTest.REQUEST_TIMEOUT)
+
+        # default timeout of the consumer
+        MyAsyncJsonRpcWebsocketConsumerTest.call_timeout = 0.05
+        try:
+            await client.send_json_to({"id": 4, "jsonrpc": "2.0", "method": "unbounded_sleep", "params": [1]})
+            self.assertEqual((await client.receive_json_from())['error']['code'],
+                             JsonRpcConsumerTest.REQUEST_TIMEOUT)
+        finally:
+            MyAsyncJsonRpcWebsocketConsumerTest.call_timeout = None
+        await client.disconnect()
+
+    async def test_cancel_request(self):
+        state = {'cancelled': False}
+
+        @PipeliningJsonRpcWebsocketConsumerTest.rpc_method()
+        async def cancellable_sleep(delay):
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                state['cancelled'] = True
+                raise
+            return delay
+
+        client = WebsocketCommunicator(application, 'pipelining/')
+        await client.connect()
+        await client.send_json_to({"id": "slow", "jsonrpc": "2.0", "method": "cancellable_sleep", "params": [5]})
+        await client.send_json_to({"id": "other", "jsonrpc": "2.0", "method": "cancellable_sleep", "params": [0.05]})
+        await asyncio.sleep(0.01)
+        await client.send_json_to({"jsonrpc": "2.0", "method": "$/cancelRequest", "params": {"id": "slow"}})
+        msg = await client.receive_json_from()
+        self.assertEqual(msg['id'], "slow")
+        self.assertEqual(msg['error']['code'], JsonRpcConsumerTest.REQUEST_CANCELLED)
+        self.assertTrue(state['cancelled'])
+        # the other calls are left alone
+        self.assertEqual(await client.receive_json_from(), {"jsonrpc": "2.0", "id": "other", "result": 0.05})
+
+        # unknown ids are ignored
+        await client.send_json_to({"jsonrpc": "2.0", "method": "$/cancelRequest", "params": {"id": "unknown"}})
+        self.assertTrue(await client.receive_nothing())
+        await client.disconnect()
+
+
+class TestsParamsValidation(aiounittest.AsyncTestCase):
+
+    async def test_annotations(self):
+        @MyJsonRpcWebsocketConsumerTest.rpc_method()
+        def typed_method(count: int, ratio: float, when: datetime, tags: List[str] = None,
+                         note: Optional[str] = 'none', extra=None):
+            return [count, ratio, when.year, tags, note]
+
+        client = WebsocketCommunicator(application, 'ws/')
+        await client.connect()
+
+        # coerced
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "typed_method",
+                                   "params": [3, 1, "2020-01-02T03:04:05"]})
+        self.assertEqual((await client.receive_json_from())['result'], [3, 1.0, 2020, None, 'none'])
+        await client.send_json_to({"id": 2, "jsonrpc": "2.0", "method": "typed_method",
+                                   "params": {"count": 3, "ratio": 0.5, "when": "2021-01-02T03:04:05",
+                                              "tags": ["a"], "note": None, "extra": object.__name__}})
+        self.assertEqual((await client.receive_json_from())['result'], [3, 0.5, 2021, ["a"], None])
+
+        # field-level errors
+        await client.send_json_to({"id": 3, "jsonrpc": "2.0", "method": "typed_method",
+                                   "params": {"count": "3", "ratio": True, "when": "yesterday",
+                                              "tags": ["a", 1]}})
+        msg = await client.receive_json_from()
+        self.assertEqual(msg['error']['code'], JsonRpcConsumerTest.INVALID_PARAMS)
+        self.assertEqual(msg['error']['data'], {
+            "count": "expected integer, got string",
+            "ratio": "expected number, got boolean",
+            "when": "expected ISO 8601 datetime, got string",
+            "tags": "item 1: expected string, got number",
+        })
+        await client.disconnect()
+
+
+class TestsRemoteCalls(aiounittest.AsyncTestCase):
+
+    async def test_call_connection(self):
+        for path, consumer in (('ws/', MyJsonRpcWebsocketConsumerTest), ('async/', MyAsyncJsonRpcWebsocketConsumerTest),
+                               ('pipelining/', PipeliningJsonRpcWebsocketConsumerTest)):
+            @consumer.rpc_method()
+            def remote_channel(**kwargs):
+                return kwargs['consumer'].channel_name
+
+            @consumer.rpc_method()
+            def remote_greet(name, **kwargs):
+                if name is None:
+                    raise Exception('no name')
+                return 'hello %s from %s' % (name, kwargs['consumer'].channel_name)
+
+            client = WebsocketCommunicator(application, path)
+            await client.connect()
+            await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "remote_channel"})
+            channel_name = (await client.receive_json_from())['result']
+
+            # answered by the consumer of the connection
+            result = await consumer.call_remote(channel_name, 'remote_greet', {'name': 'bob'})
+            self.assertEqual(result, 'hello bob from %s' % channel_name)
+
+            with self.assertRaises(RemoteCallError) as cm:
+                await consumer.call_remote(channel_name, 'remote_greet', [None])
+            self.assertEqual(cm.exception.code, JsonRpcConsumerTest.GENERIC_APPLICATION_ERROR)
+            self.assertEqual(cm.exception.message, 'no name')
+
+            with self.assertRaises(RemoteCallError) as cm:
+                await consumer.call_remote(channel_name, 'remote_missing')
+            self.assertEqual(cm.exception.code, JsonRpcConsumerTest.METHOD_NOT_FOUND)
+
+            # nothing is sent to the client
+            self.assertTrue(await client.receive_nothing())
+            await client.disconnect()
+
+    async def test_notify_connection(self):
+        @MyAsyncJsonRpcWebsocketConsumerTest.rpc_method()
+        async def remote_join(group, **kwargs):
+            consumer = kwargs['consumer']
+            await consumer.channel_layer.group_add(group, consumer.channel_name)
+            consumer.groups = consumer.groups + [group]
+            return True
+
+        @MyAsyncJsonRpcWebsocketConsumerTest.rpc_notification()
+        async def remote_relay(text, **kwargs):
+            await kwargs['consumer'].notify_channel('relayed', [text])
+
+        client = WebsocketCommunicator(application, 'async/')
+        await client.connect()
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "remote_join", "params": ["room-1"]})
+        self.assertEqual((await client.receive_json_from())['result'], True)
+
+        await MyAsyncJsonRpcWebsocketConsumerTest.notify_remote('room-1', 'remote_relay', ['hi'], group=True)
+        self.assertEqual(await client.receive_json_from(), {"jsonrpc": "2.0", "method": "relayed", "params": ["hi"]})
+        await client.disconnect()
+
+    async def test_timeout(self):
+        channel_layer = get_channel_layer()
+        nobody = await channel_layer.new_channel()
+        with self.assertRaises(RemoteCallError) as cm:
+            await MyAsyncJsonRpcWebsocketConsumerTest.call_remote(nobody, 'ping', timeout=0.1)
+        self.assertEqual(cm.exception.code, JsonRpcConsumerTest.REQUEST_TIMEOUT)
+
+    async def test_worker(self):
+        channel_layer = get_channel_layer()
+        worker = ApplicationCommunicator(application, {'type': 'channel', 'channel': 'jsonrpc-shard'})
+        for expected in (1, 2):
+            # what the worker gets from the jsonrpc-shard channel
+            reply_channel = await channel_layer.new_channel()
+            await worker.send_input({'type': 'jsonrpc.call', 'reply_channel': reply_channel,
+                                     'text': '{"jsonrpc": "2.0", "id": 7, "method": "shard_increment", '
+                                             '"params": ["hits"]}'})
+            reply = await asyncio.wait_for(channel_layer.receive(reply_channel), 1)
+            self.assertEqual(reply['type'], 'jsonrpc.reply')
+            self.assertEqual(json.loads(reply['text']), {"jsonrpc": "2.0", "id": 7, "result": expected})
+        worker.stop()
+        await worker.wait()
+
+
+class TestsFrameCache(aiounittest.AsyncTestCase):
+
+    async def test_error_flood(self):
+        client = WebsocketCommunicator(application, 'ws/')
+        await client.connect()
+        for i in range(3):
+            await client.send_to(text_data='{"garbage"')
+            self.assertEqual(await client.receive_from(),
+                             '{"jsonrpc": "2.0", "error": {"code": -32700, "message": "Parse Error"}}')
+            await client.send_json_to({"id": i, "jsonrpc": "2.0", "method": "missing"})
+            self.assertEqual(await client.receive_from(),
+                             '{"jsonrpc": "2.0", "id": %d, "error": {"code": -32601, "message": "Method Not Found"}}'
+                             % i)
+        await client.disconnect()
+
+    async def test_spliced_ids(self):
+        @MyJsonRpcWebsocketConsumerTest.rpc_method()
+        def frame_constant(value):
+            return value
+
+        client = WebsocketCommunicator(application, 'ws/')
+        await client.connect()
+        for _id in (1, "a\"b", 2.5, [1], 1, "é"):
+            for value in ("pong", True, 1, 0, False, None, 1.5, "x" * 100):
+                await client.send_json_to({"id": _id, "jsonrpc": "2.0", "method": "frame_constant", "params": [value]})
+                text = await client.receive_from()
+                # same as the frame encoded as a whole
+                self.assertEqual(text, json.dumps(MyJsonRpcWebsocketConsumerTest.json_rpc_frame(_id=_id, result=value)))
+        await client.disconnect()
+
+    def test_frame_cache(self):
+        codec = MyJsonRpcWebsocketConsumerTest.get_codec()
+        cache = MyJsonRpcWebsocketConsumerTest.get_frame_cache(codec)
+        self.assertIs(cache, MyJsonRpcWebsocketConsumerTest.get_frame_cache(codec))
+        for _id in (1, 2, 3):
+            frame = MyJsonRpcWebsocketConsumerTest.error(_id, -32099, 'Templated')
+            self.assertEqual(cache.dumps(frame), json.dumps(frame))
+            self.assertEqual(cache.dumpb(frame), json.dumps(frame).encode('utf-8'))
+        # with data, the frames are not cached
+        self.assertNotIsInstance(MyJsonRpcWebsocketConsumerTest.error(1, -32000, 'error', 'data'), CachedFrame)
+
+    async def test_binary_codecs(self):
+        import msgpack
+
+        @MyJsonRpcWebsocketConsumerTest.rpc_method()
+        @MyAsyncJsonRpcWebsocketConsumerTest.rpc_method()
+        def frame_pong():
+            return 'pong'
+
+        for path in ('ws/', 'async/'):
+            client = WebsocketCommunicator(application, path, subprotocols=['jsonrpc-msgpack'])
+            await client.connect()
+            for _id in (1, 2, 3):
+                await client.send_to(bytes_data=msgpack.packb({"id": _id, "jsonrpc": "2.0", "method": "frame_pong"}))
+                self.assertEqual(msgpack.unpackb(await client.receive_from(), raw=False),
+                                 {"jsonrpc": "2.0", "id": _id, "result": "pong"})
+                await client.send_to(bytes_data=msgpack.packb({"id": _id, "jsonrpc": "2.0", "method": "missing"}))
+                self.assertEqual(msgpack.unpackb(await client.receive_from(), raw=False)['id'], _id)
+            await client.disconnect()
+
+    async def test_orjson_encoder(self):
+        client = WebsocketCommunicator(application, 'orjson/')
+        await client.connect()
+        for _id in (1, 2):
+            await client.send_json_to({"id": _id, "jsonrpc": "2.0", "method": "missing"})
+            self.assertEqual(await client.receive_json_from(), {"jsonrpc": "2.0", "id": _id, "error": {
+                "code": JsonRpcConsumerTest.METHOD_NOT_FOUND, "message": "Method Not Found"}})
+        await client.disconnect()
+
+
+class TestsFrameLimits(aiounittest.AsyncTestCase):
+
+    async def test_limits(self):
+        client = WebsocketCommunicator(application, 'limited/')
+        await client.connect()
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "limited_echo", "params": [[[1]]]})
+        self.assertEqual((await client.receive_json_from())['result'], [[1]])
+
+        for request, reason in (
+                ({"id": 2, "jsonrpc": "2.0", "method": "limited_echo", "params": ["x" * 300]},
+                 'Frame larger than 200 bytes'),
+                ([{"jsonrpc": "2.0", "method": "limited_echo", "params": [1]}] * 3,
+                 'Batch longer than 2 request objects'),
+                ({"id": 2, "jsonrpc": "2.0", "method": "limited_echo", "params": [[[[1]]]]},
+                 'nested deeper than 4 levels'),
+                ({"id": 2, "jsonrpc": "2.0", "method": "limited_echo", "params": ["x" * 21]},
+                 'string longer than 20 characters')):
+            await client.send_json_to(request)
+            response = await client.receive_json_from()
+            self.assertEqual(response['error']['code'], JsonRpcConsumerTest.INVALID_REQUEST)
+            self.assertEqual(response['error']['data'], reason)
+            self.assertNotIn('id', response)
+            await client.disconnect()
+            client = WebsocketCommunicator(application, 'limited/')
+            await client.connect()
+        await client.disconnect()
+
+    async def test_close_on_violations(self):
+        client = WebsocketCommunicator(application, 'limited/')
+        await client.connect()
+        for i in range(2):
+            await client.send_to(text_data='{"garbage"')
+            self.assertEqual((await client.receive_json_from())['error']['code'], JsonRpcConsumerTest.PARSE_ERROR)
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "limited_echo", "params": ["x" * 300]})
+        self.assertEqual((await client.receive_json_from())['error']['code'], JsonRpcConsumerTest.INVALID_REQUEST)
+        self.assertEqual(await client.receive_output(), {"type": "websocket.close", "code": 1008})
+
+    async def test_deep_nesting(self):
+        # rejected by the parser, whatever the limits
+        for path in ('ws/', 'async/'):
+            client = WebsocketCommunicator(application, path)
+            await client.connect()
+            await client.send_to(text_data='[' * 100000)
+            self.assertEqual((await client.receive_json_from())['error']['code'], JsonRpcConsumerTest.PARSE_ERROR)
+            await client.disconnect()
+
+
+class TestsConnectionResources(aiounittest.AsyncTestCase):
+
+    async def test_injection(self):
+        released = ResourcesJsonRpcWebsocketConsumerTest.released
+        del released[:]
+        client = WebsocketCommunicator(application, 'resources/')
+        await client.connect()
+        for i, params in enumerate(([], [2], {'step': 3})):
+            await client.send_json_to({"id": i, "jsonrpc": "2.0", "method": "session_calls", "params": params})
+            self.assertEqual((await client.receive_json_from())['result'], [1, 3, 6][i])
+
+        # set by the consumer only
+        await client.send_json_to({"id": 3, "jsonrpc": "2.0", "method": "session_calls",
+                                   "params": {"session": {"calls": 0}}})
+        response = await client.receive_json_from()
+        self.assertEqual(response['error']['code'], JsonRpcConsumerTest.INVALID_PARAMS)
+        self.assertEqual(response['error']['data'], 'unexpected parameter(s): session')
+        await client.send_json_to({"id": 4, "jsonrpc": "2.0", "method": "session_calls", "params": [1, 2]})
+        self.assertEqual((await client.receive_json_from())['error']['code'], JsonRpcConsumerTest.INVALID_PARAMS)
+        self.assertEqual(released, [])
+
+        await client.disconnect()
+        self.assertEqual(len(released), 1)
+        self.assertEqual(released[0]['calls'], 6)
+
+        # one per connection
+        client = WebsocketCommunicator(application, 'resources/')
+        await client.connect()
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "session_calls", "params": []})
+        self.assertEqual((await client.receive_json_from())['result'], 1)
+        await client.disconnect()
+        self.assertEqual(len(released), 2)
+        self.assertNotEqual(released[0]['channel'], released[1]['channel'])
+
+    async def test_async_resource_created_once(self):
+        consumer = AsyncResourcesJsonRpcWebsocketConsumerTest
+        consumer.opened = 0
+        del consumer.released[:]
+        client = WebsocketCommunicator(application, 'async-resources/')
+        await client.connect()
+        for i in range(3):
+            await client.send_json_to({"id": i, "jsonrpc": "2.0", "method": "client_request", "params": [i]})
+        results = []
+        for i in range(3):
+            results.append((await client.receive_json_from())['result'])
+        # the same client for the three calls
+        self.assertCountEqual(results, [1, 2, 3])
+        self.assertEqual(consumer.opened, 1)
+        self.assertEqual(consumer.released, [])
+
+        await client.disconnect()
+        self.assertEqual(len(consumer.released), 1)
+        self.assertCountEqual(consumer.released[0], [0, 1, 2])
+
+    async def test_released_after_threads(self):
+        consumer = AsyncResourcesJsonRpcWebsocketConsumerTest
+        del consumer.released[:]
+        del consumer.observed[:]
+
+        # closed while the resource is created in a thread: released once created
+        client = WebsocketCommunicator(application, 'async-resources/')
+        await client.connect()
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "slow_session_use", "params": []})
+        await asyncio.sleep(0.02)
+        await client.disconnect()
+        self.assertEqual(consumer.released, [{'closed': True}])
+        self.assertEqual(consumer.observed, [])
+
+        # closed while a method uses it in a thread: released once the method returned
+        client = WebsocketCommunicator(application, 'async-resources/')
+        await client.connect()
+        await client.send_json_to({"id": 1, "jsonrpc": "2.0", "method": "slow_session_use", "params": []})
+        self.assertEqual((await client.receive_json_from(1))['result'], False)
+        await client.send_json_to({"id": 2, "jsonrpc": "2.0", "method": "slow_session_use", "params": [0.1]})
+        await asyncio.sleep(0.02)
+        await client.disconnect()
+        self.assertEqual(consumer.observed, [False, False])
+        self.assertEqual(len(consumer.released), 2)
+
+    def test_declaration(self):
+        self.assertEqual(list(ResourcesJsonRpcWebsocketConsumerTest.get_connection_resources()), ['session'])
+
+        class MyResourcesConsumer(ResourcesJsonRpcWebsocketConsumerTest):
+            pass
+
+        with self.assertRaises(ValueError):
+            @MyResourcesConsumer.connection_resource()
+            async def database(consumer):
+                pass
+
+        @MyResourcesConsumer.connection_resource()
+        def database(consumer):
+            return 'db'
+
+        self.assertEqual(sorted(MyResourcesConsumer.get_connection_resources()), ['database', 'session'])
+        self.assertEqual(list(ResourcesJsonRpcWebsocketConsumerTest.get_connection_resources()), ['session'])
@@ -14,6 +14,13 @@ setup(
     install_requires=[
           'channels'
       ],
+    extras_require={
+        'orjson': ['orjson'],
+        'ujson': ['ujson'],
+        'rapidjson': ['python-rapidjson'],
+        'msgpack': ['msgpack'],
+        'cbor': ['cbor2'],
+    },
     include_package_data=True,
     license='MIT License',
     description='A JSON-RPC implementation for Django channels 2 consumers.',